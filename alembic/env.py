@@ -10,7 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app.database import Base
 from app.config import settings
-from app.models import User, Category, Product, Order, OrderItem, Payment
+from app.models import User, Category, CategoryClosure, Product, Order, OrderItem, Payment, PaymentEvent, ProductCopurchase, CopurchaseOrder, JobWatermark, StockReservation, IdempotencyKey, WebhookEvent
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
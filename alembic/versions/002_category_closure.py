@@ -0,0 +1,39 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002_category_closure'
+down_revision = '001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create category_closure table
+    op.create_table(
+        'category_closure',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_category_closure_descendant_id', 'category_closure', ['descendant_id'], unique=False)
+    op.create_foreign_key('fk_category_closure_ancestor_id', 'category_closure', 'categories', ['ancestor_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('fk_category_closure_descendant_id', 'category_closure', 'categories', ['descendant_id'], ['id'], ondelete='CASCADE')
+
+    # Backfill paths for the existing hierarchy
+    op.execute("""
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT paths.ancestor_id, categories.id, paths.depth + 1
+            FROM paths
+            JOIN categories ON categories.parent_id = paths.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM paths
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('category_closure')
@@ -0,0 +1,37 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003_copurchase_index'
+down_revision = '002_category_closure'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create product_copurchases table
+    op.create_table(
+        'product_copurchases',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('related_product_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('product_id', 'related_product_id')
+    )
+    op.create_index('ix_product_copurchases_product_id_score', 'product_copurchases', ['product_id', 'score'], unique=False)
+    op.create_foreign_key('fk_product_copurchases_product_id', 'product_copurchases', 'products', ['product_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('fk_product_copurchases_related_product_id', 'product_copurchases', 'products', ['related_product_id'], ['id'], ondelete='CASCADE')
+
+    # Create job_watermarks table
+    op.create_table(
+        'job_watermarks',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_watermarks')
+    op.drop_table('product_copurchases')
@@ -0,0 +1,16 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '004_order_keyset_index'
+down_revision = '003_copurchase_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keyset pagination of a user's order history
+    op.create_index('ix_orders_user_id_id', 'orders', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_user_id_id', table_name='orders')
@@ -0,0 +1,29 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '005_product_search'
+down_revision = '004_order_keyset_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Generated full-text vector over name, sku and description
+    op.execute("""
+        ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(sku, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)")
+
+    # Trigram index for typo-tolerant name matching
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_name_trgm', table_name='products')
+    op.drop_index('ix_products_search_vector', table_name='products')
+    op.drop_column('products', 'search_vector')
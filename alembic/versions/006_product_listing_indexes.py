@@ -0,0 +1,20 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '006_product_listing_indexes'
+down_revision = '005_product_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Composite indexes for filtered and sorted product listings
+    op.create_index('ix_products_status_category_id_price', 'products', ['status', 'category_id', 'price'], unique=False)
+    op.create_index('ix_products_status_price', 'products', ['status', 'price'], unique=False)
+    op.create_index('ix_products_status_name', 'products', ['status', 'name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_status_name', table_name='products')
+    op.drop_index('ix_products_status_price', table_name='products')
+    op.drop_index('ix_products_status_category_id_price', table_name='products')
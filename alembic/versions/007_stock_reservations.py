@@ -0,0 +1,38 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_stock_reservations'
+down_revision = '006_product_listing_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Stock held by active reservations; available-to-sell is stock - reserved_stock
+    op.add_column('products', sa.Column('reserved_stock', sa.Integer(), nullable=False, server_default='0'))
+
+    # Create stock_reservations table
+    op.create_table(
+        'stock_reservations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='active'),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_reservations_id'), 'stock_reservations', ['id'], unique=False)
+    op.create_index(op.f('ix_stock_reservations_order_id'), 'stock_reservations', ['order_id'], unique=False)
+    op.create_index(op.f('ix_stock_reservations_product_id'), 'stock_reservations', ['product_id'], unique=False)
+    op.create_index('ix_stock_reservations_status_expires_at', 'stock_reservations', ['status', 'expires_at'], unique=False)
+    op.create_foreign_key('fk_stock_reservations_order_id', 'stock_reservations', 'orders', ['order_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('fk_stock_reservations_product_id', 'stock_reservations', 'products', ['product_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_table('stock_reservations')
+    op.drop_column('products', 'reserved_stock')
@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_hot_stock'
+down_revision = '007_stock_reservations'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Hot products keep their available-to-sell in sharded Redis counters
+    op.add_column('products', sa.Column('is_hot', sa.Boolean(), nullable=False, server_default=sa.false()))
+    # Where a reservation's units are held: db (reserved_stock) or redis (hot counters)
+    op.add_column('stock_reservations', sa.Column('source', sa.String(length=10), nullable=False, server_default='db'))
+
+
+def downgrade() -> None:
+    op.drop_column('stock_reservations', 'source')
+    op.drop_column('products', 'is_hot')
@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_webhook_dedupe'
+down_revision = '010_webhook_events'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Provider event id, shared by every redelivery; existing rows get their own id
+    op.add_column('webhook_events', sa.Column('event_id', sa.String(length=255), nullable=True))
+    op.execute("UPDATE webhook_events SET event_id = 'legacy:' || CAST(id AS VARCHAR)")
+    op.alter_column('webhook_events', 'event_id', nullable=False)
+    op.create_unique_constraint('uq_webhook_events_provider_event_id', 'webhook_events', ['provider', 'event_id'])
+    op.create_index('ix_webhook_events_processed_at', 'webhook_events', ['processed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_events_processed_at', table_name='webhook_events')
+    op.drop_constraint('uq_webhook_events_provider_event_id', 'webhook_events', type_='unique')
+    op.drop_column('webhook_events', 'event_id')
@@ -0,0 +1,17 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_webhook_verified'
+down_revision = '011_webhook_dedupe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Whether the event's signature was checked, so its payload can be applied without a provider query
+    op.add_column('webhook_events', sa.Column('verified', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    op.drop_column('webhook_events', 'verified')
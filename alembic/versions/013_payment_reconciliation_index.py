@@ -0,0 +1,16 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '013_payment_reconciliation_index'
+down_revision = '012_webhook_verified'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Reconciliation pages through pending payments by id
+    op.create_index('ix_payments_status_id', 'payments', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payments_status_id', table_name='payments')
@@ -0,0 +1,89 @@
+import json
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014_payment_events'
+down_revision = '013_payment_reconciliation_index'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+payments = sa.table(
+    'payments',
+    sa.column('id', sa.Integer),
+    sa.column('status', sa.String),
+    sa.column('raw_response', sa.JSON),
+)
+payment_events = sa.table(
+    'payment_events',
+    sa.column('id', sa.Integer),
+    sa.column('payment_id', sa.Integer),
+    sa.column('source', sa.String),
+    sa.column('status', sa.String),
+    sa.column('payload_zlib', sa.LargeBinary),
+)
+
+
+def upgrade() -> None:
+    # Provider payloads move out of the hot payments rows into an append-only, compressed history
+    op.create_table(
+        'payment_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('payment_id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('payload_zlib', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_payment_events_id'), 'payment_events', ['id'], unique=False)
+    op.create_index('ix_payment_events_payment_id_id', 'payment_events', ['payment_id', 'id'], unique=False)
+
+    # Keep the last stored payload of every payment as its first event
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(payments.c.id, payments.c.status, payments.c.raw_response)
+            .where(payments.c.id > last_id, payments.c.raw_response.isnot(None))
+            .order_by(payments.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(payment_events.insert(), [
+            {
+                'payment_id': payment_id,
+                'source': 'migrated',
+                'status': status,
+                'payload_zlib': zlib.compress(json.dumps(raw_response, separators=(',', ':')).encode()),
+            }
+            for payment_id, status, raw_response in rows
+        ])
+        last_id = rows[-1][0]
+
+    op.drop_column('payments', 'raw_response')
+
+
+def downgrade() -> None:
+    op.add_column('payments', sa.Column('raw_response', sa.JSON(), nullable=True))
+
+    # Restore each payment's latest payload
+    connection = op.get_bind()
+    latest = sa.select(sa.func.max(payment_events.c.id)).group_by(payment_events.c.payment_id)
+    rows = connection.execute(
+        sa.select(payment_events.c.payment_id, payment_events.c.payload_zlib)
+        .where(payment_events.c.id.in_(latest), payment_events.c.payload_zlib.isnot(None))
+    ).fetchall()
+    for payment_id, payload_zlib in rows:
+        connection.execute(
+            payments.update()
+            .where(payments.c.id == payment_id)
+            .values(raw_response=json.loads(zlib.decompress(payload_zlib)))
+        )
+
+    op.drop_table('payment_events')
@@ -0,0 +1,17 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015_user_token_version'
+down_revision = '014_payment_events'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Carried in access tokens as "ver"; bumping it revokes every token issued before
+    op.add_column('users', sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,54 @@
+from alembic import op
+import sqlalchemy as sa
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision = '016_copurchase_orders'
+down_revision = '015_user_token_version'
+branch_labels = None
+depends_on = None
+
+job_watermarks = sa.table(
+    'job_watermarks',
+    sa.column('name', sa.String),
+    sa.column('value', sa.BigInteger),
+)
+order_items = sa.table(
+    'order_items',
+    sa.column('id', sa.Integer),
+    sa.column('order_id', sa.Integer),
+)
+copurchase_orders = sa.table(
+    'copurchase_orders',
+    sa.column('order_id', sa.Integer),
+    sa.column('last_item_id', sa.BigInteger),
+)
+
+
+def upgrade() -> None:
+    # Orders already counted, so the co-purchase job can re-scan recent item ids without counting them twice
+    op.create_table(
+        'copurchase_orders',
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('last_item_id', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('order_id')
+    )
+    op.create_index(op.f('ix_copurchase_orders_last_item_id'), 'copurchase_orders', ['last_item_id'], unique=False)
+
+    # Orders inside the first re-scan window were counted by the old job; record them
+    connection = op.get_bind()
+    watermark = connection.execute(
+        sa.select(job_watermarks.c.value).where(job_watermarks.c.name == 'copurchase_index')
+    ).scalar() or 0
+    if watermark:
+        last_item_id = sa.func.max(order_items.c.id)
+        counted = sa.select(order_items.c.order_id, last_item_id).where(
+            order_items.c.id <= watermark
+        ).group_by(order_items.c.order_id).having(last_item_id > watermark - settings.COPURCHASE_RESCAN_WINDOW)
+        connection.execute(copurchase_orders.insert().from_select(['order_id', 'last_item_id'], counted))
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_copurchase_orders_last_item_id'), table_name='copurchase_orders')
+    op.drop_table('copurchase_orders')
@@ -3,46 +3,65 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.core.security import decode_access_token
+from app.core.principal import Principal, current_token_version
 from app.models.user import User
 from app.services.user_service import UserService
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+
+def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """
+    Get the authenticated caller from the token's claims.
+    The user row isn't loaded: the token's version is checked against a
+    short-lived per-worker cache, which is how revoked tokens are rejected.
+    Tokens issued before claims carried is_admin/ver fall back to a lookup.
+    """
     payload = decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    email: str = payload.get("sub")
-    if email is None:
-        raise credentials_exception
-    
-    user_service = UserService(db)
-    user = user_service.get_user_by_email(email)
-    if user is None:
-        raise credentials_exception
-    
-    return user
+    if payload is None or payload.get("sub") is None:
+        raise _credentials_exception()
 
+    principal = Principal.from_claims(payload)
+    if principal is None:
+        user = UserService(db).get_user_by_email(payload["sub"])
+        if user is None:
+            raise _credentials_exception()
+        return Principal.from_user(user)
 
-def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
-    """Get current user and verify admin status"""
+    if current_token_version(db, principal.id) != principal.token_version:
+        raise _credentials_exception()
+    return principal
+
+
+def get_current_admin_principal(
+    current_user: Principal = Depends(get_current_principal)
+) -> Principal:
+    """Get the authenticated caller and verify admin status"""
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     return current_user
+
+
+def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get the full user row, for the few endpoints that need more than the claims"""
+    user = UserService(db).get_user_by_id(principal.id)
+    if user is None:
+        raise _credentials_exception()
+    return user
@@ -0,0 +1,64 @@
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Optional, Type
+from app.services.idempotency_service import (
+    IdempotencyService, IdempotencyKeyInProgressError, IdempotencyKeyMismatchError, request_fingerprint
+)
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENT_REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def run_idempotent(
+    db: Session,
+    user_id: int,
+    scope: str,
+    key: Optional[str],
+    payload: BaseModel,
+    handler: Callable[[], Any],
+    status_code: int,
+    response_model: Optional[Type[BaseModel]] = None
+) -> Any:
+    """
+    Run a route handler at most once per Idempotency-Key.
+    The first response (success or 4xx) is saved and replayed byte-for-byte
+    to retries; 5xx responses and unexpected errors release the key so the
+    client can try again. Without a key the handler runs as usual.
+    """
+    if not key:
+        return handler()
+
+    service = IdempotencyService(db)
+    try:
+        saved = service.claim(user_id, scope, key, request_fingerprint(payload.model_dump(mode="json")))
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyKeyInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if saved is not None:
+        return Response(
+            content=saved.response_body,
+            status_code=saved.status_code,
+            media_type="application/json",
+            headers={IDEMPOTENT_REPLAY_HEADER: "true"}
+        )
+
+    try:
+        result = handler()
+        if response_model is not None:
+            result = response_model.model_validate(result)
+        response = JSONResponse(content=jsonable_encoder(result), status_code=status_code)
+    except HTTPException as e:
+        if e.status_code >= 500:
+            service.release(user_id, scope, key)
+            raise
+        response = JSONResponse(content={"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+    except Exception:
+        service.release(user_id, scope, key)
+        raise
+
+    service.complete(user_id, scope, key, response.status_code, response.body)
+    return response
@@ -5,6 +5,7 @@ from app.schemas.user import UserCreate, UserLogin, UserResponse, Token
 from app.services.user_service import UserService
 from app.api.deps import get_current_user
 from app.models.user import User
+from app.core.password_hashing import PasswordHashingBusyError
 
 router = APIRouter()
 
@@ -16,6 +17,8 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     try:
         user = user_service.create_user(user_data)
         return user
+    except PasswordHashingBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -24,7 +27,10 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
 def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """Login user and get access token"""
     user_service = UserService(db)
-    access_token = user_service.login_user(user_data.email, user_data.password)
+    try:
+        access_token = user_service.login_user(user_data.email, user_data.password)
+    except PasswordHashingBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
     if not access_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
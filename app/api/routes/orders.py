@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 from app.database import get_db
-from app.schemas.order import OrderCreate, OrderResponse
+from app.schemas.order import OrderCreate, OrderResponse, OrderSummaryResponse
 from app.services.order_service import OrderService
-from app.api.deps import get_current_user
-from app.models.user import User
+from app.api.deps import get_current_principal
+from app.core.principal import Principal
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.api.idempotency import run_idempotent, IDEMPOTENCY_KEY_HEADER
 
 router = APIRouter()
 
@@ -13,28 +15,53 @@ router = APIRouter()
 @router.post("", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 def create_order(
     order_data: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER, max_length=255),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
-    """Create a new order"""
+    """
+    Create a new order.
+    Retries sent with the same Idempotency-Key get the first response back
+    instead of creating another order.
+    """
     order_service = OrderService(db)
-    try:
-        order = order_service.create_order(current_user.id, order_data)
-        return order
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+    def handler():
+        try:
+            return order_service.create_order(current_user.id, order_data)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return run_idempotent(
+        db, current_user.id, "orders:create", idempotency_key, order_data, handler,
+        status.HTTP_201_CREATED, response_model=OrderResponse
+    )
 
-@router.get("", response_model=List[OrderResponse])
+
+@router.get("", response_model=Union[List[OrderSummaryResponse], List[OrderResponse]])
 def get_orders(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    view: str = Query("full", pattern="^(full|summary)$"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
-    """Get current user's orders"""
+    """
+    Get current user's orders, newest first.
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    With `view=summary`, only order headers and an item count are returned.
+    """
     order_service = OrderService(db)
-    orders = order_service.get_user_orders(current_user.id, skip=skip, limit=limit)
+    get_page = order_service.get_user_order_summaries if view == "summary" else order_service.get_user_orders
+    try:
+        orders = get_page(current_user.id, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    next_cursor = order_service.next_cursor(orders, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return orders
 
 
@@ -42,7 +69,7 @@ def get_orders(
 def get_order(
     order_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get order by ID (user can only see their own orders)"""
     order_service = OrderService(db)
@@ -56,7 +83,7 @@ def get_order(
 def cancel_order(
     order_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Cancel an order"""
     order_service = OrderService(db)
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
 from sqlalchemy.orm import Session
+from typing import List, Optional
 from app.database import get_db
-from app.schemas.payment import PaymentCreate, PaymentResponse, PaymentConfirm
+from app.schemas.payment import PaymentCreate, PaymentResponse, PaymentConfirm, PaymentEventResponse
 from app.services.payment_service import PaymentService
-from app.api.deps import get_current_user
-from app.models.user import User
+from app.api.deps import get_current_principal, get_current_admin_principal
+from app.core.principal import Principal
+from app.api.idempotency import run_idempotent, IDEMPOTENCY_KEY_HEADER
+from app.payment.resilience import ProviderUnavailableError
 
 router = APIRouter()
 
@@ -12,27 +15,43 @@ router = APIRouter()
 @router.post("/create", response_model=dict, status_code=status.HTTP_201_CREATED)
 def initiate_payment(
     payment_data: PaymentCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER, max_length=255),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
-    """Initiate payment with specified provider"""
+    """
+    Initiate payment with specified provider.
+    Retries sent with the same Idempotency-Key get the first response back
+    instead of creating another payment with the provider.
+    """
     payment_service = PaymentService(db)
-    try:
-        result = payment_service.initiate_payment(payment_data.order_id, payment_data.provider)
-        return result
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    def handler():
+        try:
+            return payment_service.initiate_payment(payment_data.order_id, payment_data.provider)
+        except ProviderUnavailableError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return run_idempotent(
+        db, current_user.id, "payments:create", idempotency_key, payment_data, handler,
+        status.HTTP_201_CREATED
+    )
 
 
 @router.post("/confirm", response_model=PaymentResponse)
 def confirm_payment(
     payment_data: PaymentConfirm,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Confirm payment"""
     payment_service = PaymentService(db)
-    payment = payment_service.confirm_payment(payment_data.transaction_id, payment_data.provider)
+    try:
+        payment = payment_service.confirm_payment(payment_data.transaction_id, payment_data.provider)
+    except ProviderUnavailableError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     if not payment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
     return payment
@@ -42,7 +61,7 @@ def confirm_payment(
 def get_payment(
     payment_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get payment by ID"""
     payment_service = PaymentService(db)
@@ -55,3 +74,18 @@ def get_payment(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     
     return payment
+
+
+@router.get("/{payment_id}/events", response_model=List[PaymentEventResponse])
+def get_payment_events(
+    payment_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Get a payment's provider payload history (admin only)"""
+    payment_service = PaymentService(db)
+    if not payment_service.get_payment_by_id(payment_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
+    return payment_service.get_payment_events(payment_id, skip=skip, limit=limit)
@@ -1,29 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
+from decimal import Decimal
 from app.database import get_db
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse
+from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse, ProductFilter, ProductPage
 from app.services.product_service import ProductService
-from app.services.category_service import CategoryService
-from app.api.deps import get_current_user, get_current_admin_user
-from app.models.user import User
+from app.services.recommendation_service import RecommendationService
+from app.api.deps import get_current_admin_principal
+from app.core.principal import Principal
+from app.core.pagination import NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
 
+def product_filters(
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    in_stock: bool = Query(False),
+    category_id: Optional[int] = Query(None, description="Includes descendant categories"),
+    sort: Literal["id", "price_asc", "price_desc", "newest", "name"] = Query("id")
+) -> ProductFilter:
+    """Collect product listing filters from query parameters"""
+    return ProductFilter(
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        category_id=category_id,
+        sort=sort
+    )
+
+
 @router.get("", response_model=List[ProductResponse])
 def get_products(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    status: Optional[str] = Query(None),
+    product_status: Optional[str] = Query(None, alias="status"),
+    cursor: Optional[str] = Query(None),
+    filters: ProductFilter = Depends(product_filters),
     db: Session = Depends(get_db)
 ):
-    """Get list of products"""
+    """
+    Get list of products.
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    """
     product_service = ProductService(db)
-    products = product_service.get_all_products(skip=skip, limit=limit, status=status)
+    try:
+        products = product_service.get_all_products(
+            skip=skip, limit=limit, status=product_status, cursor=cursor, filters=filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    next_cursor = product_service.next_cursor(products, limit, sort=filters.sort)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return products
 
 
+@router.get("/browse", response_model=ProductPage)
+def browse_products(
+    limit: int = Query(50, ge=1, le=100),
+    product_status: Optional[str] = Query("active", alias="status"),
+    cursor: Optional[str] = Query(None),
+    filters: ProductFilter = Depends(product_filters),
+    db: Session = Depends(get_db)
+):
+    """Get a page of filtered products together with category and price facet counts"""
+    product_service = ProductService(db)
+    try:
+        products = product_service.get_all_products(
+            limit=limit, status=product_status, cursor=cursor, filters=filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ProductPage(
+        items=products,
+        facets=product_service.get_product_facets(status=product_status, filters=filters),
+        next_cursor=product_service.next_cursor(products, limit, sort=filters.sort)
+    )
+
+
+@router.get("/search", response_model=List[ProductResponse])
+def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Search active products by name, SKU and description, best match first"""
+    product_service = ProductService(db)
+    return product_service.search_products(q, limit=limit)
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 def get_product(product_id: int, db: Session = Depends(get_db)):
     """Get product by ID"""
@@ -38,7 +105,7 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
 def create_product(
     product_data: ProductCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Create a new product (admin only)"""
     product_service = ProductService(db)
@@ -54,7 +121,7 @@ def update_product(
     product_id: int,
     product_data: ProductUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Update a product (admin only)"""
     product_service = ProductService(db)
@@ -71,7 +138,7 @@ def update_product(
 def delete_product(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Delete a product (admin only)"""
     product_service = ProductService(db)
@@ -86,7 +153,7 @@ def get_product_recommendations(
     limit: int = Query(10, ge=1, le=50),
     db: Session = Depends(get_db)
 ):
-    """Get product recommendations using DFS category traversal"""
-    category_service = CategoryService(db)
-    related_products = category_service.get_related_products(product_id, limit=limit)
+    """Get products frequently bought together, falling back to the same category subtree"""
+    recommendation_service = RecommendationService(db)
+    related_products = recommendation_service.get_recommendations(product_id, limit=limit)
     return related_products
@@ -1,31 +1,32 @@
 from fastapi import APIRouter, Request, HTTPException, status, Header, Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.services.payment_service import PaymentService
+from app.services.webhook_service import WebhookService
 from typing import Optional
 import json
 
 router = APIRouter()
 
 
-@router.post("/bkash")
+@router.post("/bkash", status_code=status.HTTP_202_ACCEPTED)
 async def bkash_webhook(
     request: Request,
     db: Session = Depends(get_db),
     x_app_key: Optional[str] = Header(None, alias="X-APP-Key")
 ):
-    """Handle bKash webhook"""
+    """Queue a bKash webhook for processing"""
     try:
-        payload_dict = await request.json()
-        payment_service = PaymentService(db)
+        payload_bytes = await request.body()
+        payload_dict = json.loads(payload_bytes)
+        webhook_service = WebhookService(db)
         
-        # Process webhook (bKash may not always send signature)
-        payment = payment_service.handle_webhook("bkash", payload_dict, None)
-        
-        if payment:
-            return {"status": "success", "payment_id": payment.id}
-        else:
-            return {"status": "ignored"}
+        # bKash may not always send signature; database work is blocking, so keep it off the event loop
+        event = await run_in_threadpool(webhook_service.enqueue, "bkash", payload_dict, None, payload_bytes)
+        if event is None:
+            # Redelivery of an event we already have
+            return {"status": "duplicate"}
+        return {"status": "accepted", "event_id": event.id}
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
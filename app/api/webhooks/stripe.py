@@ -1,32 +1,35 @@
 from fastapi import APIRouter, Request, HTTPException, status, Header, Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.services.payment_service import PaymentService
+from app.services.webhook_service import WebhookService
 from typing import Optional
 import json
 
 router = APIRouter()
 
 
-@router.post("/stripe")
+@router.post("/stripe", status_code=status.HTTP_202_ACCEPTED)
 async def stripe_webhook(
     request: Request,
     db: Session = Depends(get_db),
     stripe_signature: Optional[str] = Header(None, alias="stripe-signature")
 ):
-    """Handle Stripe webhook"""
+    """Verify a Stripe webhook and queue it for processing"""
     try:
         payload_bytes = await request.body()
         payload_dict = json.loads(payload_bytes)
-        payment_service = PaymentService(db)
+        webhook_service = WebhookService(db)
         
-        # Verify signature and process webhook
-        payment = payment_service.handle_webhook("stripe", payload_dict, stripe_signature)
-        
-        if payment:
-            return {"status": "success", "payment_id": payment.id}
-        else:
-            return {"status": "ignored"}
+        # Database work is blocking, so keep it off the event loop
+        # The signature covers the exact request bytes, so verify against those
+        event = await run_in_threadpool(
+            webhook_service.enqueue, "stripe", payload_dict, stripe_signature, payload_bytes
+        )
+        if event is None:
+            # Redelivery of an event we already have
+            return {"status": "duplicate"}
+        return {"status": "accepted", "event_id": event.id}
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
@@ -9,11 +9,80 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Category tree snapshot
+    CATEGORY_TREE_CHECK_INTERVAL: int = 5  # seconds between version checks
+    
     # JWT
     SECRET_KEY: str = "your-secret-key-here-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_VERSION_CACHE_SECONDS: int = 30  # how long a revoked token may still be accepted
+    TOKEN_VERSION_CACHE_SIZE: int = 10000  # users whose token version each worker remembers
+    
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12  # cost factor; hashes made at another cost are upgraded on login
+    PASSWORD_HASH_WORKERS: Optional[int] = None  # hashing processes; None = one per CPU, 0 = inline
+    PASSWORD_HASH_MAX_PENDING: int = 16  # hashes queued or running before sign-ins get 503
+    PASSWORD_HASH_WAIT_SECONDS: float = 1.0
+    
+    # Inventory
+    STOCK_RESERVATION_TTL_MINUTES: int = 15
+    HOT_STOCK_SHARDS: int = 8
+    HOT_STOCK_FLUSH_INTERVAL: int = 5  # seconds between flushes to products.stock
+    
+    # Co-purchase index job
+    COPURCHASE_RESCAN_WINDOW: int = 1000  # item ids below the high-water mark re-read for late commits
+    
+    # Idempotency keys
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+    IDEMPOTENCY_LOCK_SECONDS: int = 60  # in-flight claims older than this can be taken over; raised to outlast payment HTTP timeouts and retries
+    IDEMPOTENCY_WAIT_SECONDS: int = 10  # how long a duplicate waits for the in-flight request
     
+    # Webhook inbox workers
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_MAX_ATTEMPTS: int = 8
+    WEBHOOK_RETRY_BACKOFF: int = 5  # seconds, doubled per failed attempt
+    WEBHOOK_PROCESSING_TIMEOUT: int = 300  # claimed events are retried if not finished by then
+    WEBHOOK_POLL_INTERVAL: float = 1.0
+    WEBHOOK_DEDUPE_TTL_HOURS: int = 72  # redeliveries within this window are dropped
+    
+    # Payment reconciliation
+    RECONCILE_PENDING_AFTER_MINUTES: int = 30  # pending payments older than this are queried
+    RECONCILE_WORKERS: int = 8
+    STRIPE_QUERY_RATE_LIMIT: float = 20  # provider queries per second
+    BKASH_QUERY_RATE_LIMIT: float = 5
+    
+    # Payment provider HTTP client
+    PAYMENT_HTTP_CONNECT_TIMEOUT: float = 3.05
+    PAYMENT_HTTP_READ_TIMEOUT: float = 15.0
+    PAYMENT_HTTP_POOL_SIZE: int = 20  # keep-alive connections per provider
+    PAYMENT_HTTP_MAX_RETRIES: int = 2  # for idempotent calls only
+    PAYMENT_HTTP_RETRY_BACKOFF: float = 0.2  # seconds, doubled per attempt
+    
+    # Payment provider circuit breaker and bulkhead
+    CIRCUIT_BREAKER_WINDOW_SECONDS: int = 30
+    CIRCUIT_BREAKER_MIN_CALLS: int = 10  # calls in the window before rates are judged
+    CIRCUIT_BREAKER_ERROR_RATE: float = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 5.0
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.8
+    CIRCUIT_BREAKER_OPEN_SECONDS: int = 30  # fail fast this long before trying again
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = 3
+    PAYMENT_PROVIDER_MAX_CONCURRENCY: int = 10  # per provider, well below the request threadpool size
+    PAYMENT_BULKHEAD_WAIT_SECONDS: float = 0.5
+    
+    # Payment provider mode: live (real APIs), simulated (in-process simulator)
+    # or stub (real provider clients against a local HTTP stub of both APIs)
+    PAYMENT_PROVIDER_MODE: str = "live"
+    PAYMENT_SIMULATOR_LATENCY_MS: float = 150  # median of the log-normal call latency
+    PAYMENT_SIMULATOR_LATENCY_SIGMA: float = 0.5  # log-normal spread; 0 for a fixed latency
+    PAYMENT_SIMULATOR_ERROR_RATE: float = 0.0  # calls that fail like an outage (5xx / timeout)
+    PAYMENT_SIMULATOR_DECLINE_RATE: float = 0.05  # payments that end failed
+    PAYMENT_SIMULATOR_SETTLE_SECONDS: float = 2.0  # Stripe intents succeed this long after creation
+    PAYMENT_SIMULATOR_WEBHOOK_URL: Optional[str] = None  # base URL of this API; no webhooks if unset
+    PAYMENT_SIMULATOR_WEBHOOK_DELAY_SECONDS: float = 1.0
+    PAYMENT_SIMULATOR_WEBHOOK_DROP_RATE: float = 0.0  # webhooks never sent (left to reconciliation)
+    PAYMENT_SIMULATOR_SEED: Optional[int] = None
+
     # Stripe
     STRIPE_SECRET_KEY: Optional[str] = None
     STRIPE_PUBLISHABLE_KEY: Optional[str] = None
@@ -26,6 +95,7 @@ class Settings(BaseSettings):
     BKASH_PASSWORD: Optional[str] = None
     BKASH_BASE_URL: str = "https://tokenized.sandbox.bka.sh/v1.2.0-beta"
     BKASH_WEBHOOK_SECRET: Optional[str] = None
+    BKASH_TOKEN_REFRESH_MARGIN: int = 300  # renew the shared grant token this many seconds before expiry
     
     # Environment
     ENVIRONMENT: str = "development"
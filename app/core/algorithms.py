@@ -1,5 +1,6 @@
 from decimal import Decimal
-from typing import List
+from typing import List, Sequence
+from app.core.money import Money
 from app.models.order import OrderItem
 
 
@@ -8,20 +9,23 @@ def calculate_subtotal(quantity: int, price: Decimal) -> Decimal:
     Deterministic algorithm to calculate subtotal.
     Always returns the same result for the same inputs.
     """
-    return Decimal(str(quantity)) * Decimal(str(price))
+    return (Money.from_decimal(price) * quantity).to_decimal()
+
+
+def calculate_subtotals(quantities: Sequence[int], prices: Sequence[Money]) -> List[Money]:
+    """
+    Calculate the subtotals of a whole cart at once.
+    Works on integer cents, so each line is a single integer multiply.
+    """
+    return [Money(price.cents * quantity) for quantity, price in zip(quantities, prices)]
 
 
 def calculate_order_total(order_items: List[OrderItem]) -> Decimal:
     """
     Deterministic algorithm to calculate order total.
-    Sums all subtotals in a consistent order.
-    """
-    total = Decimal('0.00')
-    # Sort by item id if available, otherwise maintain order
-    sorted_items = sorted(order_items, key=lambda x: x.id if x.id else 0)
-    for item in sorted_items:
-        total += Decimal(str(item.subtotal))
-    return total
+    Subtotals are summed as integer cents, which is exact in any order.
+    """
+    return Money.sum(Money.from_decimal(item.subtotal) for item in order_items).to_decimal()
 
 
 def reduce_stock_quantity(current_stock: int, quantity_to_reduce: int) -> int:
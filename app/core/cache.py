@@ -1,10 +1,19 @@
 import json
 import redis
-from typing import Optional, Any
+from typing import Optional, Any, Iterable
 from app.config import settings
 
 redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
 
+TAG_KEY_PREFIX = "tag:"
+# Tag sets must outlive the entries registered under them
+TAG_TTL = 86400
+UNLINK_BATCH_SIZE = 500
+
+
+def _tag_key(tag: str) -> str:
+    return f"{TAG_KEY_PREFIX}{tag}"
+
 
 def get_cache(key: str) -> Optional[Any]:
     """Get value from cache"""
@@ -17,10 +26,19 @@ def get_cache(key: str) -> Optional[Any]:
         return None
 
 
-def set_cache(key: str, value: Any, ttl: int = 3600) -> bool:
-    """Set value in cache with TTL (default 1 hour)"""
+def set_cache(key: str, value: Any, ttl: int = 3600, tags: Optional[Iterable[str]] = None) -> bool:
+    """
+    Set value in cache with TTL (default 1 hour).
+    The key is registered under each of the given tags (e.g. "category:12")
+    so it can later be removed with invalidate_tags.
+    """
     try:
-        redis_client.setex(key, ttl, json.dumps(value, default=str))
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(key, ttl, json.dumps(value, default=str))
+        for tag in tags or ():
+            pipe.sadd(_tag_key(tag), key)
+            pipe.expire(_tag_key(tag), max(ttl, TAG_TTL))
+        pipe.execute()
         return True
     except Exception:
         return False
@@ -35,12 +53,65 @@ def delete_cache(key: str) -> bool:
         return False
 
 
-def delete_cache_pattern(pattern: str) -> bool:
-    """Delete all keys matching a pattern"""
+def get_counter(key: str) -> Optional[int]:
+    """Get an integer counter from cache (0 if unset, None if cache is unavailable)"""
+    try:
+        value = redis_client.get(key)
+        return int(value) if value is not None else 0
+    except Exception:
+        return None
+
+
+def increment_counter(key: str) -> Optional[int]:
+    """Atomically increment an integer counter and return the new value"""
+    try:
+        return redis_client.incr(key)
+    except Exception:
+        return None
+
+
+def invalidate_tags(*tags: str) -> bool:
+    """
+    Delete every key registered under any of the given tags.
+    Cost scales with the number of tagged keys, not the size of the keyspace.
+    """
+    if not tags:
+        return True
     try:
-        keys = redis_client.keys(pattern)
+        # Read and drop the tag sets atomically so concurrent registrations
+        # land in a fresh set instead of being lost
+        pipe = redis_client.pipeline(transaction=True)
+        for tag in tags:
+            pipe.smembers(_tag_key(tag))
+        pipe.unlink(*[_tag_key(tag) for tag in tags])
+        results = pipe.execute()
+
+        keys = list(set().union(*results[:-1]))
         if keys:
-            redis_client.delete(*keys)
+            pipe = redis_client.pipeline(transaction=False)
+            for i in range(0, len(keys), UNLINK_BATCH_SIZE):
+                pipe.unlink(*keys[i:i + UNLINK_BATCH_SIZE])
+            pipe.execute()
+        return True
+    except Exception:
+        return False
+
+
+def delete_cache_pattern(pattern: str) -> bool:
+    """
+    Delete all keys matching a pattern.
+    Walks the keyspace incrementally with SCAN instead of blocking on KEYS;
+    prefer invalidate_tags for anything on a request path.
+    """
+    try:
+        batch = []
+        for key in redis_client.scan_iter(match=pattern, count=UNLINK_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= UNLINK_BATCH_SIZE:
+                redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            redis_client.unlink(*batch)
         return True
     except Exception:
         return False
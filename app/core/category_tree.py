@@ -0,0 +1,112 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.cache import get_counter, increment_counter
+from app.models.category import Category
+
+CATEGORY_TREE_VERSION_KEY = "category_tree:version"
+
+
+@dataclass(frozen=True)
+class CategoryTreeSnapshot:
+    """
+    Immutable in-memory copy of the category forest.
+    Categories are laid out in DFS preorder, so every subtree is a
+    contiguous span of the preorder array.
+    """
+    version: Optional[int]
+    parent: Dict[int, Optional[int]]
+    children: Dict[int, Tuple[int, ...]]
+    preorder: Tuple[int, ...]
+    spans: Dict[int, Tuple[int, int]]
+
+    @classmethod
+    def build(cls, rows: List[Tuple[int, Optional[int]]], version: Optional[int]) -> "CategoryTreeSnapshot":
+        """Build a snapshot from (id, parent_id) rows"""
+        parent: Dict[int, Optional[int]] = {}
+        children: Dict[int, List[int]] = {}
+        for category_id, parent_id in sorted(rows):
+            parent[category_id] = parent_id
+            children.setdefault(category_id, [])
+        roots = []
+        for category_id, parent_id in parent.items():
+            if parent_id in parent:
+                children[parent_id].append(category_id)
+            else:
+                roots.append(category_id)
+
+        # Iterative DFS so deep trees don't hit the recursion limit
+        preorder: List[int] = []
+        spans: Dict[int, Tuple[int, int]] = {}
+        for root in roots:
+            stack = [(root, False)]
+            while stack:
+                category_id, exiting = stack.pop()
+                if exiting:
+                    spans[category_id] = (spans[category_id][0], len(preorder))
+                    continue
+                if category_id in spans:
+                    continue
+                spans[category_id] = (len(preorder), len(preorder))
+                preorder.append(category_id)
+                stack.append((category_id, True))
+                for child_id in reversed(children[category_id]):
+                    stack.append((child_id, False))
+
+        return cls(
+            version=version,
+            parent=parent,
+            children={k: tuple(v) for k, v in children.items()},
+            preorder=tuple(preorder),
+            spans=spans
+        )
+
+    def subtree_ids(self, category_id: int) -> List[int]:
+        """Get ids of the category and all of its descendants in DFS order"""
+        span = self.spans.get(category_id)
+        if span is None:
+            return []
+        return list(self.preorder[span[0]:span[1]])
+
+
+_snapshot: Optional[CategoryTreeSnapshot] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_category_snapshot(db: Session) -> CategoryTreeSnapshot:
+    """
+    Get this worker's category tree snapshot, rebuilding it if stale.
+    The shared version counter is only consulted every
+    CATEGORY_TREE_CHECK_INTERVAL seconds, so most calls cost no round trips.
+    """
+    global _snapshot, _checked_at
+
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _checked_at < settings.CATEGORY_TREE_CHECK_INTERVAL:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and time.monotonic() - _checked_at < settings.CATEGORY_TREE_CHECK_INTERVAL:
+            return snapshot
+
+        # Without a reachable version counter, fall back to rebuilding every interval
+        version = get_counter(CATEGORY_TREE_VERSION_KEY)
+        if snapshot is None or version is None or version != snapshot.version:
+            rows = db.query(Category.id, Category.parent_id).all()
+            snapshot = CategoryTreeSnapshot.build([tuple(row) for row in rows], version)
+            _snapshot = snapshot
+        _checked_at = time.monotonic()
+        return snapshot
+
+
+def invalidate_category_snapshot():
+    """Drop the local snapshot and tell other workers to rebuild theirs"""
+    global _snapshot
+    increment_counter(CATEGORY_TREE_VERSION_KEY)
+    with _lock:
+        _snapshot = None
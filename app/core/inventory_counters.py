@@ -0,0 +1,101 @@
+import random
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.core.cache import redis_client
+
+# Take up to ARGV[1] units from one shard; -1 if the shard was never seeded
+_TAKE_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return -1
+end
+local available = tonumber(value)
+if available <= 0 then
+    return 0
+end
+local taken = math.min(available, tonumber(ARGV[1]))
+redis.call('DECRBY', KEYS[1], taken)
+return taken
+"""
+
+
+class HotStockCounters:
+    """
+    Available-to-sell stock for hot products, split across N Redis counters.
+    Each decrement touches a single shard key through a Lua script, so
+    concurrent checkouts for one SKU never serialize on a database row lock
+    and shards can live on different Redis Cluster slots.
+    """
+
+    def __init__(self, client=None, shards: Optional[int] = None):
+        self.client = client or redis_client
+        self.shards = shards or settings.HOT_STOCK_SHARDS
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    def shard_keys(self, product_id: int) -> List[str]:
+        return [f"hot_stock:{product_id}:{shard}" for shard in range(self.shards)]
+
+    def seed(self, product_id: int, quantity: int, overwrite: bool = False):
+        """Spread quantity evenly over the shards (only unseeded shards unless overwrite)"""
+        base, extra = divmod(max(quantity, 0), self.shards)
+        pipe = self.client.pipeline(transaction=True)
+        for index, key in enumerate(self.shard_keys(product_id)):
+            pipe.set(key, base + (1 if index < extra else 0), nx=not overwrite)
+        pipe.execute()
+
+    def is_seeded(self, product_id: int) -> bool:
+        return all(value is not None for value in self.client.mget(self.shard_keys(product_id)))
+
+    def take(self, product_id: int, quantity: int) -> bool:
+        """
+        Atomically take quantity units, gathering from several shards if needed.
+        Returns False (with nothing taken) when the shards can't cover it.
+        Raises LookupError if the product's counters were never seeded.
+        """
+        keys = self.shard_keys(product_id)
+        start = random.randrange(self.shards)
+        remaining = quantity
+        taken: List[Tuple[str, int]] = []
+        missing = False
+        for offset in range(self.shards):
+            key = keys[(start + offset) % self.shards]
+            got = int(self._take(keys=[key], args=[remaining]))
+            if got < 0:
+                missing = True
+                continue
+            if got:
+                taken.append((key, got))
+                remaining -= got
+            if remaining == 0:
+                return True
+
+        self._refund(taken)
+        if missing:
+            raise LookupError(f"Hot stock counters for product {product_id} are not seeded")
+        return False
+
+    def give_back(self, product_id: int, quantity: int) -> bool:
+        """Return units to a random shard; False if the counters are gone"""
+        key = random.choice(self.shard_keys(product_id))
+        if self.client.exists(key):
+            self.client.incrby(key, quantity)
+            return True
+        return False
+
+    def total(self, product_id: int) -> Optional[int]:
+        """Sum of all shards, or None if the counters aren't fully seeded"""
+        values = self.client.mget(self.shard_keys(product_id))
+        if any(value is None for value in values):
+            return None
+        return sum(int(value) for value in values)
+
+    def clear(self, product_id: int):
+        self.client.delete(*self.shard_keys(product_id))
+
+    def _refund(self, taken: List[Tuple[str, int]]):
+        if not taken:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, amount in taken:
+            pipe.incrby(key, amount)
+        pipe.execute()
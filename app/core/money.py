@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, Union
+
+CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True, order=True)
+class Money:
+    """
+    An amount of money held as integer minor units (cents).
+    Integer arithmetic is exact and cheap, so totals never drift and
+    nothing needs a float round-trip on the way to a payment provider.
+    """
+    cents: int
+
+    @classmethod
+    def from_decimal(cls, value: Union[Decimal, int, str]) -> "Money":
+        """Convert a decimal amount (e.g. a Numeric(10, 2) column), rounding half up to the cent"""
+        return cls(int(Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP) * 100))
+
+    @classmethod
+    def sum(cls, amounts: Iterable["Money"]) -> "Money":
+        return cls(sum(amount.cents for amount in amounts))
+
+    def to_decimal(self) -> Decimal:
+        return (Decimal(self.cents) / 100).quantize(CENT)
+
+    def __add__(self, other: "Money") -> "Money":
+        return Money(self.cents + other.cents)
+
+    def __mul__(self, quantity: int) -> "Money":
+        return Money(self.cents * quantity)
+
+    __rmul__ = __mul__
+
+    def __str__(self) -> str:
+        sign = "-" if self.cents < 0 else ""
+        units, cents = divmod(abs(self.cents), 100)
+        return f"{sign}{units}.{cents:02d}"
@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+from passlib.context import CryptContext
+from app.config import settings
+from app.utils.logger import logger
+
+T = TypeVar("T")
+
+DUMMY_PASSWORD = "dummy-password"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_slots: Optional[threading.BoundedSemaphore] = None
+_dummy_hashes: Dict[int, str] = {}
+
+
+class PasswordHashingBusyError(Exception):
+    """Too many password hashes are already queued; the caller should retry later"""
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    # Hashes made with any other cost count as deprecated, so logins upgrade them
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, password_hash: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, password_hash)
+
+
+def _workers() -> int:
+    if settings.PASSWORD_HASH_WORKERS is None:
+        return os.cpu_count() or 1
+    return settings.PASSWORD_HASH_WORKERS
+
+
+def _get_pool() -> Tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs threads can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=_workers(), mp_context=multiprocessing.get_context("spawn"))
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+            # Hash the dummy password while the pool starts, so the first unknown-email login costs one verify
+            rounds = settings.BCRYPT_ROUNDS
+            if rounds not in _dummy_hashes:
+                _pool.submit(_hash, DUMMY_PASSWORD, rounds).add_done_callback(partial(_store_dummy_hash, rounds))
+        return _pool, _slots
+
+
+def _store_dummy_hash(rounds: int, future: Future):
+    if not future.cancelled() and future.exception() is None:
+        _dummy_hashes.setdefault(rounds, future.result())
+
+
+def _discard_pool(broken: ProcessPoolExecutor):
+    """Forget a pool that lost a worker, so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(call: Callable[..., T], *args) -> T:
+    """
+    Run one bcrypt operation on the hashing process pool.
+    At most PASSWORD_HASH_MAX_PENDING operations are queued or running at a
+    time, so a login burst ties up a bounded number of request threads;
+    callers that can't get a slot within PASSWORD_HASH_WAIT_SECONDS get
+    PasswordHashingBusyError. With PASSWORD_HASH_WORKERS=0 it runs inline.
+    If a worker process died (OOM kill, crash) the pool is replaced and the
+    operation retried once.
+    """
+    if _workers() == 0:
+        return call(*args)
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=settings.PASSWORD_HASH_WAIT_SECONDS):
+        raise PasswordHashingBusyError("Too many sign-ins in progress, please retry shortly")
+    try:
+        try:
+            return pool.submit(call, *args).result()
+        except BrokenProcessPool:
+            logger.warning("Password hashing worker died; restarting the pool")
+            _discard_pool(pool)
+            pool, _ = _get_pool()
+            return pool.submit(call, *args).result()
+    finally:
+        slots.release()
+
+
+def check_password_length(password: str):
+    """Raise ValueError for passwords bcrypt would silently truncate"""
+    if len(password.encode('utf-8')) > 72:
+        raise ValueError('Password cannot be longer than 72 bytes')
+
+
+def hash_password(password: str) -> str:
+    """Hash a password at BCRYPT_ROUNDS off the request thread"""
+    check_password_length(password)
+    return _run(_hash, password, settings.BCRYPT_ROUNDS)
+
+
+def verify_and_update(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password off the request thread.
+    Returns (valid, new_hash); new_hash is set when the stored hash was made
+    with a different cost than BCRYPT_ROUNDS and should replace it.
+    """
+    return _run(_verify_and_update, password, password_hash, settings.BCRYPT_ROUNDS)
+
+
+def dummy_verify(password: str):
+    """Spend the same work as a real verify, so unknown emails can't be told apart by timing"""
+    rounds = settings.BCRYPT_ROUNDS
+    if rounds not in _dummy_hashes:
+        _dummy_hashes[rounds] = _run(_hash, DUMMY_PASSWORD, rounds)
+    _run(_verify_and_update, password, _dummy_hashes[rounds], rounds)
+
+
+def start_password_hasher():
+    """Start the hashing processes ahead of the first sign-in"""
+    if _workers() > 0:
+        _get_pool()
+
+
+def shutdown_password_hasher():
+    """Stop the hashing processes (a new pool is started on next use)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.user import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, as stated by a verified access token"""
+    id: int
+    email: str
+    is_admin: bool
+    token_version: int
+
+    @classmethod
+    def from_claims(cls, claims: Dict[str, Any]) -> Optional["Principal"]:
+        """Build from token claims; None for tokens issued without is_admin/ver"""
+        if claims.get("user_id") is None or claims.get("ver") is None or "is_admin" not in claims:
+            return None
+        return cls(
+            id=int(claims["user_id"]),
+            email=claims["sub"],
+            is_admin=bool(claims["is_admin"]),
+            token_version=int(claims["ver"])
+        )
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, email=user.email, is_admin=user.is_admin, token_version=user.token_version)
+
+
+_versions: "OrderedDict[int, Tuple[Optional[int], float]]" = OrderedDict()  # user_id -> (version, checked_at)
+_lock = threading.Lock()
+
+
+def current_token_version(db: Session, user_id: int) -> Optional[int]:
+    """
+    A user's current token version, or None if the user no longer exists.
+    Each worker remembers versions for TOKEN_VERSION_CACHE_SECONDS (at most
+    TOKEN_VERSION_CACHE_SIZE users), so an authenticated request costs no
+    query in the common case and a revoked token stops working within that
+    window on every worker.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _versions.get(user_id)
+        if cached is not None and now - cached[1] < settings.TOKEN_VERSION_CACHE_SECONDS:
+            _versions.move_to_end(user_id)
+            return cached[0]
+
+    version = db.query(User.token_version).filter(User.id == user_id).scalar()
+    with _lock:
+        _versions[user_id] = (version, now)
+        _versions.move_to_end(user_id)
+        while len(_versions) > settings.TOKEN_VERSION_CACHE_SIZE:
+            _versions.popitem(last=False)
+    return version
+
+
+def invalidate_token_version(user_id: Optional[int] = None):
+    """Forget a cached version (all of them when user_id is None)"""
+    with _lock:
+        if user_id is None:
+            _versions.clear()
+        else:
+            _versions.pop(user_id, None)
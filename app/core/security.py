@@ -3,8 +3,10 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.config import settings
+from app.core.password_hashing import check_password_length
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# For scripts and tests; request handlers hash through app.core.password_hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -15,8 +17,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     # Ensure password doesn't exceed bcrypt's 72-byte limit
-    if len(password.encode('utf-8')) > 72:
-        raise ValueError('Password cannot be longer than 72 bytes')
+    check_password_length(password)
     return pwd_context.hash(password)
 
 
@@ -0,0 +1,30 @@
+"""
+Incrementally rebuild the "bought together" index from order_items.
+
+Run periodically, e.g. from cron:
+    python -m app.jobs.copurchase
+"""
+from app.database import SessionLocal
+from app.services.recommendation_service import RecommendationService
+from app.utils.logger import logger
+
+
+def run(batch_size: int = 1000) -> int:
+    """Consume all order items past the stored high-water mark"""
+    db = SessionLocal()
+    try:
+        service = RecommendationService(db)
+        total = 0
+        while True:
+            processed = service.update_copurchase_index(batch_size=batch_size)
+            if not processed:
+                break
+            total += processed
+        logger.info(f"Co-purchase index updated with {total} order items")
+        return total
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run()
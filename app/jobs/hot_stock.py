@@ -0,0 +1,41 @@
+"""
+Write hot products' Redis stock counters back to products.stock.
+
+Run once, or keep it running with --loop to flush every
+HOT_STOCK_FLUSH_INTERVAL seconds:
+    python -m app.jobs.hot_stock --loop
+"""
+import sys
+import time
+from app.config import settings
+from app.database import SessionLocal
+from app.services.inventory_service import InventoryService
+from app.utils.logger import logger
+
+
+def run() -> int:
+    """Flush every hot product's counters once"""
+    db = SessionLocal()
+    try:
+        flushed = InventoryService(db).flush_hot_stock()
+        logger.info(f"Flushed hot stock counters for {flushed} products")
+        return flushed
+    finally:
+        db.close()
+
+
+def run_forever():
+    """Flush on a fixed interval until interrupted"""
+    while True:
+        try:
+            run()
+        except Exception as e:
+            logger.error(f"Hot stock flush failed: {str(e)}")
+        time.sleep(settings.HOT_STOCK_FLUSH_INTERVAL)
+
+
+if __name__ == "__main__":
+    if "--loop" in sys.argv:
+        run_forever()
+    else:
+        run()
@@ -0,0 +1,30 @@
+"""
+Delete saved Idempotency-Key responses once they have expired.
+
+Run hourly or so, e.g. from cron:
+    python -m app.jobs.idempotency
+"""
+from app.database import SessionLocal
+from app.services.idempotency_service import IdempotencyService
+from app.utils.logger import logger
+
+
+def run(batch_size: int = 1000) -> int:
+    """Purge every expired idempotency key"""
+    db = SessionLocal()
+    try:
+        service = IdempotencyService(db)
+        total = 0
+        while True:
+            purged = service.purge_expired(batch_size=batch_size)
+            if not purged:
+                break
+            total += purged
+        logger.info(f"Purged {total} expired idempotency keys")
+        return total
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run()
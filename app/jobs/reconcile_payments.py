@@ -0,0 +1,27 @@
+"""
+Settle pending payments whose webhook never arrived by querying the providers.
+
+Run every few minutes, e.g. from cron:
+    python -m app.jobs.reconcile_payments
+"""
+from app.database import SessionLocal
+from app.services.reconciliation_service import ReconciliationService
+from app.utils.logger import logger
+
+
+def run(page_size: int = 200) -> dict:
+    """Query every stale pending payment once"""
+    db = SessionLocal()
+    try:
+        counts = ReconciliationService(db).reconcile(page_size=page_size)
+        logger.info(
+            f"Reconciled payments: checked {counts['checked']}, changed {counts['changed']}, "
+            f"settled orders {counts['settled']}"
+        )
+        return counts
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run()
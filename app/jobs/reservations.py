@@ -0,0 +1,30 @@
+"""
+Release stock held by pending orders whose reservations have expired.
+
+Run every minute or so, e.g. from cron:
+    python -m app.jobs.reservations
+"""
+from app.database import SessionLocal
+from app.services.inventory_service import InventoryService
+from app.utils.logger import logger
+
+
+def run(batch_size: int = 500) -> int:
+    """Release every reservation that is past its expiry"""
+    db = SessionLocal()
+    try:
+        service = InventoryService(db)
+        total = 0
+        while True:
+            released = service.release_expired_reservations(batch_size=batch_size)
+            if not released:
+                break
+            total += released
+        logger.info(f"Released {total} expired stock reservations")
+        return total
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run()
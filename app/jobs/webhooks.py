@@ -0,0 +1,69 @@
+"""
+Process stored provider webhooks and purge finished ones past the dedupe window.
+
+Drain the inbox once, or keep a pool of WEBHOOK_WORKERS threads polling it:
+    python -m app.jobs.webhooks --loop
+"""
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.database import SessionLocal
+from app.services.webhook_service import WebhookService
+from app.utils.logger import logger
+
+
+def run(batch_size: int = 50) -> int:
+    """Process every webhook event that is currently due"""
+    db = SessionLocal()
+    try:
+        service = WebhookService(db)
+        total = 0
+        while True:
+            processed = service.process_due_events(batch_size=batch_size)
+            if not processed:
+                break
+            total += processed
+        purged = 0
+        while True:
+            batch = service.purge_expired()
+            if not batch:
+                break
+            purged += batch
+        logger.info(f"Processed {total} webhook events, purged {purged} past the dedupe window")
+        return total
+    finally:
+        db.close()
+
+
+def _worker(stop: threading.Event):
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            processed = WebhookService(db).process_due_events()
+        except Exception as e:
+            logger.error(f"Webhook worker failed: {str(e)}")
+            processed = 0
+        finally:
+            db.close()
+        if not processed:
+            stop.wait(settings.WEBHOOK_POLL_INTERVAL)
+
+
+def run_forever():
+    """Run WEBHOOK_WORKERS polling workers until interrupted"""
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=settings.WEBHOOK_WORKERS, thread_name_prefix="webhook") as pool:
+        for _ in range(settings.WEBHOOK_WORKERS):
+            pool.submit(_worker, stop)
+        try:
+            stop.wait()
+        except KeyboardInterrupt:
+            stop.set()
+
+
+if __name__ == "__main__":
+    if "--loop" in sys.argv:
+        run_forever()
+    else:
+        run()
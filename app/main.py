@@ -1,13 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import auth, products, orders, payments
 from app.api.webhooks import stripe, bkash
 from app.config import settings
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.payment.registry import init_providers, shutdown_providers
+from app.payment.http import latency_snapshot
+from app.payment.resilience import resilience_snapshot
+from app.core.password_hashing import start_password_hasher, shutdown_password_hasher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Payment providers are shared by all requests in this worker
+    init_providers()
+    start_password_hasher()
+    yield
+    shutdown_providers()
+    shutdown_password_hasher()
+
 
 app = FastAPI(
     title="E-commerce Backend API",
     description="Backend system for managing users, products, orders, and payments",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -17,6 +35,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
@@ -35,4 +54,8 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "payment_providers": latency_snapshot(),
+        "circuit_breakers": resilience_snapshot()
+    }
@@ -1,7 +1,13 @@
 from app.models.user import User
-from app.models.category import Category
+from app.models.category import Category, CategoryClosure
 from app.models.product import Product
 from app.models.order import Order, OrderItem
-from app.models.payment import Payment
+from app.models.payment import Payment, PaymentEvent
+from app.models.recommendation import ProductCopurchase, CopurchaseOrder, JobWatermark
+from app.models.reservation import StockReservation
+from app.models.idempotency import IdempotencyKey
+from app.models.webhook import WebhookEvent
 
-__all__ = ["User", "Category", "Product", "Order", "OrderItem", "Payment"]
+__all__ = ["User", "Category", "CategoryClosure", "Product", "Order", "OrderItem", "Payment",
+           "PaymentEvent", "ProductCopurchase", "CopurchaseOrder", "JobWatermark", "StockReservation",
+           "IdempotencyKey", "WebhookEvent"]
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, event, select, literal, union_all, and_, delete, inspect, true
+from sqlalchemy.orm import relationship, object_session, Session
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -18,3 +18,117 @@ class Category(Base):
     
     # Relationships
     products = relationship("Product", back_populates="category", cascade="all, delete-orphan")
+
+
+class CategoryClosure(Base):
+    """
+    Closure table for the category hierarchy.
+    Holds one row per (ancestor, descendant) pair, including each category
+    paired with itself at depth 0, so a whole subtree is a single indexed lookup.
+    """
+    __tablename__ = "category_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_category_closure_descendant_id", "descendant_id"),
+    )
+
+
+closure_table = CategoryClosure.__table__
+
+
+def _mark_tree_changed(target, *category_ids):
+    """Record changed categories so snapshots and caches are invalidated on commit"""
+    session = object_session(target)
+    if session is not None:
+        changed = session.info.setdefault("category_tree_changed", set())
+        changed.update(cid for cid in category_ids if cid is not None)
+
+
+@event.listens_for(Category, "after_insert")
+def _insert_closure_paths(mapper, connection, target):
+    """Link a new category to itself and to every ancestor of its parent"""
+    _mark_tree_changed(target, target.parent_id)
+    paths = select(
+        closure_table.c.ancestor_id,
+        literal(target.id),
+        closure_table.c.depth + 1
+    ).where(closure_table.c.descendant_id == target.parent_id)
+    self_path = select(literal(target.id), literal(target.id), literal(0))
+    connection.execute(
+        closure_table.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            union_all(paths, self_path)
+        )
+    )
+
+
+@event.listens_for(Category, "after_update")
+def _move_closure_paths(mapper, connection, target):
+    """Re-hang a category's subtree when its parent changes"""
+    if not inspect(target).attrs.parent_id.history.has_changes():
+        return
+    # Subtrees that contained the category, and those that now will
+    _mark_tree_changed(target, target.id, target.parent_id)
+
+    subtree = select(closure_table.c.descendant_id).where(closure_table.c.ancestor_id == target.id)
+
+    # Detach the subtree from its old ancestors (paths inside the subtree are kept)
+    connection.execute(
+        delete(closure_table).where(
+            closure_table.c.descendant_id.in_(subtree),
+            closure_table.c.ancestor_id.not_in(subtree)
+        )
+    )
+
+    if target.parent_id is None:
+        return
+
+    # Attach it under every ancestor of the new parent
+    supertree = closure_table.alias("supertree")
+    sub = closure_table.alias("sub")
+    connection.execute(
+        closure_table.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(
+                supertree.c.ancestor_id,
+                sub.c.descendant_id,
+                supertree.c.depth + sub.c.depth + 1
+            ).select_from(
+                supertree.join(sub, true())
+            ).where(and_(
+                supertree.c.descendant_id == target.parent_id,
+                sub.c.ancestor_id == target.id
+            ))
+        )
+    )
+
+
+@event.listens_for(Category, "after_delete")
+def _delete_closure_paths(mapper, connection, target):
+    """Drop every path touching a deleted category"""
+    _mark_tree_changed(target, target.id)
+    connection.execute(
+        delete(closure_table).where(
+            (closure_table.c.ancestor_id == target.id) | (closure_table.c.descendant_id == target.id)
+        )
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_tree_change(session):
+    """Invalidate tree snapshots and tagged caches once hierarchy changes are committed"""
+    changed = session.info.pop("category_tree_changed", None)
+    if changed is not None:
+        from app.core.cache import invalidate_tags
+        from app.core.category_tree import invalidate_category_snapshot
+        invalidate_category_snapshot()
+        invalidate_tags(*[f"category:{cid}" for cid in changed])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tree_change(session):
+    session.info.pop("category_tree_changed", None)
@@ -18,6 +18,12 @@ class Order(Base):
     user = relationship("User", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     payments = relationship("Payment", back_populates="order", cascade="all, delete-orphan")
+    reservations = relationship("StockReservation", back_populates="order", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Keyset pagination of a user's order history
+        Index("ix_orders_user_id_id", "user_id", "id"),
+    )
 
 
 class OrderItem(Base):
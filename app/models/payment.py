@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+import json
+import zlib
+from typing import Any, Dict, Optional
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -12,9 +15,48 @@ class Payment(Base):
     provider = Column(String(50), nullable=False, index=True)  # stripe, bkash
     transaction_id = Column(String(255), unique=True, nullable=False, index=True)
     status = Column(String(20), default="pending", nullable=False, index=True)  # pending, success, failed
-    raw_response = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        # Reconciliation pages through pending payments by id
+        Index("ix_payments_status_id", "status", "id"),
+    )
+
     # Relationships
     order = relationship("Order", back_populates="payments")
+    events = relationship("PaymentEvent", back_populates="payment", order_by="PaymentEvent.id")
+
+
+class PaymentEvent(Base):
+    """
+    One provider response for a payment (create, confirm, query, webhook), append-only.
+    Payloads are stored zlib-compressed JSON, away from the hot payments rows.
+    """
+    __tablename__ = "payment_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    payment_id = Column(Integer, ForeignKey("payments.id"), nullable=False)
+    source = Column(String(20), nullable=False)  # create, confirm, query, webhook, reconcile, migrated
+    status = Column(String(20), nullable=False)  # payment status the provider reported
+    payload_zlib = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # History is read per payment in insertion order
+        Index("ix_payment_events_payment_id_id", "payment_id", "id"),
+    )
+
+    payment = relationship("Payment", back_populates="events")
+
+    @staticmethod
+    def compress(payload: Optional[Dict[str, Any]]) -> Optional[bytes]:
+        if payload is None:
+            return None
+        return zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode())
+
+    @property
+    def payload(self) -> Optional[Dict[str, Any]]:
+        if self.payload_zlib is None:
+            return None
+        return json.loads(zlib.decompress(self.payload_zlib))
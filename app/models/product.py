@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, ForeignKey, DateTime, Index
+from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, ForeignKey, DateTime, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -13,6 +13,8 @@ class Product(Base):
     description = Column(Text, nullable=True)
     price = Column(Numeric(10, 2), nullable=False)
     stock = Column(Integer, default=0, nullable=False)
+    reserved_stock = Column(Integer, default=0, nullable=False)  # held by active reservations
+    is_hot = Column(Boolean, default=False, nullable=False)  # stock held in sharded Redis counters
     status = Column(String(20), default="active", nullable=False, index=True)  # active/inactive
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -21,3 +23,63 @@ class Product(Base):
     # Relationships
     category = relationship("Category", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Filtered and sorted product listings
+        Index("ix_products_status_category_id_price", "status", "category_id", "price"),
+        Index("ix_products_status_price", "status", "price"),
+        Index("ix_products_status_name", "status", "name"),
+    )
+
+    @property
+    def available_stock(self) -> int:
+        """Stock that can still be sold (not held by pending orders)"""
+        return self.stock - (self.reserved_stock or 0)
+
+
+# Full-text search support. Postgres gets a generated tsvector column with a
+# GIN index plus trigram matching on names; SQLite (used by the test suite)
+# gets an FTS5 index kept in sync by triggers. Alembic migration 005 applies
+# the Postgres side to existing databases.
+_search_ddl = [
+    ("postgresql", """
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(sku, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """),
+    ("postgresql", "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)"),
+    ("postgresql", "CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    ("postgresql", "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)"),
+    ("sqlite", """
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, sku, description, content='products', content_rowid='id'
+        )
+    """),
+    ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, sku, description)
+            VALUES (new.id, new.name, new.sku, new.description);
+        END
+    """),
+    ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, sku, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.description);
+        END
+    """),
+    ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, sku, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.description);
+            INSERT INTO products_fts (rowid, name, sku, description)
+            VALUES (new.id, new.name, new.sku, new.description);
+        END
+    """),
+]
+
+for _dialect, _statement in _search_ddl:
+    event.listen(Product.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+event.listen(Product.__table__, "before_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
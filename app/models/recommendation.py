@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, DateTime, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ProductCopurchase(Base):
+    """How many orders contained both product_id and related_product_id"""
+    __tablename__ = "product_copurchases"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    related_product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Top-K lookups read this index in order
+        Index("ix_product_copurchases_product_id_score", "product_id", "score"),
+    )
+
+
+class CopurchaseOrder(Base):
+    """An order already folded into the co-purchase counts, kept while it is inside the re-scan window"""
+    __tablename__ = "copurchase_orders"
+
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), primary_key=True)
+    last_item_id = Column(BigInteger, nullable=False, index=True)
+
+
+class JobWatermark(Base):
+    """High-water mark of rows already consumed by an incremental batch job"""
+    __tablename__ = "job_watermarks"
+
+    name = Column(String(100), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class StockReservation(Base):
+    """Stock held for a pending order until it is paid, canceled or expires"""
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(20), default="active", nullable=False)  # active, converted, released
+    source = Column(String(10), default="db", nullable=False)  # db (reserved_stock) or redis (hot counters)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Sweeper scans active reservations by expiry
+        Index("ix_stock_reservations_status_expires_at", "status", "expires_at"),
+    )
+
+    # Relationships
+    order = relationship("Order", back_populates="reservations")
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class WebhookEvent(Base):
+    """Verified provider webhook waiting to be processed by the webhook workers"""
+    __tablename__ = "webhook_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String(50), nullable=False)  # stripe, bkash
+    event_id = Column(String(255), nullable=False)  # same for every redelivery of one event
+    payload = Column(JSON, nullable=False)
+    verified = Column(Boolean, default=False, nullable=False)  # signature checked, payload can be trusted
+    status = Column(String(20), default="pending", nullable=False)  # pending, processing, processed, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)  # when it was processed or given up on
+
+    __table_args__ = (
+        # Redeliveries are dropped by this index
+        UniqueConstraint("provider", "event_id", name="uq_webhook_events_provider_event_id"),
+        # Workers poll for due events by status and retry time
+        Index("ix_webhook_events_status_next_attempt_at", "status", "next_attempt_at"),
+        # Finished events are purged once the dedupe window has passed
+        Index("ix_webhook_events_processed_at", "processed_at"),
+    )
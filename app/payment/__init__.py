@@ -1,5 +1,7 @@
 from app.payment.base import PaymentProvider
 from app.payment.stripe_provider import StripePaymentStrategy
 from app.payment.bkash_provider import BkashPaymentStrategy
+from app.payment.resilience import ProviderRequestError, ProviderUnavailableError
 
-__all__ = ["PaymentProvider", "StripePaymentStrategy", "BkashPaymentStrategy"]
+__all__ = ["PaymentProvider", "StripePaymentStrategy", "BkashPaymentStrategy", "ProviderUnavailableError",
+           "ProviderRequestError"]
@@ -1,14 +1,23 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+import hashlib
+import json
+import time
+from typing import Callable, Dict, Any, Optional, TypeVar
+from app.core.money import Money
+from app.payment.resilience import ProviderUnavailableError, breaker_for, bulkhead_for
+
+T = TypeVar("T")
 
 
 class PaymentProvider(ABC):
     """Abstract base class for payment providers"""
 
+    name: str = "provider"
+
     @abstractmethod
-    def create_payment_intent(self, order_id: int, amount: float) -> Dict[str, Any]:
+    def create_payment_intent(self, order_id: int, amount: Money) -> Dict[str, Any]:
         """
-        Create a payment intent with the provider.
+        Create a payment intent with the provider for amount (integer minor units).
         Returns dict with transaction_id and provider-specific data.
         """
         pass
@@ -29,16 +38,74 @@ class PaymentProvider(ABC):
         """
         pass
 
-    def verify_webhook_signature(self, payload: Dict[str, Any], signature: str) -> bool:
+    def _call_upstream(self, call: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Make one call to the provider through its circuit breaker and bulkhead.
+        Raises ProviderUnavailableError without calling out when the breaker is
+        open or too many calls to this provider are already in flight.
+        """
+        breaker = breaker_for(self.name)
+        bulkhead = bulkhead_for(self.name)
+        bulkhead.acquire()
+        try:
+            breaker.before_call()
+        except ProviderUnavailableError:
+            bulkhead.release()
+            raise
+        started = time.monotonic()
+        failed = False
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            failed = self._is_upstream_failure(e)
+            raise
+        finally:
+            bulkhead.release()
+            breaker.record(failed, time.monotonic() - started)
+
+    def _is_upstream_failure(self, error: Exception) -> bool:
+        """Whether an error means the provider is unhealthy (not e.g. a declined card)"""
+        return True
+
+    def start(self):
+        """Start background work (e.g. token refresh); called once at startup"""
+        pass
+
+    def stop(self):
+        """Stop background work started by start()"""
+        pass
+
+    @property
+    def webhook_secret_configured(self) -> bool:
+        """Whether webhook signatures are actually checked (override with the provider's secret)"""
+        return False
+
+    def verify_webhook_signature(self, payload: bytes, signature: str) -> bool:
         """
-        Verify webhook signature (optional, override if needed).
+        Verify webhook signature over the raw request body (optional, override if needed).
         Returns True if signature is valid.
         """
         return True
 
+    def result_from_webhook(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Payment result stated by a verified webhook, in query_payment's shape.
+        Returns None when the event doesn't settle the payment on its own and
+        the provider has to be queried. Override for providers that sign webhooks.
+        """
+        return None
+
     def extract_transaction_id_from_webhook(self, payload: Dict[str, Any]) -> Optional[str]:
         """
         Extract transaction ID from webhook payload.
         Override in subclasses to handle provider-specific payloads.
         """
         return payload.get("transaction_id") or payload.get("id")
+
+    def extract_event_id_from_webhook(self, payload: Dict[str, Any]) -> str:
+        """
+        Extract an id that is the same for every redelivery of a webhook.
+        Defaults to a hash of the payload; override when the provider sends an event id.
+        """
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
@@ -1,30 +1,144 @@
 import requests
 import json
-from typing import Dict, Any, Optional
+import secrets
+import threading
+import time
+from redis import RedisError
+from typing import Dict, Any, Optional, Tuple
 from app.payment.base import PaymentProvider
+from app.payment.http import ProviderHTTPClient
+from app.payment.resilience import ProviderRequestError
+from app.core.cache import redis_client
+from app.core.money import Money
 from app.config import settings
+from app.utils.logger import logger
+
+TOKEN_CACHE_KEY = "bkash:token"
+TOKEN_LOCK_KEY = "bkash:token:lock"
+TOKEN_LOCK_TIMEOUT = 10  # seconds a worker may hold the grant lock
+TOKEN_LIFETIME = 3600  # bKash grant tokens expire after an hour
+TOKEN_EXPIRY_SAFETY = 100  # treat tokens as expired this much earlier
+TOKEN_REFRESH_CHECK_INTERVAL = 60
+
+# Delete the grant lock only if this worker still holds it (it may have expired and been retaken)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
 
 class BkashPaymentStrategy(PaymentProvider):
-    """bKash payment provider implementation"""
+    """
+    bKash payment provider implementation.
+    The grant token is shared by every worker through Redis: one worker
+    grants it under a lock and the rest reuse it. A background thread renews
+    it BKASH_TOKEN_REFRESH_MARGIN seconds before expiry, so requests don't
+    pay for a grant round trip. Without Redis each process keeps its own token.
+    """
 
-    def __init__(self):
-        self.base_url = settings.BKASH_BASE_URL
+    name = "bkash"
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or settings.BKASH_BASE_URL
         self.app_key = settings.BKASH_APP_KEY
         self.app_secret = settings.BKASH_APP_SECRET
         self.username = settings.BKASH_USERNAME
         self.password = settings.BKASH_PASSWORD
+        self.http = ProviderHTTPClient("bkash")
         self._token: Optional[str] = None
         self._token_expires_at: Optional[float] = None
+        self._token_lock = threading.Lock()
+        self._stop_refresh = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the background token refresher (only when bKash is configured)"""
+        if not self.app_key or self._refresher is not None:
+            return
+        self._stop_refresh.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="bkash-token-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop_refresh.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=5)
+            self._refresher = None
+        self.http.close()
+
+    def _refresh_loop(self):
+        while not self._stop_refresh.wait(TOKEN_REFRESH_CHECK_INTERVAL):
+            try:
+                self._refresh_token(margin=settings.BKASH_TOKEN_REFRESH_MARGIN)
+            except Exception as e:
+                # Includes ProviderUnavailableError while the breaker is open; the next tick retries
+                logger.warning(f"bKash token refresh failed: {str(e)}")
 
     def _get_token(self) -> str:
-        """Get or refresh bKash access token"""
-        import time
-        
-        # Return cached token if still valid
-        if self._token and self._token_expires_at and time.time() < self._token_expires_at:
+        """Get the shared bKash access token, granting a new one only if none is valid"""
+        return self._valid_token() or self._refresh_token()
+
+    def _valid_token(self, margin: int = 0) -> Optional[str]:
+        """Local or shared token that is still valid for at least margin seconds"""
+        deadline = time.time() + margin
+        if self._token and self._token_expires_at and deadline < self._token_expires_at:
+            return self._token
+        shared = self._read_shared_token()
+        if shared and deadline < shared[1]:
+            self._token, self._token_expires_at = shared
             return self._token
+        return None
+
+    def _refresh_token(self, margin: int = 0) -> str:
+        """Grant a new token unless one valid for margin seconds appears meanwhile"""
+        with self._token_lock:
+            token = self._valid_token(margin)
+            if token:
+                return token
+
+            lock_token = secrets.token_hex(16)
+            try:
+                acquired = redis_client.set(TOKEN_LOCK_KEY, lock_token, nx=True, ex=TOKEN_LOCK_TIMEOUT)
+            except RedisError:
+                return self._grant_token()
 
+            if not acquired:
+                # Another worker is granting; wait for it to publish the token
+                wait_until = time.monotonic() + TOKEN_LOCK_TIMEOUT
+                while time.monotonic() < wait_until:
+                    time.sleep(0.1)
+                    token = self._valid_token(margin)
+                    if token:
+                        return token
+                return self._grant_token()
+
+            try:
+                return self._grant_token()
+            finally:
+                try:
+                    redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, TOKEN_LOCK_KEY, lock_token)
+                except RedisError:
+                    pass
+
+    def _read_shared_token(self) -> Optional[Tuple[str, float]]:
+        try:
+            value = redis_client.get(TOKEN_CACHE_KEY)
+        except RedisError:
+            return None
+        if not value:
+            return None
+        try:
+            shared = json.loads(value)
+            return shared["token"], float(shared["expires_at"])
+        except (ValueError, KeyError, TypeError):
+            # A corrupt value is a cache miss; the next grant overwrites it
+            logger.warning("Ignoring unreadable shared bKash token")
+            return None
+
+    def _grant_token(self) -> str:
+        """Request a new grant token from bKash and publish it to other workers"""
         url = f"{self.base_url}/tokenized/checkout/token/grant"
         headers = {
             "Content-Type": "application/json",
@@ -38,19 +152,35 @@ class BkashPaymentStrategy(PaymentProvider):
         }
 
         try:
-            response = requests.post(url, json=data, headers=headers)
+            response = self._post(url, data, headers, idempotent=True)
             response.raise_for_status()
             result = response.json()
-            
-            self._token = result.get("id_token")
-            # Token expires in 3600 seconds, refresh a bit earlier
-            self._token_expires_at = time.time() + 3500
-            
-            return self._token
         except requests.RequestException as e:
-            raise ValueError(f"Failed to get bKash token: {str(e)}")
+            raise ProviderRequestError(f"Failed to get bKash token: {str(e)}")
+
+        lifetime = int(result.get("expires_in") or TOKEN_LIFETIME) - TOKEN_EXPIRY_SAFETY
+        self._token = result.get("id_token")
+        self._token_expires_at = time.time() + lifetime
+        try:
+            redis_client.set(
+                TOKEN_CACHE_KEY,
+                json.dumps({"token": self._token, "expires_at": self._token_expires_at}),
+                ex=lifetime
+            )
+        except RedisError:
+            pass
+        return self._token
 
-    def create_payment_intent(self, order_id: int, amount: float) -> Dict[str, Any]:
+    def _post(self, url: str, data: Dict[str, Any], headers: Dict[str, str], idempotent: bool = False) -> requests.Response:
+        """POST to bKash through the circuit breaker and bulkhead; 5xx responses count as failures"""
+        def send() -> requests.Response:
+            response = self.http.post(url, json=data, headers=headers, idempotent=idempotent)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            return response
+        return self._call_upstream(send)
+
+    def create_payment_intent(self, order_id: int, amount: Money) -> Dict[str, Any]:
         """Create bKash payment intent (checkout)"""
         token = self._get_token()
         
@@ -62,8 +192,8 @@ class BkashPaymentStrategy(PaymentProvider):
             "X-APP-Key": self.app_key,
         }
         
-        # Convert amount to string with 2 decimal places
-        amount_str = f"{amount:.2f}"
+        # bKash takes the amount as a string with 2 decimal places
+        amount_str = str(amount)
         
         data = {
             "mode": "0011",  # Checkout mode
@@ -76,7 +206,7 @@ class BkashPaymentStrategy(PaymentProvider):
         }
 
         try:
-            response = requests.post(url, json=data, headers=headers)
+            response = self._post(url, data, headers)
             response.raise_for_status()
             result = response.json()
             
@@ -112,7 +242,7 @@ class BkashPaymentStrategy(PaymentProvider):
         }
 
         try:
-            response = requests.post(url, json=data, headers=headers)
+            response = self._post(url, data, headers)
             response.raise_for_status()
             result = response.json()
             
@@ -127,10 +257,7 @@ class BkashPaymentStrategy(PaymentProvider):
                 "raw_response": result
             }
         except requests.RequestException as e:
-            return {
-                "status": "failed",
-                "raw_response": {"error": str(e)}
-            }
+            raise ProviderRequestError(f"bKash payment execution failed: {str(e)}")
 
     def query_payment(self, transaction_id: str) -> Dict[str, Any]:
         """Query bKash payment status"""
@@ -149,7 +276,8 @@ class BkashPaymentStrategy(PaymentProvider):
         }
 
         try:
-            response = requests.post(url, json=data, headers=headers)
+            # Queries are read-only, so they are safe to retry
+            response = self._post(url, data, headers, idempotent=True)
             response.raise_for_status()
             result = response.json()
             
@@ -169,11 +297,16 @@ class BkashPaymentStrategy(PaymentProvider):
                 "raw_response": result
             }
         except requests.RequestException as e:
-            return {
-                "status": "failed",
-                "raw_response": {"error": str(e)}
-            }
+            raise ProviderRequestError(f"bKash payment query failed: {str(e)}")
 
     def extract_transaction_id_from_webhook(self, payload: Dict[str, Any]) -> Optional[str]:
         """Extract transaction ID from bKash webhook"""
         return payload.get("paymentID") or payload.get("payment_id")
+
+    def extract_event_id_from_webhook(self, payload: Dict[str, Any]) -> str:
+        """bKash sends no event id; a payment reaches each status once, so the pair identifies it"""
+        payment_id = self.extract_transaction_id_from_webhook(payload)
+        status = payload.get("transactionStatus") or payload.get("status")
+        if payment_id and status:
+            return f"{payment_id}:{status}"
+        return super().extract_event_id_from_webhook(payload)
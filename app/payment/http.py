@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from app.config import settings
+
+# Statuses worth retrying on an idempotent call
+RETRY_STATUSES = {429, 502, 503, 504}
+LATENCY_SAMPLES = 500
+
+
+class LatencyStats:
+    """Rolling latency and error counts for one provider's upstream calls"""
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=samples)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+
+    def record(self, seconds: float, error: bool = False):
+        with self._lock:
+            self._samples.append(seconds)
+            self.calls += 1
+            if error:
+                self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            calls, errors, retries = self.calls, self.errors, self.retries
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(int(p * len(samples)), len(samples) - 1)] * 1000, 1)
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "retries": retries,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(samples[-1] * 1000, 1) if samples else None,
+        }
+
+
+_latency: Dict[str, LatencyStats] = {}
+_latency_lock = threading.Lock()
+
+
+def latency_stats(provider: str) -> LatencyStats:
+    with _latency_lock:
+        return _latency.setdefault(provider, LatencyStats())
+
+
+def latency_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Latency metrics for every provider that has made a call"""
+    with _latency_lock:
+        providers = list(_latency.items())
+    return {name: stats.snapshot() for name, stats in providers}
+
+
+@contextmanager
+def record_latency(provider: str):
+    """Time one upstream call into the provider's latency metrics"""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        latency_stats(provider).record(time.perf_counter() - started, error=error)
+
+
+def build_session(pool_size: Optional[int] = None) -> requests.Session:
+    """A requests session with a keep-alive connection pool sized for the worker's threads"""
+    pool_size = pool_size or settings.PAYMENT_HTTP_POOL_SIZE
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ProviderHTTPClient:
+    """
+    Pooled HTTP client for one payment provider.
+    Connections are kept alive across requests, every call has connect and
+    read timeouts, and calls marked idempotent are retried with jittered
+    exponential backoff on connection errors and retryable statuses.
+    """
+
+    def __init__(self, provider: str, session: Optional[requests.Session] = None):
+        self.provider = provider
+        self.session = session or build_session()
+        self.timeout = (settings.PAYMENT_HTTP_CONNECT_TIMEOUT, settings.PAYMENT_HTTP_READ_TIMEOUT)
+        self.max_retries = settings.PAYMENT_HTTP_MAX_RETRIES
+        self.backoff = settings.PAYMENT_HTTP_RETRY_BACKOFF
+
+    def post(self, url: str, idempotent: bool = False, **kwargs) -> requests.Response:
+        return self.request("POST", url, idempotent=idempotent, **kwargs)
+
+    def request(self, method: str, url: str, idempotent: bool = False, **kwargs) -> requests.Response:
+        """Send a request; raises requests.RequestException like requests itself"""
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                with record_latency(self.provider):
+                    response = self.session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+            latency_stats(self.provider).record_retry()
+            # Full jitter keeps retrying workers from hitting the provider in lockstep
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def close(self):
+        self.session.close()
+
+
+def max_request_seconds() -> float:
+    """
+    Worst-case duration of one idempotent upstream call: every attempt
+    running into its timeouts, the longest backoff between attempts, and
+    the bulkhead wait before the first one.
+    """
+    attempts = 1 + settings.PAYMENT_HTTP_MAX_RETRIES
+    per_attempt = settings.PAYMENT_HTTP_CONNECT_TIMEOUT + settings.PAYMENT_HTTP_READ_TIMEOUT
+    backoff = settings.PAYMENT_HTTP_RETRY_BACKOFF * (2 ** settings.PAYMENT_HTTP_MAX_RETRIES - 1)
+    return attempts * per_attempt + backoff + settings.PAYMENT_BULKHEAD_WAIT_SECONDS
@@ -0,0 +1,78 @@
+import threading
+from typing import Dict, Optional
+from app.payment.base import PaymentProvider
+from app.payment.stripe_provider import StripePaymentStrategy
+from app.payment.bkash_provider import BkashPaymentStrategy
+from app.payment.simulator import PaymentSimulator, SimulatedPaymentProvider
+from app.payment.stub_server import ProviderStubServer
+from app.config import settings
+
+_providers: Dict[str, PaymentProvider] = {}
+_simulator: Optional[PaymentSimulator] = None
+_stub_server: Optional[ProviderStubServer] = None
+_lock = threading.Lock()
+
+
+def _build_providers() -> Dict[str, PaymentProvider]:
+    """Providers for PAYMENT_PROVIDER_MODE"""
+    global _simulator, _stub_server
+    mode = settings.PAYMENT_PROVIDER_MODE.lower()
+    if mode == "live":
+        return {
+            "stripe": StripePaymentStrategy(),
+            "bkash": BkashPaymentStrategy()
+        }
+
+    _simulator = PaymentSimulator()
+    _simulator.start()
+    if mode == "simulated":
+        return {
+            "stripe": SimulatedPaymentProvider("stripe", _simulator),
+            "bkash": SimulatedPaymentProvider("bkash", _simulator)
+        }
+    if mode == "stub":
+        _stub_server = ProviderStubServer(_simulator)
+        _stub_server.start()
+        return {
+            "stripe": StripePaymentStrategy(api_key=settings.STRIPE_SECRET_KEY or "sk_test_stub", api_base=_stub_server.url),
+            "bkash": BkashPaymentStrategy(base_url=_stub_server.url)
+        }
+    raise ValueError(f"Unknown PAYMENT_PROVIDER_MODE '{settings.PAYMENT_PROVIDER_MODE}'")
+
+
+def init_providers() -> Dict[str, PaymentProvider]:
+    """
+    Build the process-wide payment providers (once) and start their background work.
+    Providers hold connection state and tokens, so they are shared by every
+    request instead of being recreated per PaymentService.
+    """
+    with _lock:
+        if not _providers:
+            _providers.update(_build_providers())
+            for provider in _providers.values():
+                provider.start()
+        return _providers
+
+
+def shutdown_providers():
+    """Stop providers' background work (and any simulator) and drop them"""
+    global _simulator, _stub_server
+    with _lock:
+        for provider in _providers.values():
+            provider.stop()
+        _providers.clear()
+        if _stub_server is not None:
+            _stub_server.stop()
+            _stub_server = None
+        if _simulator is not None:
+            _simulator.stop()
+            _simulator = None
+
+
+def get_provider(provider_name: str) -> PaymentProvider:
+    """Get a payment provider by name"""
+    providers = _providers or init_providers()
+    provider = providers.get(provider_name.lower())
+    if not provider:
+        raise ValueError(f"Payment provider '{provider_name}' not supported")
+    return provider
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+from app.config import settings
+
+
+class ProviderUnavailableError(Exception):
+    """A payment provider call was refused without contacting the provider"""
+
+
+class ProviderRequestError(ProviderUnavailableError):
+    """
+    A payment provider call failed in transit (connection error, timeout, 5xx)
+    and says nothing about the payment, whose state is still unknown
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker over a rolling time window.
+    Closed: calls go through and their outcome and latency are recorded.
+    Once the window holds CIRCUIT_BREAKER_MIN_CALLS calls and the error or
+    slow-call rate crosses its threshold, the breaker opens and calls fail
+    fast for CIRCUIT_BREAKER_OPEN_SECONDS. It then goes half-open and lets
+    a few trial calls through: if they all succeed quickly it closes, and
+    any failure opens it again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._calls = deque()  # (finished_at, failed, slow)
+        self._opened_at = 0.0
+        self._trials_started = 0
+        self._trials_passed = 0
+
+    def before_call(self):
+        """Raise ProviderUnavailableError if the call must not go through"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < settings.CIRCUIT_BREAKER_OPEN_SECONDS:
+                    raise ProviderUnavailableError(f"Payment provider '{self.name}' is temporarily unavailable")
+                self.state = "half_open"
+                self._trials_started = self._trials_passed = 0
+            if self.state == "half_open":
+                if self._trials_started >= settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS:
+                    raise ProviderUnavailableError(f"Payment provider '{self.name}' is temporarily unavailable")
+                self._trials_started += 1
+
+    def record(self, failed: bool, duration: float):
+        """Record a finished call's outcome"""
+        slow = duration >= settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "half_open":
+                if failed or slow:
+                    self._open(now)
+                    return
+                self._trials_passed += 1
+                if self._trials_passed >= settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS:
+                    self.state = "closed"
+                    self._calls.clear()
+                return
+            if self.state == "open":
+                return
+
+            self._calls.append((now, failed, slow))
+            self._prune(now)
+            total = len(self._calls)
+            if total < settings.CIRCUIT_BREAKER_MIN_CALLS:
+                return
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+            if (failures / total >= settings.CIRCUIT_BREAKER_ERROR_RATE
+                    or slow_calls / total >= settings.CIRCUIT_BREAKER_SLOW_CALL_RATE):
+                self._open(now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.monotonic())
+            return {
+                "state": self.state,
+                "window_calls": len(self._calls),
+                "window_failures": sum(1 for _, failed, _ in self._calls if failed),
+                "window_slow_calls": sum(1 for _, _, slow in self._calls if slow),
+            }
+
+    def _open(self, now: float):
+        self.state = "open"
+        self._opened_at = now
+        self._calls.clear()
+
+    def _prune(self, now: float):
+        horizon = now - settings.CIRCUIT_BREAKER_WINDOW_SECONDS
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+
+class Bulkhead:
+    """
+    Caps concurrent calls to one provider, so a slow provider can hold at most
+    PAYMENT_PROVIDER_MAX_CONCURRENCY threads of the shared request threadpool.
+    """
+
+    def __init__(self, name: str, max_concurrent: int):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def acquire(self):
+        if not self._semaphore.acquire(timeout=settings.PAYMENT_BULKHEAD_WAIT_SECONDS):
+            raise ProviderUnavailableError(f"Too many concurrent calls to payment provider '{self.name}'")
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_bulkheads: Dict[str, Bulkhead] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(provider: str) -> CircuitBreaker:
+    with _registry_lock:
+        return _breakers.setdefault(provider, CircuitBreaker(provider))
+
+
+def bulkhead_for(provider: str) -> Bulkhead:
+    with _registry_lock:
+        if provider not in _bulkheads:
+            _bulkheads[provider] = Bulkhead(provider, settings.PAYMENT_PROVIDER_MAX_CONCURRENCY)
+        return _bulkheads[provider]
+
+
+def resilience_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Circuit breaker state and in-flight calls for every provider that has made a call"""
+    with _registry_lock:
+        names = sorted(set(_breakers) | set(_bulkheads))
+    snapshot = {}
+    for name in names:
+        snapshot[name] = breaker_for(name).snapshot()
+        snapshot[name]["in_flight"] = bulkhead_for(name).in_flight
+    return snapshot
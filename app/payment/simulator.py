@@ -0,0 +1,331 @@
+import heapq
+import hashlib
+import hmac
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import requests
+from app.payment.base import PaymentProvider
+from app.payment.http import build_session, record_latency
+from app.payment.resilience import ProviderRequestError
+from app.payment.stripe_provider import StripePaymentStrategy
+from app.core.money import Money
+from app.config import settings
+from app.utils.logger import logger
+
+
+class SimulatedOutageError(Exception):
+    """A simulated provider outage (the real provider would have timed out or returned 5xx)"""
+
+
+class PaymentSimulator:
+    """
+    In-memory stand-in for the Stripe and bKash payment backends.
+    Intents are kept in a dict; each call waits a log-normally distributed
+    latency (median PAYMENT_SIMULATOR_LATENCY_MS) and fails as an outage
+    with PAYMENT_SIMULATOR_ERROR_RATE. Whether a payment will succeed is
+    drawn at creation with PAYMENT_SIMULATOR_DECLINE_RATE.
+
+    Stripe intents settle on their own PAYMENT_SIMULATOR_SETTLE_SECONDS
+    after creation (the customer paying in the browser); bKash payments
+    settle when executed. Settled payments are announced to
+    PAYMENT_SIMULATOR_WEBHOOK_URL after PAYMENT_SIMULATOR_WEBHOOK_DELAY_SECONDS
+    by a single dispatcher thread, unless dropped.
+    """
+
+    def __init__(self, webhook_url: Optional[str] = None, seed: Optional[int] = None):
+        self.webhook_url = (webhook_url or settings.PAYMENT_SIMULATOR_WEBHOOK_URL or "").rstrip("/")
+        self._random = random.Random(settings.PAYMENT_SIMULATOR_SEED if seed is None else seed)
+        self._random_lock = threading.Lock()
+        self._payments: Dict[str, Dict[str, Any]] = {}
+        self._payments_lock = threading.Lock()
+        self._webhooks: List[Tuple[float, int, str, str]] = []  # (due, seq, provider, transaction_id)
+        self._webhooks_ready = threading.Condition()
+        self._webhook_seq = 0
+        self._dispatcher: Optional[threading.Thread] = None
+        self._stopping = False
+        self._session: Optional[requests.Session] = None
+
+    def start(self):
+        """Start the webhook dispatcher (only when a webhook URL is configured)"""
+        if not self.webhook_url or self._dispatcher is not None:
+            return
+        self._stopping = False
+        self._session = build_session()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="payment-simulator-webhooks", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self):
+        with self._webhooks_ready:
+            self._stopping = True
+            self._webhooks_ready.notify()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=5)
+            self._dispatcher = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def upstream_call(self):
+        """Wait one simulated round trip; raises SimulatedOutageError at the configured error rate"""
+        with self._random_lock:
+            latency = self._latency()
+            outage = self._random.random() < settings.PAYMENT_SIMULATOR_ERROR_RATE
+        if latency:
+            time.sleep(latency)
+        if outage:
+            raise SimulatedOutageError("Simulated provider outage")
+
+    def create(self, provider: str, order_id: int, amount: Money) -> Dict[str, Any]:
+        """Create a payment; returns its provider-shaped view"""
+        with self._random_lock:
+            declined = self._random.random() < settings.PAYMENT_SIMULATOR_DECLINE_RATE
+        prefix = "pi_sim_" if provider == "stripe" else "TR00sim"
+        payment = {
+            "id": prefix + uuid.uuid4().hex[:20],
+            "provider": provider,
+            "order_id": order_id,
+            "amount": amount,
+            "outcome": "failed" if declined else "success",
+            "created_at": time.monotonic(),
+            "executed": False,
+        }
+        with self._payments_lock:
+            self._payments[payment["id"]] = payment
+        if provider == "stripe":
+            self._schedule_webhook(payment, settings.PAYMENT_SIMULATOR_SETTLE_SECONDS)
+        return self._view(payment)
+
+    def execute(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        """Execute a bKash payment (settling it); None if unknown"""
+        with self._payments_lock:
+            payment = self._payments.get(transaction_id)
+            if payment is None:
+                return None
+            first_execution = not payment["executed"]
+            payment["executed"] = True
+        if first_execution:
+            self._schedule_webhook(payment, 0)
+        view = self._view(payment)
+        if payment["outcome"] != "success":
+            view.update({"statusCode": "2001", "statusMessage": "Invalid OTP"})
+        return view
+
+    def get(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        """Current provider-shaped view of a payment; None if unknown"""
+        with self._payments_lock:
+            payment = self._payments.get(transaction_id)
+        return self._view(payment) if payment else None
+
+    def webhook_payload(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        """The webhook body the provider would send for a settled payment"""
+        with self._payments_lock:
+            payment = self._payments.get(transaction_id)
+        if payment is None:
+            return None
+        view = self._view(payment)
+        if payment["provider"] == "stripe":
+            succeeded = view["status"] == "succeeded"
+            return {
+                "id": "evt_sim_" + hashlib.sha256(transaction_id.encode()).hexdigest()[:24],
+                "object": "event",
+                "type": "payment_intent.succeeded" if succeeded else "payment_intent.canceled",
+                "data": {"object": view},
+            }
+        return {
+            "paymentID": transaction_id,
+            "trxID": view.get("trxID"),
+            "transactionStatus": view["transactionStatus"],
+            "status": "success" if view["transactionStatus"] == "Completed" else "failure",
+            "amount": view["amount"],
+            "merchantInvoiceNumber": view["merchantInvoiceNumber"],
+        }
+
+    def _latency(self) -> float:
+        """Log-normal latency in seconds: median PAYMENT_SIMULATOR_LATENCY_MS, spread LATENCY_SIGMA"""
+        median = settings.PAYMENT_SIMULATOR_LATENCY_MS / 1000
+        if median <= 0:
+            return 0.0
+        return median * math.exp(settings.PAYMENT_SIMULATOR_LATENCY_SIGMA * self._random.gauss(0, 1))
+
+    def _view(self, payment: Dict[str, Any]) -> Dict[str, Any]:
+        if payment["provider"] == "stripe":
+            settled = time.monotonic() - payment["created_at"] >= settings.PAYMENT_SIMULATOR_SETTLE_SECONDS
+            status = "requires_payment_method"
+            if settled:
+                status = "succeeded" if payment["outcome"] == "success" else "canceled"
+            return {
+                "id": payment["id"],
+                "object": "payment_intent",
+                "amount": payment["amount"].cents,
+                "currency": "usd",
+                "status": status,
+                "client_secret": f"{payment['id']}_secret_sim",
+                "metadata": {"order_id": str(payment["order_id"])},
+            }
+
+        transaction_status = "Initiated"
+        if payment["executed"]:
+            transaction_status = "Completed" if payment["outcome"] == "success" else "Failed"
+        view = {
+            "statusCode": "0000",
+            "statusMessage": "Successful",
+            "paymentID": payment["id"],
+            "transactionStatus": transaction_status,
+            "amount": str(payment["amount"]),
+            "currency": "BDT",
+            "intent": "sale",
+            "merchantInvoiceNumber": str(payment["order_id"]),
+        }
+        if transaction_status == "Completed":
+            view["trxID"] = "SIM" + payment["id"][-10:].upper()
+        return view
+
+    def _schedule_webhook(self, payment: Dict[str, Any], settle_after: float):
+        if not self.webhook_url:
+            return
+        with self._random_lock:
+            if self._random.random() < settings.PAYMENT_SIMULATOR_WEBHOOK_DROP_RATE:
+                return
+        due = time.monotonic() + settle_after + settings.PAYMENT_SIMULATOR_WEBHOOK_DELAY_SECONDS
+        with self._webhooks_ready:
+            self._webhook_seq += 1
+            heapq.heappush(self._webhooks, (due, self._webhook_seq, payment["provider"], payment["id"]))
+            self._webhooks_ready.notify()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._webhooks_ready:
+                while not self._stopping:
+                    wait = self._webhooks[0][0] - time.monotonic() if self._webhooks else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._webhooks_ready.wait(wait)
+                if self._stopping:
+                    return
+                _, _, provider, transaction_id = heapq.heappop(self._webhooks)
+            try:
+                self._deliver(provider, transaction_id)
+            except requests.RequestException as e:
+                logger.warning(f"Simulated {provider} webhook for {transaction_id} failed: {str(e)}")
+
+    def _deliver(self, provider: str, transaction_id: str):
+        body = json.dumps(self.webhook_payload(transaction_id)).encode()
+        headers = {"Content-Type": "application/json"}
+        if provider == "stripe" and settings.STRIPE_WEBHOOK_SECRET:
+            # Same scheme as Stripe, so signed-event handling is exercised too
+            timestamp = int(time.time())
+            signed = f"{timestamp}.".encode() + body
+            digest = hmac.new(settings.STRIPE_WEBHOOK_SECRET.encode(), signed, hashlib.sha256).hexdigest()
+            headers["Stripe-Signature"] = f"t={timestamp},v1={digest}"
+        self._session.post(
+            f"{self.webhook_url}/api/webhooks/{provider}",
+            data=body,
+            headers=headers,
+            timeout=(settings.PAYMENT_HTTP_CONNECT_TIMEOUT, settings.PAYMENT_HTTP_READ_TIMEOUT)
+        )
+
+
+class SimulatedPaymentProvider(PaymentProvider):
+    """
+    Payment provider backed by a PaymentSimulator instead of a real sandbox.
+    Registered under the real provider's name, it returns the same result
+    shapes and goes through the same circuit breaker, bulkhead and latency
+    metrics, so checkout can be load tested offline.
+    """
+
+    def __init__(self, name: str, simulator: PaymentSimulator):
+        self.name = name
+        self.simulator = simulator
+
+    def _call(self, method, *args):
+        with record_latency(self.name):
+            return self._call_upstream(self._simulated, method, *args)
+
+    def _simulated(self, method, *args):
+        self.simulator.upstream_call()
+        return method(*args)
+
+    def create_payment_intent(self, order_id: int, amount: Money) -> Dict[str, Any]:
+        """Create a simulated payment"""
+        try:
+            created = self._call(self.simulator.create, self.name, order_id, amount)
+        except SimulatedOutageError as e:
+            raise ValueError(f"{self.name} error: {str(e)}")
+        if self.name == "stripe":
+            return {
+                "transaction_id": created["id"],
+                "client_secret": created["client_secret"],
+                "raw_response": created
+            }
+        return {
+            "transaction_id": created["paymentID"],
+            "payment_url": f"https://simulator.invalid/checkout/{created['paymentID']}",
+            "raw_response": created
+        }
+
+    def confirm_payment(self, transaction_id: str) -> Dict[str, Any]:
+        """Execute (bKash) or retrieve (Stripe) a simulated payment"""
+        if self.name == "stripe":
+            return self.query_payment(transaction_id)
+        return self._result(self.simulator.execute, transaction_id)
+
+    def query_payment(self, transaction_id: str) -> Dict[str, Any]:
+        """Query a simulated payment's status"""
+        return self._result(self.simulator.get, transaction_id)
+
+    def _result(self, method, transaction_id: str) -> Dict[str, Any]:
+        try:
+            view = self._call(method, transaction_id)
+        except SimulatedOutageError as e:
+            raise ProviderRequestError(f"{self.name} error: {str(e)}")
+        if view is None:
+            return {"status": "failed", "raw_response": {"error": f"No such payment: {transaction_id}"}}
+
+        status = "pending"
+        if self.name == "stripe":
+            if view["status"] == "succeeded":
+                status = "success"
+            elif view["status"] == "canceled":
+                status = "failed"
+        elif view["statusCode"] != "0000" or view["transactionStatus"] == "Failed":
+            status = "failed"
+        elif view["transactionStatus"] == "Completed":
+            status = "success"
+        return {"status": status, "raw_response": view}
+
+    def _is_upstream_failure(self, error: Exception) -> bool:
+        return isinstance(error, SimulatedOutageError)
+
+    # Simulated Stripe webhooks are signed with STRIPE_WEBHOOK_SECRET, so they are checked
+    # and applied exactly like real ones; bKash webhooks are unsigned and always re-queried
+    @property
+    def webhook_secret_configured(self) -> bool:
+        return self.name == "stripe" and bool(settings.STRIPE_WEBHOOK_SECRET)
+
+    def verify_webhook_signature(self, payload: bytes, signature: str) -> bool:
+        if self.name == "stripe":
+            return StripePaymentStrategy.verify_webhook_signature(self, payload, signature)
+        return super().verify_webhook_signature(payload, signature)
+
+    def result_from_webhook(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if self.name == "stripe":
+            return StripePaymentStrategy.result_from_webhook(self, payload)
+        return super().result_from_webhook(payload)
+
+    def extract_transaction_id_from_webhook(self, payload: Dict[str, Any]) -> Optional[str]:
+        if self.name == "stripe":
+            return payload.get("data", {}).get("object", {}).get("id", "")
+        return payload.get("paymentID")
+
+    def extract_event_id_from_webhook(self, payload: Dict[str, Any]) -> str:
+        if self.name == "stripe" and payload.get("id"):
+            return payload["id"]
+        payment_id = payload.get("paymentID")
+        if payment_id and payload.get("transactionStatus"):
+            return f"{payment_id}:{payload['transactionStatus']}"
+        return super().extract_event_id_from_webhook(payload)
@@ -1,29 +1,49 @@
 import stripe
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from app.payment.base import PaymentProvider
+from app.payment.http import build_session, record_latency
+from app.payment.resilience import ProviderRequestError
+from app.core.money import Money
 from app.config import settings
 
+# Event types that settle a PaymentIntent; anything else (e.g. processing) is ambiguous
+STRIPE_WEBHOOK_STATUSES = {
+    "payment_intent.succeeded": "success",
+    "payment_intent.payment_failed": "failed",
+    "payment_intent.canceled": "failed",
+}
+
 
 class StripePaymentStrategy(PaymentProvider):
     """Stripe payment provider implementation"""
 
-    def __init__(self):
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+    name = "stripe"
+
+    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None):
+        stripe.api_key = api_key or settings.STRIPE_SECRET_KEY
+        if api_base:
+            stripe.api_base = api_base
+        # Pooled keep-alive session with timeouts; Stripe retries safely using its own idempotency keys
+        stripe.default_http_client = stripe.http_client.RequestsClient(
+            session=build_session(),
+            timeout=(settings.PAYMENT_HTTP_CONNECT_TIMEOUT, settings.PAYMENT_HTTP_READ_TIMEOUT)
+        )
+        stripe.max_network_retries = settings.PAYMENT_HTTP_MAX_RETRIES
 
-    def create_payment_intent(self, order_id: int, amount: float) -> Dict[str, Any]:
+    def create_payment_intent(self, order_id: int, amount: Money) -> Dict[str, Any]:
         """Create Stripe payment intent"""
         try:
-            # Convert amount to cents
-            amount_cents = int(amount * 100)
-
-            payment_intent = stripe.PaymentIntent.create(
-                amount=amount_cents,
-                currency="usd",
-                metadata={"order_id": str(order_id)},
-                automatic_payment_methods={
-                    "enabled": True,
-                },
-            )
+            # Stripe takes the amount in cents, which is what Money already holds
+            with record_latency("stripe"):
+                payment_intent = self._call_upstream(
+                    stripe.PaymentIntent.create,
+                    amount=amount.cents,
+                    currency="usd",
+                    metadata={"order_id": str(order_id)},
+                    automatic_payment_methods={
+                        "enabled": True,
+                    },
+                )
 
             return {
                 "transaction_id": payment_intent.id,
@@ -36,7 +56,8 @@ class StripePaymentStrategy(PaymentProvider):
     def confirm_payment(self, transaction_id: str) -> Dict[str, Any]:
         """Confirm Stripe payment"""
         try:
-            payment_intent = stripe.PaymentIntent.retrieve(transaction_id)
+            with record_latency("stripe"):
+                payment_intent = self._call_upstream(stripe.PaymentIntent.retrieve, transaction_id)
             
             status = "pending"
             if payment_intent.status == "succeeded":
@@ -48,16 +69,27 @@ class StripePaymentStrategy(PaymentProvider):
                 "status": status,
                 "raw_response": payment_intent.to_dict()
             }
-        except stripe.error.StripeError as e:
+        except stripe.error.InvalidRequestError as e:
+            # Stripe answered about this intent (e.g. no such payment_intent)
             return {
                 "status": "failed",
                 "raw_response": {"error": str(e)}
             }
+        except stripe.error.StripeError as e:
+            raise ProviderRequestError(f"Stripe error: {str(e)}")
 
     def query_payment(self, transaction_id: str) -> Dict[str, Any]:
         """Query Stripe payment status"""
         return self.confirm_payment(transaction_id)
 
+    def _is_upstream_failure(self, error: Exception) -> bool:
+        """Card declines and invalid requests are answers, not outages"""
+        return isinstance(error, (stripe.error.APIConnectionError, stripe.error.APIError, stripe.error.RateLimitError))
+
+    @property
+    def webhook_secret_configured(self) -> bool:
+        return bool(settings.STRIPE_WEBHOOK_SECRET)
+
     def verify_webhook_signature(self, payload: bytes, signature: str) -> bool:
         """Verify Stripe webhook signature"""
         try:
@@ -72,6 +104,21 @@ class StripePaymentStrategy(PaymentProvider):
         except stripe.error.SignatureVerificationError:
             return False
 
+    def result_from_webhook(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Signed payment_intent events carry the PaymentIntent itself; other events need a query"""
+        status = STRIPE_WEBHOOK_STATUSES.get(payload.get("type"))
+        payment_intent = payload.get("data", {}).get("object", {})
+        if status is None or payment_intent.get("object") != "payment_intent":
+            return None
+        return {
+            "status": status,
+            "raw_response": payment_intent
+        }
+
     def extract_transaction_id_from_webhook(self, payload: Dict[str, Any]) -> str:
         """Extract transaction ID from Stripe webhook"""
         return payload.get("data", {}).get("object", {}).get("id", "")
+
+    def extract_event_id_from_webhook(self, payload: Dict[str, Any]) -> str:
+        """Stripe events carry their own id (evt_...), repeated on every redelivery"""
+        return payload.get("id") or super().extract_event_id_from_webhook(payload)
@@ -0,0 +1,105 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+from app.core.money import Money
+from app.payment.simulator import PaymentSimulator, SimulatedOutageError
+
+STUB_TOKEN = "simulator-id-token"
+
+
+class ProviderStubServer:
+    """
+    Local HTTP server speaking the Stripe PaymentIntents and bKash tokenized
+    checkout APIs on top of a PaymentSimulator. Pointing the real provider
+    strategies at it exercises their HTTP clients, retries and error
+    handling without a sandbox. Simulated outages are answered with 503.
+    """
+
+    def __init__(self, simulator: PaymentSimulator, host: str = "127.0.0.1", port: int = 0):
+        self.simulator = simulator
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="payment-stub-server", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._server.server_close()
+
+    def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Route one request; returns (status code, JSON body)"""
+        try:
+            self.simulator.upstream_call()
+        except SimulatedOutageError as e:
+            return 503, {"error": {"type": "api_error", "message": str(e)}}
+
+        if path.startswith("/v1/payment_intents"):
+            return self._stripe(method, path, body)
+        if path.endswith("/tokenized/checkout/token/grant"):
+            return 200, {"statusCode": "0000", "id_token": STUB_TOKEN, "token_type": "Bearer", "expires_in": 3600}
+        if path.endswith("/tokenized/checkout/payment/create"):
+            data = json.loads(body or b"{}")
+            created = self.simulator.create("bkash", int(data["merchantInvoiceNumber"]), Money.from_decimal(data["amount"]))
+            created["bkashURL"] = f"{self.url}/checkout/{created['paymentID']}"
+            return 200, created
+        if path.endswith("/tokenized/checkout/payment/execute"):
+            return 200, self._bkash_payment(self.simulator.execute(json.loads(body or b"{}").get("paymentID", "")))
+        if path.endswith("/tokenized/checkout/payment/query"):
+            return 200, self._bkash_payment(self.simulator.get(json.loads(body or b"{}").get("paymentID", "")))
+        return 404, {"error": {"type": "invalid_request_error", "message": f"Unknown path {path}"}}
+
+    def _stripe(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if method == "POST" and path == "/v1/payment_intents":
+            # Stripe requests are form-encoded, with nested keys like metadata[order_id]
+            form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            return 200, self.simulator.create("stripe", int(form.get("metadata[order_id]", 0)), Money(int(form["amount"])))
+        transaction_id = path.rsplit("/", 1)[-1]
+        intent = self.simulator.get(transaction_id) if method == "GET" else None
+        if intent is None:
+            return 404, {"error": {"type": "invalid_request_error", "message": f"No such payment_intent: '{transaction_id}'"}}
+        return 200, intent
+
+    @staticmethod
+    def _bkash_payment(view: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return view or {"statusCode": "2056", "statusMessage": "Invalid Payment State"}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def _respond(self, method: str):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status_code, payload = stub.handle(method, self.path.split("?", 1)[0], body)
+                encoded = json.dumps(payload).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -1,11 +1,11 @@
 from app.schemas.user import UserCreate, UserLogin, UserResponse
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse
+from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse, ProductFilter, ProductPage
 from app.schemas.order import OrderCreate, OrderItemCreate, OrderResponse, OrderItemResponse
 from app.schemas.payment import PaymentCreate, PaymentResponse, PaymentInitiate
 
 __all__ = [
     "UserCreate", "UserLogin", "UserResponse",
-    "ProductCreate", "ProductUpdate", "ProductResponse",
+    "ProductCreate", "ProductUpdate", "ProductResponse", "ProductFilter", "ProductPage",
     "OrderCreate", "OrderItemCreate", "OrderResponse", "OrderItemResponse",
     "PaymentCreate", "PaymentResponse", "PaymentInitiate"
 ]
@@ -37,3 +37,16 @@ class OrderResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class OrderSummaryResponse(BaseModel):
+    id: int
+    user_id: int
+    total_amount: Decimal
+    status: str
+    created_at: datetime
+    updated_at: datetime
+    item_count: int
+
+    class Config:
+        from_attributes = True
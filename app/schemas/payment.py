@@ -19,7 +19,6 @@ class PaymentResponse(BaseModel):
     provider: str
     transaction_id: str
     status: str
-    raw_response: Optional[Dict[str, Any]] = None
     created_at: datetime
     updated_at: datetime
 
@@ -27,6 +26,17 @@ class PaymentResponse(BaseModel):
         from_attributes = True
 
 
+class PaymentEventResponse(BaseModel):
+    id: int
+    source: str
+    status: str
+    payload: Optional[Dict[str, Any]] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class PaymentConfirm(BaseModel):
     transaction_id: str
     provider: str
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from decimal import Decimal
 
 
@@ -12,6 +12,7 @@ class ProductCreate(BaseModel):
     stock: int = 0
     status: str = "active"
     category_id: Optional[int] = None
+    is_hot: bool = False
 
 
 class ProductUpdate(BaseModel):
@@ -22,6 +23,7 @@ class ProductUpdate(BaseModel):
     stock: Optional[int] = None
     status: Optional[str] = None
     category_id: Optional[int] = None
+    is_hot: Optional[bool] = None
 
 
 class ProductResponse(BaseModel):
@@ -31,10 +33,42 @@ class ProductResponse(BaseModel):
     description: Optional[str]
     price: Decimal
     stock: int
+    available_stock: int
     status: str
     category_id: Optional[int]
+    is_hot: bool
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class ProductFilter(BaseModel):
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
+    in_stock: bool = False
+    category_id: Optional[int] = None  # includes descendant categories
+    sort: Literal["id", "price_asc", "price_desc", "newest", "name"] = "id"
+
+
+class CategoryFacet(BaseModel):
+    category_id: Optional[int]
+    count: int
+
+
+class PriceBucketFacet(BaseModel):
+    min_price: Decimal
+    max_price: Optional[Decimal]
+    count: int
+
+
+class ProductFacets(BaseModel):
+    categories: List[CategoryFacet] = []
+    price_buckets: List[PriceBucketFacet] = []
+
+
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    facets: ProductFacets
+    next_cursor: Optional[str] = None
@@ -3,11 +3,15 @@ from app.services.product_service import ProductService
 from app.services.order_service import OrderService
 from app.services.payment_service import PaymentService
 from app.services.category_service import CategoryService
+from app.services.recommendation_service import RecommendationService
+from app.services.inventory_service import InventoryService
 
 __all__ = [
     "UserService",
     "ProductService",
     "OrderService",
     "PaymentService",
-    "CategoryService"
+    "CategoryService",
+    "RecommendationService",
+    "InventoryService"
 ]
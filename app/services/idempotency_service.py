@@ -0,0 +1,157 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Any, Optional
+from app.models.idempotency import IdempotencyKey
+from app.payment.http import max_request_seconds
+from app.config import settings
+
+POLL_INTERVAL = 0.1
+# Upstream calls one payment initiation can make (bKash: token grant, then create)
+PAYMENT_CALLS_PER_REQUEST = 2
+LOCK_MARGIN_SECONDS = 15  # bKash grant-lock wait and our own database work
+
+
+class IdempotencyKeyInProgressError(ValueError):
+    """Another request with the same key is still running"""
+
+
+class IdempotencyKeyMismatchError(ValueError):
+    """The key was already used with a different request body"""
+
+
+def lock_seconds() -> float:
+    """
+    How long an in-flight claim is safe from takeover: IDEMPOTENCY_LOCK_SECONDS,
+    raised if needed to outlast the slowest payment initiation the HTTP
+    timeout and retry settings allow, so a retry can't call the provider again
+    while the first request is still waiting on it.
+    """
+    slowest_payment = PAYMENT_CALLS_PER_REQUEST * max_request_seconds() + LOCK_MARGIN_SECONDS
+    return max(settings.IDEMPOTENCY_LOCK_SECONDS, slowest_payment)
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a JSON-serializable request body"""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyService:
+    """
+    Service class for Idempotency-Key handling.
+    The first request with a key claims it by inserting an in_progress row;
+    the unique (user_id, scope, key) constraint makes concurrent duplicates
+    fail the insert and wait for that row to be completed instead of running
+    the request again.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def claim(self, user_id: int, scope: str, key: str, fingerprint: str) -> Optional[IdempotencyKey]:
+        """
+        Claim a key for this request, or get the saved response to replay.
+        Returns None when the caller owns the key and must run the request,
+        otherwise the completed record. Raises IdempotencyKeyMismatchError for
+        a different body and IdempotencyKeyInProgressError if the in-flight
+        request doesn't finish within IDEMPOTENCY_WAIT_SECONDS.
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            if self._insert_claim(user_id, scope, key, fingerprint):
+                return None
+
+            record = self._get(user_id, scope, key)
+            if record is None or self._take_over_expired(user_id, scope, key):
+                continue
+            if record.fingerprint != fingerprint:
+                raise IdempotencyKeyMismatchError("Idempotency-Key was already used with a different request")
+            if record.status == "completed":
+                return record
+            if time.monotonic() >= deadline:
+                raise IdempotencyKeyInProgressError("A request with this Idempotency-Key is still in progress")
+            time.sleep(POLL_INTERVAL)
+
+    def complete(self, user_id: int, scope: str, key: str, status_code: int, body: bytes):
+        """Save the response for a claimed key so retries replay it"""
+        self.db.rollback()  # Don't commit anything the request left behind
+        self.db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .values(
+                status="completed",
+                status_code=status_code,
+                response_body=body.decode(),
+                expires_at=datetime.now(timezone.utc) + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+    def release(self, user_id: int, scope: str, key: str):
+        """Drop a claimed key so the request can be retried"""
+        self.db.rollback()
+        self.db.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+    def purge_expired(self, batch_size: int = 1000) -> int:
+        """Delete one batch of expired keys; returns how many were deleted"""
+        expired_ids = [row_id for row_id, in self.db.query(IdempotencyKey.id).filter(
+            IdempotencyKey.expires_at < datetime.now(timezone.utc)
+        ).limit(batch_size)]
+        if expired_ids:
+            self.db.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.id.in_(expired_ids))
+                .execution_options(synchronize_session=False)
+            )
+        self.db.commit()
+        return len(expired_ids)
+
+    def _insert_claim(self, user_id: int, scope: str, key: str, fingerprint: str) -> bool:
+        try:
+            self.db.execute(insert(IdempotencyKey).values(
+                user_id=user_id,
+                scope=scope,
+                key=key,
+                fingerprint=fingerprint,
+                status="in_progress",
+                expires_at=datetime.now(timezone.utc) + timedelta(seconds=lock_seconds())
+            ))
+            self.db.commit()
+            return True
+        except IntegrityError:
+            self.db.rollback()
+            return False
+
+    def _get(self, user_id: int, scope: str, key: str) -> Optional[IdempotencyKey]:
+        self.db.expire_all()
+        return self.db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key
+        ).first()
+
+    def _take_over_expired(self, user_id: int, scope: str, key: str) -> bool:
+        """Delete the key if it has expired (saved response or abandoned claim)"""
+        result = self.db.execute(
+            delete(IdempotencyKey)
+            .where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.key == key,
+                IdempotencyKey.expires_at < datetime.now(timezone.utc)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return result.rowcount == 1
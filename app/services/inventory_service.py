@@ -0,0 +1,313 @@
+from datetime import datetime, timedelta, timezone
+from redis import RedisError
+from sqlalchemy import case, event, insert, update
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.models.product import Product
+from app.models.reservation import StockReservation
+from app.core.inventory_counters import HotStockCounters
+from app.config import settings
+from app.utils.logger import logger
+
+# session.info key for counter changes made in the session's open transaction
+COUNTER_CHANGES_KEY = "hot_stock_counter_changes"
+
+
+class InventoryService:
+    """
+    Service class for stock reservations.
+    Pending orders hold stock through Product.reserved_stock, so
+    available-to-sell is always stock - reserved_stock on the product row.
+
+    Products flagged is_hot keep their available-to-sell in sharded Redis
+    counters instead (see HotStockCounters); a background flusher writes the
+    counter total back to Product.stock. None of these methods commit except
+    the expiry sweep and the flush; callers own the surrounding transaction.
+    Counter changes made inside a transaction are undone if it rolls back.
+    """
+
+    def __init__(self, db: Session, counters: Optional[HotStockCounters] = None):
+        self.db = db
+        self._counters = counters
+
+    @property
+    def counters(self) -> HotStockCounters:
+        if self._counters is None:
+            self._counters = HotStockCounters()
+        return self._counters
+
+    def reserve_stock(self, order_id: int, quantities: Dict[int, int], hot_product_ids: Iterable[int] = ()):
+        """
+        Hold stock for an order until it expires.
+        Regular products are reserved by one conditional UPDATE and hot
+        products through their Redis counters. Raises ValueError if any
+        product no longer has enough available stock.
+        """
+        if not quantities:
+            return
+        hot = set(hot_product_ids) & set(quantities)
+        regular = {pid: qty for pid, qty in quantities.items() if pid not in hot}
+
+        if regular:
+            requested = case(regular, value=Product.id)
+            result = self.db.execute(
+                update(Product)
+                .where(Product.id.in_(sorted(regular)), Product.stock - Product.reserved_stock >= requested)
+                .values(reserved_stock=Product.reserved_stock + requested)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(regular):
+                raise ValueError(f"Insufficient stock for product {self._first_shortfall(regular)}")
+
+        self._take_hot({pid: quantities[pid] for pid in hot})
+
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.STOCK_RESERVATION_TTL_MINUTES)
+        self.db.execute(insert(StockReservation), [
+            {
+                "order_id": order_id,
+                "product_id": product_id,
+                "quantity": quantities[product_id],
+                "status": "active",
+                "source": "redis" if product_id in hot else "db",
+                "expires_at": expires_at
+            }
+            for product_id in sorted(quantities)
+        ])
+
+    def commit_reservations(self, order_id: int, quantities: Dict[int, int], hot_product_ids: Iterable[int] = ()):
+        """
+        Turn an order's reservations into real stock decrements.
+        Quantities no longer covered by an active reservation (e.g. after
+        expiry) are taken from available stock instead. Raises ValueError on
+        a shortfall.
+        """
+        hot = set(hot_product_ids)
+        held = self._claim_reservations(order_id, "converted")
+
+        hot_remainder: Dict[int, int] = {}
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            db_held, redis_held = held.get(product_id, (0, 0))
+            reserved = min(db_held, quantity)
+            unreserved = max(quantity - db_held - redis_held, 0)
+            if product_id in hot and unreserved:
+                hot_remainder[product_id] = unreserved
+                unreserved = 0
+            if not reserved and not unreserved:
+                continue
+            result = self.db.execute(
+                update(Product)
+                .where(
+                    Product.id == product_id,
+                    Product.reserved_stock >= reserved,
+                    Product.stock - Product.reserved_stock >= unreserved
+                )
+                .values(stock=Product.stock - reserved - unreserved, reserved_stock=Product.reserved_stock - reserved)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise ValueError(f"Insufficient stock for product {product_id}")
+
+        # Counters last, so a database shortfall never leaves units taken from Redis
+        self._take_hot(hot_remainder)
+
+    def release_reservations(self, order_id: int):
+        """Return an order's reserved stock to the available pool"""
+        self._release(self._claim_reservations(order_id, "released"))
+
+    def release_expired_reservations(self, batch_size: int = 500) -> int:
+        """Release one batch of expired reservations; returns how many were released"""
+        expired = self.db.query(
+            StockReservation.id, StockReservation.product_id, StockReservation.quantity, StockReservation.source
+        ).filter(
+            StockReservation.status == "active",
+            StockReservation.expires_at < datetime.now(timezone.utc)
+        ).order_by(StockReservation.expires_at).limit(batch_size).all()
+
+        self._release(self._claim_rows(expired, "released"))
+        self.db.commit()
+        return len(expired)
+
+    def seed_hot_stock(self, product: Product, overwrite: bool = True):
+        """Load a hot product's available stock into its Redis counters"""
+        try:
+            self.counters.seed(product.id, product.available_stock, overwrite=overwrite)
+        except RedisError:
+            raise ValueError("Inventory service temporarily unavailable")
+
+    def retire_hot_stock(self, product: Product):
+        """Write a product's counters back to the database and drop them"""
+        self.flush_hot_stock([product.id])
+        try:
+            self.counters.clear(product.id)
+        except RedisError:
+            raise ValueError("Inventory service temporarily unavailable")
+
+    def flush_hot_stock(self, product_ids: Optional[List[int]] = None) -> int:
+        """
+        Write hot counter totals back to Product.stock.
+        Units held by database-side reservations are kept on top of the
+        counter total, so available_stock matches what Redis can still sell.
+        """
+        if product_ids is None:
+            product_ids = [pid for pid, in self.db.query(Product.id).filter(Product.is_hot.is_(True))]
+        flushed = 0
+        for product_id in sorted(product_ids):
+            try:
+                total = self.counters.total(product_id)
+            except RedisError:
+                break
+            if total is None:
+                continue
+            self.db.execute(
+                update(Product)
+                .where(Product.id == product_id)
+                .values(stock=Product.reserved_stock + total)
+                .execution_options(synchronize_session=False)
+            )
+            flushed += 1
+        self.db.commit()
+        return flushed
+
+    def _take_hot(self, quantities: Dict[int, int]):
+        """Take units from hot counters, all or nothing"""
+        taken: List[Tuple[int, int]] = []
+        try:
+            for product_id in sorted(quantities):
+                if not self._take_counter(product_id, quantities[product_id]):
+                    self._give_back(taken)
+                    raise ValueError(f"Insufficient stock for product {product_id}")
+                taken.append((product_id, quantities[product_id]))
+        except RedisError:
+            self._give_back(taken)
+            raise ValueError("Inventory service temporarily unavailable")
+        self._track([(product_id, -quantity) for product_id, quantity in taken])
+
+    def _take_counter(self, product_id: int, quantity: int) -> bool:
+        try:
+            return self.counters.take(product_id, quantity)
+        except LookupError:
+            # First sale since the product went hot: seed from the database
+            product = self.db.query(Product).filter(Product.id == product_id).first()
+            self.counters.seed(product_id, product.available_stock if product else 0)
+            return self.counters.take(product_id, quantity)
+
+    def _give_back(self, quantities: Iterable[Tuple[int, int]]):
+        for product_id, quantity in quantities:
+            self.counters.give_back(product_id, quantity)
+
+    def _claim_reservations(self, order_id: int, new_status: str) -> Dict[int, Tuple[int, int]]:
+        """Move an order's active reservations to new_status; returns claimed (db, redis) quantities per product"""
+        reservations = self.db.query(
+            StockReservation.id, StockReservation.product_id, StockReservation.quantity, StockReservation.source
+        ).filter(
+            StockReservation.order_id == order_id,
+            StockReservation.status == "active"
+        ).order_by(StockReservation.product_id).all()
+        return self._claim_rows(reservations, new_status)
+
+    def _claim_rows(self, reservations, new_status: str) -> Dict[int, Tuple[int, int]]:
+        claimed: Dict[int, Tuple[int, int]] = {}
+        for reservation_id, product_id, quantity, source in reservations:
+            if self._claim(reservation_id, new_status):
+                db_qty, redis_qty = claimed.get(product_id, (0, 0))
+                if source == "redis":
+                    claimed[product_id] = (db_qty, redis_qty + quantity)
+                else:
+                    claimed[product_id] = (db_qty + quantity, redis_qty)
+        return claimed
+
+    def _claim(self, reservation_id: int, new_status: str) -> bool:
+        """Conditionally close one active reservation, so payment and expiry can't both claim it"""
+        result = self.db.execute(
+            update(StockReservation)
+            .where(StockReservation.id == reservation_id, StockReservation.status == "active")
+            .values(status=new_status)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    def _release(self, quantities: Dict[int, Tuple[int, int]]):
+        """
+        Give reserved quantities back to available stock.
+        For hot products the counters are the available stock, so every unit
+        goes back to them, including units a database reservation took before
+        the product went hot (the flush would otherwise drop them from the row).
+        """
+        if not quantities:
+            return
+        hot = {pid for pid, in self.db.query(Product.id).filter(
+            Product.id.in_(list(quantities)), Product.is_hot.is_(True)
+        )}
+        to_counters = {
+            product_id: redis_qty + (db_qty if product_id in hot else 0)
+            for product_id, (db_qty, redis_qty) in quantities.items()
+        }
+
+        # Counters first, all or nothing, so a Redis outage leaves every reservation active
+        returned: Dict[int, int] = {}
+        for product_id in sorted(to_counters):
+            if not to_counters[product_id]:
+                continue
+            try:
+                if self.counters.give_back(product_id, to_counters[product_id]):
+                    returned[product_id] = to_counters[product_id]
+            except RedisError:
+                if product_id in hot:
+                    _undo_counter_changes([(self.counters, pid, qty) for pid, qty in returned.items()])
+                    raise ValueError("Inventory service temporarily unavailable")
+        self._track(list(returned.items()))
+
+        for product_id in sorted(quantities):
+            db_qty, redis_qty = quantities[product_id]
+            self.db.execute(
+                update(Product)
+                .where(Product.id == product_id)
+                .values(
+                    # Counter units the counters couldn't take back (product no longer hot) go to the row
+                    stock=Product.stock + (0 if product_id in returned else redis_qty),
+                    reserved_stock=Product.reserved_stock - db_qty
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+    def _track(self, changes: List[Tuple[int, int]]):
+        """Remember (product_id, delta) counter changes on the session until its transaction ends"""
+        if changes:
+            tracked = self.db.info.setdefault(COUNTER_CHANGES_KEY, [])
+            tracked.extend((self.counters, product_id, delta) for product_id, delta in changes)
+
+    def _first_shortfall(self, quantities: Dict[int, int]) -> int:
+        """Find a product that can't cover its requested quantity"""
+        rows = self.db.query(Product.id, Product.stock - Product.reserved_stock).filter(
+            Product.id.in_(list(quantities))
+        ).all()
+        available = dict(rows)
+        for product_id in sorted(quantities):
+            if available.get(product_id, 0) < quantities[product_id]:
+                return product_id
+        return min(quantities)
+
+
+def _undo_counter_changes(changes: List[Tuple[HotStockCounters, int, int]]):
+    """Reverse counter changes whose database transaction didn't commit (best effort)"""
+    for counters, product_id, delta in reversed(changes):
+        try:
+            if delta < 0:
+                counters.give_back(product_id, -delta)
+            elif not counters.take(product_id, delta):
+                logger.warning(f"Hot stock counters for product {product_id} are {delta} units over")
+        except (RedisError, LookupError) as e:
+            logger.warning(f"Could not undo hot stock change for product {product_id}: {str(e)}")
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_counter_changes(session):
+    session.info.pop(COUNTER_CHANGES_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _undo_uncommitted_counter_changes(session):
+    changes = session.info.pop(COUNTER_CHANGES_KEY, None)
+    if changes:
+        _undo_counter_changes(changes)
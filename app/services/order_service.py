@@ -1,10 +1,14 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session, selectinload
+from typing import Dict, List, Optional
 from app.models.order import Order, OrderItem
 from app.models.product import Product
 from app.schemas.order import OrderCreate, OrderItemCreate
-from app.core.algorithms import calculate_subtotal, calculate_order_total
+from app.core.algorithms import calculate_subtotals
+from app.core.money import Money
+from app.core.pagination import encode_cursor, decode_cursor
 from app.services.product_service import ProductService
+from app.services.inventory_service import InventoryService
 
 
 class OrderService:
@@ -13,67 +17,134 @@ class OrderService:
     def __init__(self, db: Session):
         self.db = db
         self.product_service = ProductService(db)
+        self.inventory_service = InventoryService(db)
 
     def create_order(self, user_id: int, order_data: OrderCreate) -> Order:
-        """Create a new order with deterministic total calculation"""
-        # Validate all products and check stock
-        order_items_data = []
+        """
+        Create a new order with deterministic total calculation.
+        All products are loaded in one query and the order items are written
+        in one executemany insert, so the statement count doesn't grow with the cart.
+        """
+        products = self.product_service.get_products_by_ids(
+            [item_data.product_id for item_data in order_data.items]
+        )
+
+        # Validate all products and check stock against the cart-wide quantity
+        requested: Dict[int, int] = {}
         for item_data in order_data.items:
-            product = self.product_service.get_product_by_id(item_data.product_id)
+            product = products.get(item_data.product_id)
             if not product:
                 raise ValueError(f"Product {item_data.product_id} not found")
             if product.status != "active":
                 raise ValueError(f"Product {item_data.product_id} is not active")
-            if not self.product_service.check_stock_availability(item_data.product_id, item_data.quantity):
+            requested[product.id] = requested.get(product.id, 0) + item_data.quantity
+            # Hot products' rows lag their Redis counters, which have the final say
+            if not product.is_hot and product.available_stock < requested[product.id]:
                 raise ValueError(f"Insufficient stock for product {item_data.product_id}")
 
-            # Calculate subtotal deterministically
-            subtotal = calculate_subtotal(item_data.quantity, product.price)
-            order_items_data.append({
-                "product": product,
+        # Build order item rows; money is computed in integer cents, converting each price once
+        unit_prices = {product_id: Money.from_decimal(product.price) for product_id, product in products.items()}
+        subtotals = calculate_subtotals(
+            [item_data.quantity for item_data in order_data.items],
+            [unit_prices[item_data.product_id] for item_data in order_data.items]
+        )
+        item_rows = [
+            {
+                "product_id": item_data.product_id,
                 "quantity": item_data.quantity,
-                "price": product.price,
-                "subtotal": subtotal
-            })
+                "price": unit_prices[item_data.product_id].to_decimal(),
+                "subtotal": subtotal.to_decimal()
+            }
+            for item_data, subtotal in zip(order_data.items, subtotals)
+        ]
 
         # Create order
         new_order = Order(
             user_id=user_id,
-            total_amount=0,  # Will be calculated
+            total_amount=Money.sum(subtotals).to_decimal(),
             status="pending"
         )
         self.db.add(new_order)
         self.db.flush()  # Get order ID
 
-        # Create order items
-        order_items = []
-        for item_data in order_items_data:
-            order_item = OrderItem(
-                order_id=new_order.id,
-                product_id=item_data["product"].id,
-                quantity=item_data["quantity"],
-                price=item_data["price"],
-                subtotal=item_data["subtotal"]
+        # Hold the stock until the order is paid, canceled or the hold expires
+        try:
+            self.inventory_service.reserve_stock(
+                new_order.id, requested, hot_product_ids=[pid for pid in requested if products[pid].is_hot]
             )
-            order_items.append(order_item)
-            self.db.add(order_item)
+        except ValueError:
+            self.db.rollback()
+            raise
 
-        # Calculate total deterministically
-        new_order.total_amount = calculate_order_total(order_items)
+        # Create order items in a single executemany insert
+        self.db.execute(insert(OrderItem), [{**row, "order_id": new_order.id} for row in item_rows])
         self.db.commit()
         self.db.refresh(new_order)
         return new_order
 
     def get_order_by_id(self, order_id: int, user_id: Optional[int] = None) -> Optional[Order]:
         """Get order by ID, optionally filtered by user"""
-        query = self.db.query(Order).filter(Order.id == order_id)
+        query = self.db.query(Order).options(selectinload(Order.order_items)).filter(Order.id == order_id)
         if user_id:
             query = query.filter(Order.user_id == user_id)
         return query.first()
 
-    def get_user_orders(self, user_id: int, skip: int = 0, limit: int = 100) -> List[Order]:
-        """Get all orders for a user"""
-        return self.db.query(Order).filter(Order.user_id == user_id).offset(skip).limit(limit).all()
+    def get_user_orders(
+        self,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> List[Order]:
+        """
+        Get all orders for a user, newest first.
+        When a cursor is given, paging seeks past the cursor's id on the
+        (user_id, id) index instead of using skip. Order items for the whole
+        page are loaded in one extra query.
+        """
+        query = self.db.query(Order).options(selectinload(Order.order_items))
+        return self._page_user_orders(query, user_id, skip, limit, cursor).all()
+
+    def get_user_order_summaries(
+        self,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> List[Order]:
+        """
+        Get order headers for a user, newest first, without their items.
+        Each row carries item_count (total units ordered), computed by a
+        correlated subquery so the page costs a single query.
+        """
+        item_count = select(func.coalesce(func.sum(OrderItem.quantity), 0)).where(
+            OrderItem.order_id == Order.id
+        ).correlate(Order).scalar_subquery()
+        query = self.db.query(
+            Order.id, Order.user_id, Order.total_amount, Order.status,
+            Order.created_at, Order.updated_at, item_count.label("item_count")
+        )
+        return self._page_user_orders(query, user_id, skip, limit, cursor).all()
+
+    def _page_user_orders(self, query, user_id: int, skip: int, limit: int, cursor: Optional[str]):
+        """Restrict a query to one page of a user's orders"""
+        query = query.filter(Order.user_id == user_id).order_by(Order.id.desc())
+        if cursor:
+            last_id, = decode_cursor(cursor)
+            try:
+                last_id = int(last_id)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            query = query.filter(Order.id < last_id)
+        else:
+            query = query.offset(skip)
+        return query.limit(limit)
+
+    def next_cursor(self, orders: List[Order], limit: int) -> Optional[str]:
+        """Get the cursor for the page after this one, if there may be one"""
+        if len(orders) < limit:
+            return None
+        return encode_cursor(orders[-1].id)
 
     def update_order_status(self, order_id: int, status: str) -> Optional[Order]:
         """Update order status"""
@@ -94,25 +165,37 @@ class OrderService:
         if order.status not in ["pending", "paid"]:
             raise ValueError("Order cannot be canceled in current status")
 
+        if order.status == "pending":
+            self.inventory_service.release_reservations(order.id)
         order.status = "canceled"
         self.db.commit()
         self.db.refresh(order)
         return order
 
     def mark_order_as_paid(self, order_id: int) -> Optional[Order]:
-        """Mark order as paid and reduce stock"""
+        """
+        Mark order as paid and convert its stock reservations in a single transaction.
+        Idempotent: an order that is already paid is returned unchanged.
+        """
         order = self.get_order_by_id(order_id)
         if not order:
             return None
+        if order.status == "paid":
+            return order
 
-        # Reduce stock for each product in order items
+        quantities: Dict[int, int] = {}
         for order_item in order.order_items:
-            try:
-                self.product_service.reduce_stock(order_item.product_id, order_item.quantity)
-            except ValueError as e:
-                # If stock reduction fails, rollback
-                self.db.rollback()
-                raise e
+            quantities[order_item.product_id] = quantities.get(order_item.product_id, 0) + order_item.quantity
+        hot_product_ids = [pid for pid, in self.db.query(Product.id).filter(
+            Product.id.in_(list(quantities)), Product.is_hot.is_(True)
+        )]
+
+        try:
+            self.inventory_service.commit_reservations(order.id, quantities, hot_product_ids=hot_product_ids)
+        except ValueError:
+            # Nothing has been committed yet, so every decrement is undone
+            self.db.rollback()
+            raise
 
         # Update order status
         order.status = "paid"
@@ -1,12 +1,17 @@
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
-from app.models.payment import Payment
+from typing import Optional, Dict, Any, List, Tuple
+from app.models.payment import Payment, PaymentEvent
 from app.models.order import Order
 from app.services.order_service import OrderService
+from app.core.money import Money
 from app.payment.base import PaymentProvider
-from app.payment.stripe_provider import StripePaymentStrategy
-from app.payment.bkash_provider import BkashPaymentStrategy
+from app.payment.registry import get_provider
 from app.config import settings
+from app.utils.logger import logger
+
+# Payment statuses in the only order they may move through
+PAYMENT_STATUS_RANK = {"pending": 0, "failed": 1, "success": 2}
 
 
 class PaymentService:
@@ -15,17 +20,10 @@ class PaymentService:
     def __init__(self, db: Session):
         self.db = db
         self.order_service = OrderService(db)
-        self._providers: Dict[str, PaymentProvider] = {
-            "stripe": StripePaymentStrategy(),
-            "bkash": BkashPaymentStrategy()
-        }
 
     def _get_provider(self, provider_name: str) -> PaymentProvider:
-        """Get payment provider by name"""
-        provider = self._providers.get(provider_name.lower())
-        if not provider:
-            raise ValueError(f"Payment provider '{provider_name}' not supported")
-        return provider
+        """Get the shared payment provider by name"""
+        return get_provider(provider_name)
 
     def initiate_payment(self, order_id: int, provider: str) -> Dict[str, Any]:
         """Initiate payment with specified provider"""
@@ -38,17 +36,23 @@ class PaymentService:
         payment_provider = self._get_provider(provider)
 
         # Create payment intent with provider
-        result = payment_provider.create_payment_intent(order_id, float(order.total_amount))
+        result = payment_provider.create_payment_intent(order_id, Money.from_decimal(order.total_amount))
 
         # Save payment record
         payment = Payment(
             order_id=order_id,
             provider=provider.lower(),
             transaction_id=result["transaction_id"],
-            status="pending",
-            raw_response=result.get("raw_response")
+            status="pending"
         )
         self.db.add(payment)
+        self.db.flush()
+        self.db.add(PaymentEvent(
+            payment_id=payment.id,
+            source="create",
+            status="pending",
+            payload_zlib=PaymentEvent.compress(result.get("raw_response"))
+        ))
         self.db.commit()
         self.db.refresh(payment)
 
@@ -72,18 +76,7 @@ class PaymentService:
 
         payment_provider = self._get_provider(provider)
         result = payment_provider.confirm_payment(transaction_id)
-
-        # Update payment status
-        payment.status = result["status"]
-        payment.raw_response = result.get("raw_response")
-        self.db.commit()
-        self.db.refresh(payment)
-
-        # Update order status if payment successful
-        if result["status"] == "success":
-            self.order_service.mark_order_as_paid(payment.order_id)
-
-        return payment
+        return self._apply_result(payment, result, "confirm")
 
     def query_payment(self, transaction_id: str, provider: str) -> Optional[Payment]:
         """Query payment status from provider"""
@@ -97,38 +90,149 @@ class PaymentService:
 
         payment_provider = self._get_provider(provider)
         result = payment_provider.query_payment(transaction_id)
+        return self._apply_result(payment, result, "query")
 
-        # Update payment status
-        payment.status = result["status"]
-        payment.raw_response = result.get("raw_response")
-        self.db.commit()
+    def _apply_result(self, payment: Payment, result: Dict[str, Any], source: str) -> Payment:
+        """Apply one provider result to a payment and commit"""
+        self.apply_results([(payment.id, payment.order_id, result)], source)
         self.db.refresh(payment)
-
         return payment
 
+    def apply_results(self, results: List[Tuple[int, int, Dict[str, Any]]], source: str = "query") -> int:
+        """
+        Apply (payment_id, order_id, result) provider results in one transaction.
+        Statuses only advance pending -> failed -> success (a failed payment can
+        still be retried), so late or redelivered updates can't undo a success.
+        Results with an unknown status are recorded but don't move the payment.
+        Every result's provider payload is appended to payment_events; the
+        payments row itself only carries the status. Returns how many payments
+        changed status.
+
+        Orders are settled after the commit for every success result, including
+        ones for payments that were already successful, so a settlement that
+        failed earlier is retried by the next webhook, confirm or reconcile run.
+        """
+        settle_order_ids: List[int] = []
+        changed = 0
+        for payment_id, order_id, result in results:
+            new_status = result.get("status")
+            if new_status not in PAYMENT_STATUS_RANK:
+                logger.warning(f"Ignoring unknown status {new_status!r} for payment {payment_id}")
+                continue
+            earlier = [status for status, rank in PAYMENT_STATUS_RANK.items() if rank < PAYMENT_STATUS_RANK[new_status]]
+            updated = self.db.execute(
+                update(Payment)
+                .where(Payment.id == payment_id, Payment.status.in_(earlier))
+                .values(status=new_status)
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+            if updated:
+                changed += 1
+            if new_status == "success":
+                settle_order_ids.append(order_id)
+        if results:
+            self.db.execute(insert(PaymentEvent), [
+                {
+                    "payment_id": payment_id,
+                    "source": source,
+                    "status": str(result.get("status"))[:20],
+                    "payload_zlib": PaymentEvent.compress(result.get("raw_response"))
+                }
+                for payment_id, _, result in results
+            ])
+        self.db.commit()
+
+        for order_id in dict.fromkeys(settle_order_ids):
+            self.settle_order(order_id)
+        return changed
+
+    def settle_order(self, order_id: int) -> bool:
+        """
+        Mark the order of a successful payment as paid (a no-op if it already is).
+        Failures are logged and left for a later result or reconciliation run
+        to retry; the payment stays successful either way.
+        """
+        try:
+            self.order_service.mark_order_as_paid(order_id)
+            return True
+        except ValueError as e:
+            self.db.rollback()
+            logger.error(f"Could not mark order {order_id} as paid: {str(e)}")
+        except Exception:
+            self.db.rollback()
+            logger.exception(f"Could not mark order {order_id} as paid")
+        return False
+
     def get_payment_by_id(self, payment_id: int) -> Optional[Payment]:
         """Get payment by ID"""
         return self.db.query(Payment).filter(Payment.id == payment_id).first()
 
-    def handle_webhook(self, provider: str, payload: Dict[str, Any], signature: Optional[str] = None) -> Optional[Payment]:
+    def get_payment_events(self, payment_id: int, skip: int = 0, limit: int = 100) -> List[PaymentEvent]:
+        """Provider payload history for a payment, oldest first"""
+        return self.db.query(PaymentEvent).filter(
+            PaymentEvent.payment_id == payment_id
+        ).order_by(PaymentEvent.id).offset(skip).limit(limit).all()
+
+    def handle_webhook(
+        self,
+        provider: str,
+        payload: Dict[str, Any],
+        signature: Optional[str] = None,
+        raw_body: Optional[bytes] = None
+    ) -> Optional[Payment]:
         """Handle webhook from payment provider"""
+        verified = self.verify_webhook(provider, payload, signature, raw_body)
+        return self.process_webhook(provider, payload, trusted=verified)
+
+    def verify_webhook(
+        self,
+        provider: str,
+        payload: Dict[str, Any],
+        signature: Optional[str] = None,
+        raw_body: Optional[bytes] = None
+    ) -> bool:
+        """
+        Verify a webhook's signature against the exact request bytes.
+        Raises ValueError if it is invalid, or missing while the provider has a
+        webhook secret configured. Returns True only when a signature was
+        actually checked, i.e. the payload can be trusted as-is.
+        """
+        payment_provider = self._get_provider(provider)
+        if not signature:
+            if payment_provider.webhook_secret_configured:
+                raise ValueError("Missing webhook signature")
+            return False
+        if raw_body is None:
+            # Re-serializing the parsed payload changes the bytes the signature covers
+            raise ValueError("Raw request body is required to verify the webhook signature")
+        if not payment_provider.verify_webhook_signature(raw_body, signature):
+            raise ValueError("Invalid webhook signature")
+        return payment_provider.webhook_secret_configured
+
+    def webhook_event_id(self, provider: str, payload: Dict[str, Any]) -> str:
+        """Id shared by every redelivery of a webhook"""
+        return self._get_provider(provider).extract_event_id_from_webhook(payload)
+
+    def process_webhook(self, provider: str, payload: Dict[str, Any], trusted: bool = False) -> Optional[Payment]:
+        """
+        Apply a webhook to its payment.
+        A trusted (signature-verified) payload that states a definite outcome is
+        applied directly; anything else is resolved by querying the provider.
+        """
         payment_provider = self._get_provider(provider)
-        
-        # Verify webhook signature if provided
-        if signature and hasattr(payment_provider, 'verify_webhook_signature'):
-            # For Stripe, payload needs to be bytes for signature verification
-            if provider == "stripe" and isinstance(payload, dict):
-                import json
-                payload_bytes = json.dumps(payload).encode()
-                if not payment_provider.verify_webhook_signature(payload_bytes, signature):
-                    raise ValueError("Invalid webhook signature")
-            elif not payment_provider.verify_webhook_signature(payload, signature):
-                raise ValueError("Invalid webhook signature")
-
-        # Process webhook
         transaction_id = payment_provider.extract_transaction_id_from_webhook(payload)
         if not transaction_id:
             return None
 
-        # Query payment status
-        return self.query_payment(transaction_id, provider)
+        result = payment_provider.result_from_webhook(payload) if trusted else None
+        if result is None:
+            # Query payment status
+            return self.query_payment(transaction_id, provider)
+
+        payment = self.db.query(Payment).filter(
+            Payment.transaction_id == transaction_id,
+            Payment.provider == provider.lower()
+        ).first()
+        if not payment:
+            return None
+        return self._apply_result(payment, result, "webhook")
@@ -1,8 +1,33 @@
+import re
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import or_, text, tuple_, case, func, update
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate
-from app.core.algorithms import reduce_stock_quantity
+from app.schemas.product import (
+    ProductCreate, ProductUpdate, ProductFilter, ProductFacets, CategoryFacet, PriceBucketFacet
+)
+from app.core.cache import invalidate_tags
+from app.core.pagination import encode_cursor, decode_cursor
+from app.services.category_service import CategoryService
+from app.services.inventory_service import InventoryService
+
+# Sort key column (None for id only) and direction for each listing sort
+PRODUCT_SORTS = {
+    "id": (None, False),
+    "newest": (None, True),
+    "price_asc": (Product.price, False),
+    "price_desc": (Product.price, True),
+    "name": (Product.name, False),
+}
+
+# Lower bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = [Decimal(v) for v in ("0", "25", "50", "100", "250", "500", "1000")]
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards (with backslash as the escape character) so user input matches literally"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
 class ProductService:
@@ -25,23 +50,182 @@ class ProductService:
             price=product_data.price,
             stock=product_data.stock,
             status=product_data.status,
-            category_id=product_data.category_id
+            category_id=product_data.category_id,
+            is_hot=product_data.is_hot
         )
         self.db.add(new_product)
         self.db.commit()
         self.db.refresh(new_product)
+        self._invalidate_recommendations(new_product.id, new_product.category_id)
         return new_product
 
     def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """Get product by ID"""
         return self.db.query(Product).filter(Product.id == product_id).first()
 
-    def get_all_products(self, skip: int = 0, limit: int = 100, status: Optional[str] = None) -> List[Product]:
-        """Get all products with optional filtering"""
-        query = self.db.query(Product)
+    def get_products_by_ids(self, product_ids: List[int]) -> Dict[int, Product]:
+        """Get products by ID in a single query, keyed by id"""
+        if not product_ids:
+            return {}
+        products = self.db.query(Product).filter(Product.id.in_(set(product_ids))).all()
+        return {product.id: product for product in products}
+
+    def get_all_products(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        filters: Optional[ProductFilter] = None
+    ) -> List[Product]:
+        """
+        Get all products with optional filtering and sorting.
+        When a cursor is given, paging seeks past the cursor's sort key instead
+        of using skip, so every page costs the same as the first.
+        """
+        filters = filters or ProductFilter()
+        query = self._apply_filters(self.db.query(Product), status, filters)
+
+        sort_column, descending = PRODUCT_SORTS[filters.sort]
+        keys = ([sort_column] if sort_column is not None else []) + [Product.id]
+        query = query.order_by(*[key.desc() if descending else key for key in keys])
+
+        if cursor:
+            values = decode_cursor(cursor, size=len(keys) + 1)
+            if values[0] != filters.sort:
+                raise ValueError("Cursor does not match the requested sort order")
+            last = [self._cursor_value(key, value) for key, value in zip(keys, values[1:])]
+            position = tuple_(*keys)
+            query = query.filter(position < tuple(last) if descending else position > tuple(last))
+        else:
+            query = query.offset(skip)
+        return query.limit(limit).all()
+
+    def next_cursor(self, products: List[Product], limit: int, sort: str = "id") -> Optional[str]:
+        """Get the cursor for the page after this one, if there may be one"""
+        if len(products) < limit:
+            return None
+        sort_column, _ = PRODUCT_SORTS[sort]
+        last = products[-1]
+        values = [getattr(last, sort_column.key)] if sort_column is not None else []
+        return encode_cursor(sort, *values, last.id)
+
+    def get_product_facets(self, status: Optional[str] = None, filters: Optional[ProductFilter] = None) -> ProductFacets:
+        """
+        Count matching products per category and per price bucket.
+        Each facet ignores its own filter so clients can show alternatives.
+        """
+        filters = filters or ProductFilter()
+
+        category_filters = filters.model_copy(update={"category_id": None})
+        category_rows = self._apply_filters(
+            self.db.query(Product.category_id, func.count(Product.id)), status, category_filters
+        ).group_by(Product.category_id).order_by(Product.category_id).all()
+
+        bucket = case(
+            *[(Product.price < upper, index) for index, upper in enumerate(PRICE_BUCKETS[1:])],
+            else_=len(PRICE_BUCKETS) - 1
+        )
+        price_filters = filters.model_copy(update={"min_price": None, "max_price": None})
+        bucket_counts = dict(self._apply_filters(
+            self.db.query(bucket, func.count(Product.id)), status, price_filters
+        ).group_by(bucket).all())
+
+        return ProductFacets(
+            categories=[CategoryFacet(category_id=cid, count=count) for cid, count in category_rows],
+            price_buckets=[
+                PriceBucketFacet(
+                    min_price=lower,
+                    max_price=PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None,
+                    count=bucket_counts.get(index, 0)
+                )
+                for index, lower in enumerate(PRICE_BUCKETS)
+            ]
+        )
+
+    def _apply_filters(self, query, status: Optional[str], filters: ProductFilter):
+        """Apply status and product filters to a query over products"""
         if status:
             query = query.filter(Product.status == status)
-        return query.offset(skip).limit(limit).all()
+        if filters.min_price is not None:
+            query = query.filter(Product.price >= filters.min_price)
+        if filters.max_price is not None:
+            query = query.filter(Product.price <= filters.max_price)
+        if filters.in_stock:
+            query = query.filter(Product.stock - Product.reserved_stock > 0)
+        if filters.category_id is not None:
+            # Subtree ids come from the in-memory category snapshot
+            category_ids = CategoryService(self.db).get_subtree_ids(filters.category_id)
+            query = query.filter(Product.category_id.in_(category_ids))
+        return query
+
+    @staticmethod
+    def _cursor_value(column, value):
+        """Convert a decoded cursor value back to the column's type"""
+        try:
+            if column is Product.price:
+                return Decimal(str(value))
+            if column is Product.id:
+                return int(value)
+            return str(value)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+
+    def search_products(self, query_text: str, limit: int = 20) -> List[Product]:
+        """
+        Full-text search over product name, SKU and description, best match first.
+        Uses the tsvector/trigram indexes on Postgres and FTS5 on SQLite.
+        """
+        terms = re.findall(r"\w+", query_text)
+        if not terms:
+            return []
+
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            rows = self.db.execute(self._postgres_search_statement(query_text, limit))
+        elif dialect == "sqlite":
+            # Quote each term so user input can't inject FTS5 syntax; match on prefixes
+            match = " ".join('"{}"*'.format(term.replace('"', '')) for term in terms)
+            rows = self.db.execute(text("""
+                SELECT products.id
+                FROM products_fts
+                JOIN products ON products.id = products_fts.rowid
+                WHERE products_fts MATCH :match AND products.status = 'active'
+                ORDER BY bm25(products_fts, 10.0, 10.0, 1.0), products.id
+                LIMIT :limit
+            """), {"match": match, "limit": limit})
+        else:
+            pattern = f"%{escape_like(query_text)}%"
+            rows = self.db.query(Product.id).filter(
+                Product.status == "active",
+                or_(
+                    Product.name.ilike(pattern, escape="\\"),
+                    Product.sku.ilike(pattern, escape="\\"),
+                    Product.description.ilike(pattern, escape="\\")
+                )
+            ).order_by(Product.id).limit(limit)
+
+        ranked_ids = [row[0] for row in rows]
+        if not ranked_ids:
+            return []
+        products = {p.id: p for p in self.db.query(Product).filter(Product.id.in_(ranked_ids))}
+        return [products[pid] for pid in ranked_ids if pid in products]
+
+    @staticmethod
+    def _postgres_search_statement(query_text: str, limit: int):
+        """Ranked search over the tsvector and trigram indexes (Postgres only)"""
+        return text("""
+            SELECT products.id
+            FROM products
+            CROSS JOIN (
+                SELECT websearch_to_tsquery('english', :q) || websearch_to_tsquery('simple', :q) AS query
+            ) AS q
+            WHERE products.status = 'active'
+              AND (products.search_vector @@ q.query OR :q <% products.name OR products.sku ILIKE :prefix ESCAPE '\\')
+            ORDER BY ts_rank(products.search_vector, q.query) + word_similarity(:q, products.name) DESC,
+                     products.id
+            LIMIT :limit
+        """).bindparams(q=query_text, prefix=f"{escape_like(query_text)}%", limit=limit)
 
     def update_product(self, product_id: int, product_data: ProductUpdate) -> Optional[Product]:
         """Update a product"""
@@ -57,11 +241,22 @@ class ProductService:
             if existing:
                 raise ValueError("Product with this SKU already exists")
 
+        inventory_service = InventoryService(self.db)
+        was_hot = product.is_hot
+        if was_hot and update_data.get("is_hot") is False:
+            # Bring the row up to date with Redis before it becomes the source of truth again
+            inventory_service.retire_hot_stock(product)
+
+        previous_category_id = product.category_id
         for field, value in update_data.items():
             setattr(product, field, value)
 
         self.db.commit()
         self.db.refresh(product)
+        if product.is_hot and (not was_hot or "stock" in update_data):
+            # Stock edits on a hot product restate what the counters can sell
+            inventory_service.seed_hot_stock(product)
+        self._invalidate_recommendations(product.id, previous_category_id, product.category_id)
         return product
 
     def delete_product(self, product_id: int) -> bool:
@@ -69,25 +264,50 @@ class ProductService:
         product = self.get_product_by_id(product_id)
         if not product:
             return False
+        category_id = product.category_id
         self.db.delete(product)
         self.db.commit()
+        self._invalidate_recommendations(product_id, category_id)
         return True
 
+    def _invalidate_recommendations(self, product_id: int, *category_ids: Optional[int]):
+        """Invalidate cached recommendations that include or are built for a product"""
+        tags = [f"product:{product_id}"]
+        tags += [f"category:{cid}" for cid in set(category_ids) if cid is not None]
+        invalidate_tags(*tags)
+
     def reduce_stock(self, product_id: int, quantity: int) -> Product:
         """Reduce product stock atomically"""
-        product = self.get_product_by_id(product_id)
-        if not product:
-            raise ValueError("Product not found")
-        
-        new_stock = reduce_stock_quantity(product.stock, quantity)
-        product.stock = new_stock
+        try:
+            self.reduce_stock_bulk({product_id: quantity})
+        except ValueError:
+            self.db.rollback()
+            raise
         self.db.commit()
-        self.db.refresh(product)
-        return product
+        return self.get_product_by_id(product_id)
+
+    def reduce_stock_bulk(self, quantities: Dict[int, int]):
+        """
+        Atomically reduce unreserved stock for several products without committing.
+        Each product is decremented with a conditional UPDATE, in product id
+        order so concurrent checkouts lock rows in the same order. Raises
+        ValueError on the first shortfall; the caller owns the transaction
+        and should roll it back.
+        """
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            result = self.db.execute(
+                update(Product)
+                .where(Product.id == product_id, Product.stock - Product.reserved_stock >= quantity)
+                .values(stock=Product.stock - quantity)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise ValueError(f"Insufficient stock for product {product_id}")
 
     def check_stock_availability(self, product_id: int, quantity: int) -> bool:
-        """Check if product has sufficient stock"""
+        """Check if product has sufficient unreserved stock"""
         product = self.get_product_by_id(product_id)
         if not product:
             return False
-        return product.stock >= quantity
+        return product.available_stock >= quantity
@@ -0,0 +1,117 @@
+from collections import Counter
+from itertools import permutations
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session
+from typing import Dict, List, Set, Tuple
+from app.config import settings
+from app.models.order import OrderItem
+from app.models.product import Product
+from app.models.recommendation import ProductCopurchase, CopurchaseOrder, JobWatermark
+from app.services.category_service import CategoryService
+
+COPURCHASE_WATERMARK = "copurchase_index"
+
+
+class RecommendationService:
+    """Service class for "bought together" product recommendations"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.category_service = CategoryService(db)
+
+    def get_recommendations(self, product_id: int, limit: int = 10) -> List[Product]:
+        """
+        Get products most often bought together with the given product.
+        Falls back to the category subtree for products with no purchase history.
+        """
+        products = self.db.query(Product).join(
+            ProductCopurchase, ProductCopurchase.related_product_id == Product.id
+        ).filter(
+            ProductCopurchase.product_id == product_id,
+            Product.status == "active"
+        ).order_by(
+            ProductCopurchase.score.desc(), Product.id
+        ).limit(limit).all()
+
+        if products:
+            return products
+        return self.category_service.get_related_products(product_id, limit=limit)
+
+    def update_copurchase_index(self, batch_size: int = 1000) -> int:
+        """
+        Fold the next batch of new order items into the co-purchase counts.
+        An order's items are inserted together, so orders are counted whole,
+        each pair of distinct products once, and recorded in copurchase_orders.
+        Item ids are not commit-ordered: an order committed after a later one
+        sits below the high-water mark, so every call also re-reads the last
+        COPURCHASE_RESCAN_WINDOW ids for orders not counted yet. Returns the
+        number of order items consumed (0 when the index is up to date).
+        """
+        watermark = self.db.query(JobWatermark).filter(JobWatermark.name == COPURCHASE_WATERMARK).first()
+        if not watermark:
+            watermark = JobWatermark(name=COPURCHASE_WATERMARK, value=0)
+            self.db.add(watermark)
+        last_seen = watermark.value or 0
+        window_start = max(last_seen - settings.COPURCHASE_RESCAN_WINDOW, 0)
+
+        new_items = self.db.query(OrderItem.id, OrderItem.order_id).filter(
+            OrderItem.id > last_seen
+        ).order_by(OrderItem.id).limit(batch_size).all()
+        recent_order_ids = {order_id for order_id, in self.db.query(OrderItem.order_id).filter(
+            OrderItem.id > window_start,
+            OrderItem.id <= last_seen
+        ).distinct()}
+
+        order_ids = recent_order_ids | {item.order_id for item in new_items}
+        if order_ids:
+            order_ids -= {order_id for order_id, in self.db.query(CopurchaseOrder.order_id).filter(
+                CopurchaseOrder.order_id.in_(order_ids)
+            )}
+        if not new_items and not order_ids:
+            self.db.rollback()
+            return 0
+
+        rows = self.db.query(OrderItem.id, OrderItem.order_id, OrderItem.product_id).filter(
+            OrderItem.order_id.in_(order_ids)
+        ).all() if order_ids else []
+        products: Dict[int, Set[int]] = {}
+        last_item_ids: Dict[int, int] = {}
+        for item_id, order_id, product_id in rows:
+            products.setdefault(order_id, set()).add(product_id)
+            last_item_ids[order_id] = max(last_item_ids.get(order_id, 0), item_id)
+
+        pair_counts: Counter = Counter()
+        for product_ids in products.values():
+            pair_counts.update(permutations(product_ids, 2))
+
+        self._apply_pair_counts(pair_counts)
+        if last_item_ids:
+            self.db.execute(insert(CopurchaseOrder), [
+                {"order_id": order_id, "last_item_id": item_id} for order_id, item_id in last_item_ids.items()
+            ])
+        if new_items:
+            watermark.value = new_items[-1].id
+        # Orders below the window are never re-read, so they needn't be remembered
+        self.db.query(CopurchaseOrder).filter(
+            CopurchaseOrder.last_item_id <= watermark.value - settings.COPURCHASE_RESCAN_WINDOW
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        late_items = sum(1 for _, order_id, _ in rows if order_id in recent_order_ids)
+        return len(new_items) + late_items
+
+    def _apply_pair_counts(self, pair_counts: Dict[Tuple[int, int], int]):
+        """Add pair counts to the co-purchase table"""
+        if not pair_counts:
+            return
+        existing = {
+            (row.product_id, row.related_product_id): row
+            for row in self.db.query(ProductCopurchase).filter(
+                tuple_(ProductCopurchase.product_id, ProductCopurchase.related_product_id).in_(list(pair_counts))
+            )
+        }
+        for (product_id, related_id), count in pair_counts.items():
+            row = existing.get((product_id, related_id))
+            if row:
+                row.score += count
+            else:
+                self.db.add(ProductCopurchase(product_id=product_id, related_product_id=related_id, score=count))
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.order import Order
+from app.models.payment import Payment
+from app.core.rate_limit import TokenBucket
+from app.payment.registry import get_provider
+from app.services.payment_service import PaymentService
+from app.config import settings
+from app.utils.logger import logger
+
+
+def default_rate_limits() -> Dict[str, TokenBucket]:
+    return {
+        "stripe": TokenBucket(settings.STRIPE_QUERY_RATE_LIMIT),
+        "bkash": TokenBucket(settings.BKASH_QUERY_RATE_LIMIT),
+    }
+
+
+class ReconciliationService:
+    """
+    Service class for settling payments whose webhook never arrived.
+    Stale pending payments are read in keyset pages, queried concurrently
+    under per-provider rate limits, and written back one transaction per page.
+    Successful payments whose order is still pending (settlement failed or
+    the process died before it ran) are settled again.
+    """
+
+    def __init__(self, db: Session, rate_limits: Optional[Dict[str, TokenBucket]] = None):
+        self.db = db
+        self.payment_service = PaymentService(db)
+        self.rate_limits = rate_limits or default_rate_limits()
+
+    def reconcile(self, page_size: int = 200, max_workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Query every stale pending payment once, then retry unsettled orders.
+        Returns counts of checked and changed payments and settled orders.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=settings.RECONCILE_PENDING_AFTER_MINUTES)
+        checked = changed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=max_workers or settings.RECONCILE_WORKERS) as pool:
+            while True:
+                page = self._stale_page(cutoff, last_id, page_size)
+                if not page:
+                    break
+                last_id = page[-1][0]
+
+                # Provider calls run in the pool; the session stays on this thread
+                results = list(pool.map(self._query, page))
+                settled = [
+                    (payment_id, order_id, result)
+                    for (payment_id, order_id, _, _), result in zip(page, results)
+                    if result is not None
+                ]
+                changed += self.payment_service.apply_results(settled, "reconcile")
+                checked += len(page)
+        return {"checked": checked, "changed": changed, "settled": self.settle_unsettled_orders(page_size)}
+
+    def settle_unsettled_orders(self, page_size: int = 200) -> int:
+        """Settle pending orders that already have a successful payment; returns how many were settled"""
+        settled = 0
+        last_id = 0
+        while True:
+            rows = self.db.query(Payment.id, Payment.order_id).join(Order, Order.id == Payment.order_id).filter(
+                Payment.status == "success",
+                Order.status == "pending",
+                Payment.id > last_id
+            ).order_by(Payment.id).limit(page_size).all()
+            self.db.rollback()
+            if not rows:
+                return settled
+            last_id = rows[-1][0]
+            for _, order_id in rows:
+                settled += self.payment_service.settle_order(order_id)
+
+    def _stale_page(self, cutoff: datetime, last_id: int, page_size: int) -> List[Tuple[int, int, str, str]]:
+        rows = self.db.query(Payment.id, Payment.order_id, Payment.provider, Payment.transaction_id).filter(
+            Payment.status == "pending",
+            Payment.created_at < cutoff,
+            Payment.id > last_id
+        ).order_by(Payment.id).limit(page_size).all()
+        self.db.rollback()
+        return [tuple(row) for row in rows]
+
+    def _query(self, row: Tuple[int, int, str, str]) -> Optional[Dict[str, Any]]:
+        """Query one payment under its provider's rate limit; None leaves it pending"""
+        payment_id, _, provider, transaction_id = row
+        bucket = self.rate_limits.get(provider)
+        if bucket:
+            bucket.acquire()
+        try:
+            return get_provider(provider).query_payment(transaction_id)
+        except Exception as e:
+            logger.warning(f"Reconciliation query for payment {payment_id} failed: {str(e)}")
+            return None
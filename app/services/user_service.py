@@ -1,8 +1,11 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from typing import Optional
 from app.models.user import User
 from app.schemas.user import UserCreate
-from app.core.security import get_password_hash, verify_password, create_access_token
+from app.core.security import create_access_token
+from app.core.password_hashing import dummy_verify, hash_password, verify_and_update
+from app.core.principal import invalidate_token_version
 from datetime import timedelta
 from app.config import settings
 
@@ -21,7 +24,7 @@ class UserService:
             raise ValueError("User with this email already exists")
 
         # Create new user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = hash_password(user_data.password)
         new_user = User(
             email=user_data.email,
             password_hash=hashed_password,
@@ -34,12 +37,27 @@ class UserService:
         return new_user
 
     def authenticate_user(self, email: str, password: str) -> Optional[User]:
-        """Authenticate a user and return user object if valid"""
+        """
+        Authenticate a user and return user object if valid.
+        Hashes made at an outdated cost are replaced on a successful login.
+        """
         user = self.db.query(User).filter(User.email == email).first()
         if not user:
+            # Same bcrypt work as a real check, so timing doesn't reveal which emails exist
+            dummy_verify(password)
             return None
-        if not verify_password(password, user.password_hash):
+        valid, new_hash = verify_and_update(password, user.password_hash)
+        if not valid:
             return None
+        if new_hash:
+            # Conditional, so a concurrent password change isn't overwritten
+            self.db.execute(
+                update(User)
+                .where(User.id == user.id, User.password_hash == user.password_hash)
+                .values(password_hash=new_hash)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
         return user
 
     def get_user_by_id(self, user_id: int) -> Optional[User]:
@@ -57,8 +75,24 @@ class UserService:
             return None
         
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        # Requests are authorized from these claims alone, without loading the user
         access_token = create_access_token(
-            data={"sub": user.email, "user_id": user.id},
+            data={"sub": user.email, "user_id": user.id, "is_admin": user.is_admin, "ver": user.token_version},
             expires_delta=access_token_expires
         )
         return access_token
+
+    def revoke_tokens(self, user_id: int):
+        """
+        Invalidate every token issued to a user so far.
+        Must also be called whenever a user's admin status changes, since
+        tokens carry it. Other workers notice within TOKEN_VERSION_CACHE_SECONDS.
+        """
+        self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(token_version=User.token_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        invalidate_token_version(user_id)
@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Optional
+from app.models.webhook import WebhookEvent
+from app.services.payment_service import PaymentService
+from app.config import settings
+from app.utils.logger import logger
+
+
+class WebhookService:
+    """
+    Service class for the webhook inbox.
+    Webhook routes only verify and store events; the webhook workers
+    process them later with retries, so provider bursts and slow upstream
+    calls never tie up API workers.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.payment_service = PaymentService(db)
+
+    def enqueue(
+        self,
+        provider: str,
+        payload: Dict[str, Any],
+        signature: Optional[str] = None,
+        raw_body: Optional[bytes] = None
+    ) -> Optional[WebhookEvent]:
+        """
+        Verify a webhook and store it for processing; raises ValueError if it is invalid.
+        Returns None for a redelivery of an event already in the inbox: the
+        unique (provider, event_id) index rejects it without any other lookup.
+        A redelivered event that hasn't been applied yet (still waiting on a
+        retry, or given up on) is made due again instead.
+        """
+        verified = self.payment_service.verify_webhook(provider, payload, signature, raw_body)
+        event_id = self.payment_service.webhook_event_id(provider, payload)
+        event = WebhookEvent(
+            provider=provider,
+            event_id=event_id,
+            payload=payload,
+            verified=verified,
+            status="pending",
+            next_attempt_at=datetime.now(timezone.utc)
+        )
+        self.db.add(event)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            self._retry_now(provider, event_id)
+            return None
+        self.db.refresh(event)
+        return event
+
+    def _retry_now(self, provider: str, event_id: str):
+        """Make an unapplied event due now; a failed one gets a fresh set of attempts"""
+        self.db.execute(
+            update(WebhookEvent)
+            .where(
+                WebhookEvent.provider == provider,
+                WebhookEvent.event_id == event_id,
+                or_(WebhookEvent.status == "pending", WebhookEvent.status == "failed")
+            )
+            .values(
+                status="pending",
+                attempts=case((WebhookEvent.status == "failed", 0), else_=WebhookEvent.attempts),
+                next_attempt_at=datetime.now(timezone.utc),
+                processed_at=None
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+    def purge_expired(self, batch_size: int = 1000) -> int:
+        """Delete one batch of finished events older than the dedupe window; returns how many"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.WEBHOOK_DEDUPE_TTL_HOURS)
+        expired_ids = [event_id for event_id, in self.db.query(WebhookEvent.id).filter(
+            WebhookEvent.processed_at < cutoff
+        ).limit(batch_size)]
+        if expired_ids:
+            self.db.execute(
+                delete(WebhookEvent)
+                .where(WebhookEvent.id.in_(expired_ids))
+                .execution_options(synchronize_session=False)
+            )
+        self.db.commit()
+        return len(expired_ids)
+
+    def process_due_events(self, batch_size: int = 50) -> int:
+        """Process one batch of due events; returns how many were claimed"""
+        now = datetime.now(timezone.utc)
+        due_ids = [event_id for event_id, in self.db.query(WebhookEvent.id).filter(
+            or_(WebhookEvent.status == "pending", WebhookEvent.status == "processing"),
+            WebhookEvent.next_attempt_at <= now
+        ).order_by(WebhookEvent.next_attempt_at).limit(batch_size)]
+        self.db.rollback()
+
+        claimed = 0
+        for event_id in due_ids:
+            if self._claim(event_id):
+                claimed += 1
+                self._process(event_id)
+        return claimed
+
+    def _claim(self, event_id: int) -> bool:
+        """
+        Conditionally take a due event, so concurrent workers never process it twice.
+        The claim expires after WEBHOOK_PROCESSING_TIMEOUT, so events held by a
+        crashed worker are picked up again.
+        """
+        now = datetime.now(timezone.utc)
+        result = self.db.execute(
+            update(WebhookEvent)
+            .where(
+                WebhookEvent.id == event_id,
+                or_(WebhookEvent.status == "pending", WebhookEvent.status == "processing"),
+                WebhookEvent.next_attempt_at <= now
+            )
+            .values(
+                status="processing",
+                attempts=WebhookEvent.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=settings.WEBHOOK_PROCESSING_TIMEOUT)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return result.rowcount == 1
+
+    def _process(self, event_id: int):
+        event = self.db.query(WebhookEvent).filter(WebhookEvent.id == event_id).first()
+        try:
+            self.payment_service.process_webhook(event.provider, event.payload, trusted=event.verified)
+        except Exception as e:
+            self.db.rollback()
+            self._fail(event_id, str(e))
+            return
+        event.status = "processed"
+        event.last_error = None
+        event.processed_at = datetime.now(timezone.utc)
+        self.db.commit()
+
+    def _fail(self, event_id: int, error: str):
+        """Schedule a retry with exponential backoff, or give up after WEBHOOK_MAX_ATTEMPTS"""
+        event = self.db.query(WebhookEvent).filter(WebhookEvent.id == event_id).first()
+        if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            event.status = "failed"
+            event.processed_at = datetime.now(timezone.utc)
+            logger.error(f"Webhook event {event_id} failed after {event.attempts} attempts: {error}")
+        else:
+            event.status = "pending"
+            delay = settings.WEBHOOK_RETRY_BACKOFF * (2 ** (event.attempts - 1))
+            event.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        event.last_error = error
+        self.db.commit()
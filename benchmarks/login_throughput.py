@@ -0,0 +1,53 @@
+"""
+Measure password verification throughput, the CPU cost that bounds logins.
+
+Verifies run through the same process pool and cost (BCRYPT_ROUNDS) as
+POST /api/auth/login, from as many concurrent callers as the pool allows:
+    python -m benchmarks.login_throughput --logins 200 --max-workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.core import password_hashing
+
+
+def measure(workers: int, logins: int) -> float:
+    """Logins per second with the given number of hashing processes"""
+    settings.PASSWORD_HASH_WORKERS = workers
+    settings.PASSWORD_HASH_MAX_PENDING = max(workers * 2, 1)
+    settings.PASSWORD_HASH_WAIT_SECONDS = 60
+    password_hashing.shutdown_password_hasher()
+    password_hash = password_hashing.hash_password("benchmark-password")  # also warms up the pool
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_MAX_PENDING) as callers:
+        results = list(callers.map(
+            lambda _: password_hashing.verify_and_update("benchmark-password", password_hash)[0], range(logins)
+        ))
+    elapsed = time.perf_counter() - started
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=settings.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+    settings.BCRYPT_ROUNDS = args.rounds
+
+    print(f"bcrypt cost {args.rounds}, {args.logins} logins per run")
+    print(f"{'workers':>8} {'logins/s':>10} {'per core':>10}")
+    try:
+        for workers in range(1, args.max_workers + 1):
+            rate = measure(workers, args.logins)
+            print(f"{workers:>8} {rate:>10.1f} {rate / workers:>10.1f}")
+    finally:
+        password_hashing.shutdown_password_hasher()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from fastapi.testclient import TestClient
 from app.database import Base, get_db
 from app.main import app
 from app.core.security import get_password_hash
+from app.core.category_tree import invalidate_category_snapshot
+from app.core.principal import invalidate_token_version
 from app.models.user import User
 from app.models.category import Category
 from app.models.product import Product
@@ -28,6 +30,9 @@ def db_session():
     finally:
         db.close()
         Base.metadata.drop_all(bind=engine)
+        # Tables are dropped outside the ORM, so reset the category snapshot and token versions
+        invalidate_category_snapshot()
+        invalidate_token_version()
 
 
 @pytest.fixture(scope="function")
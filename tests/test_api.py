@@ -95,3 +95,193 @@ def test_create_order_authenticated(client, test_user, test_product):
     )
     assert response.status_code == 201
     assert response.json()["status"] == "pending"
+
+
+def test_get_products_cursor_pagination(client, test_product, db_session):
+    """Test keyset pagination over the product listing"""
+    from app.models.product import Product
+    for i in range(4):
+        db_session.add(Product(name=f"Product {i}", sku=f"PAGE{i}", price=10, stock=1, status="active"))
+    db_session.commit()
+
+    seen = []
+    response = client.get("/api/products", params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        seen.extend(p["id"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        response = client.get("/api/products", params={"limit": 2, "cursor": cursor})
+
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+    response = client.get("/api/products", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_search_products(client, test_product, db_session):
+    """Test full-text product search ranking and prefix matching"""
+    from app.models.product import Product
+    db_session.add_all([
+        Product(name="Wireless Mouse", sku="MOUSE001", description="Ergonomic mouse", price=20, stock=5, status="active"),
+        Product(name="Mouse Pad", sku="PAD001", description="Pad for any mouse", price=5, stock=5, status="active"),
+        Product(name="Hidden Mouse", sku="MOUSE002", price=20, stock=5, status="inactive"),
+    ])
+    db_session.commit()
+
+    response = client.get("/api/products/search", params={"q": "wireless mou"})
+    assert response.status_code == 200
+    assert [p["sku"] for p in response.json()] == ["MOUSE001"]
+
+    response = client.get("/api/products/search", params={"q": "mouse"})
+    assert {p["sku"] for p in response.json()} == {"MOUSE001", "PAD001"}
+
+    response = client.get("/api/products/search", params={"q": "TEST001"})
+    assert [p["id"] for p in response.json()] == [test_product.id]
+
+    # Updates are reflected in the index
+    test_product.name = "Renamed Gadget"
+    db_session.commit()
+    response = client.get("/api/products/search", params={"q": "gadget"})
+    assert [p["id"] for p in response.json()] == [test_product.id]
+
+
+def test_search_products_postgres_statement():
+    """Test that the Postgres search compiles with the tsquery in a subquery and literal prefix matching"""
+    from sqlalchemy.dialects import postgresql
+    from app.services.product_service import ProductService
+
+    compiled = ProductService._postgres_search_statement("50%_off\\", 5).compile(dialect=postgresql.dialect())
+    sql = " ".join(str(compiled).split())
+    assert "FROM products CROSS JOIN ( SELECT websearch_to_tsquery('english', %(q)s) || " in sql
+    assert ") AS q WHERE" in sql and "@@ q.query" in sql
+    assert "ILIKE %(prefix)s ESCAPE '\\'" in sql
+    assert compiled.params["prefix"] == "50\\%\\_off\\\\%"
+
+
+def test_browse_products_with_filters_and_facets(client, test_product, test_category, db_session):
+    """Test filtering by category subtree and price with facet counts"""
+    from app.models.category import Category
+    from app.models.product import Product
+    phones = Category(name="Phones", parent_id=test_category.id)
+    other = Category(name="Books")
+    db_session.add_all([phones, other])
+    db_session.commit()
+    db_session.add_all([
+        Product(name="Phone A", sku="PA", price=300, stock=5, status="active", category_id=phones.id),
+        Product(name="Phone B", sku="PB", price=20, stock=0, status="active", category_id=phones.id),
+        Product(name="Novel", sku="NV", price=12, stock=3, status="active", category_id=other.id),
+    ])
+    db_session.commit()
+
+    response = client.get("/api/products/browse", params={
+        "category_id": test_category.id, "in_stock": True, "sort": "price_desc"
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert [p["sku"] for p in body["items"]] == ["PA", "TEST001"]
+    categories = {f["category_id"]: f["count"] for f in body["facets"]["categories"]}
+    assert categories == {test_category.id: 1, phones.id: 1, other.id: 1}
+    buckets = {f["min_price"]: f["count"] for f in body["facets"]["price_buckets"] if f["count"]}
+    assert buckets == {"50": 1, "250": 1}
+
+    # Keyset paging follows the requested sort
+    response = client.get("/api/products", params={"sort": "price_asc", "limit": 2})
+    assert [p["sku"] for p in response.json()] == ["NV", "PB"]
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get("/api/products", params={"sort": "price_asc", "limit": 2, "cursor": cursor})
+    assert [p["sku"] for p in response.json()] == ["TEST001", "PA"]
+    response = client.get("/api/products", params={"sort": "name", "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_get_orders_summary_view(client, test_user, test_product):
+    """Test that the summary view returns order headers with an item count"""
+    token = client.post(
+        "/api/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post(
+        "/api/orders",
+        json={"items": [{"product_id": test_product.id, "quantity": 2}, {"product_id": test_product.id, "quantity": 1}]},
+        headers=headers
+    )
+
+    full = client.get("/api/orders", headers=headers).json()
+    assert len(full[0]["order_items"]) == 2
+    summary = client.get("/api/orders", params={"view": "summary"}, headers=headers).json()
+    assert summary[0]["item_count"] == 3
+    assert "order_items" not in summary[0]
+
+
+def test_get_orders_rejects_malformed_cursor(client, test_user):
+    """Test that well-formed JSON cursors of the wrong shape are rejected with 400"""
+    from app.core.pagination import encode_cursor
+
+    token = client.post(
+        "/api/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for cursor in (encode_cursor([1]), encode_cursor(None), encode_cursor("abc")):
+        response = client.get("/api/orders", params={"cursor": cursor}, headers=headers)
+        assert response.status_code == 400
+
+
+def test_create_order_idempotency_key(client, test_user, test_product, db_session):
+    """Test that retries with the same Idempotency-Key replay the first response"""
+    from app.models.order import Order
+    token = client.post(
+        "/api/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "order-retry-1"}
+    body = {"items": [{"product_id": test_product.id, "quantity": 1}]}
+
+    first = client.post("/api/orders", json=body, headers=headers)
+    retry = client.post("/api/orders", json=body, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.content == first.content
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert db_session.query(Order).count() == 1
+
+    # Reusing the key for a different request is rejected
+    body["items"][0]["quantity"] = 2
+    assert client.post("/api/orders", json=body, headers=headers).status_code == 422
+
+
+def test_authenticated_requests_use_token_claims(client, db_session, test_user):
+    """Test that requests are authorized from claims, and bumping the token version revokes them"""
+    from sqlalchemy import event
+    from app.core.security import create_access_token
+    from app.services.user_service import UserService
+    from tests.conftest import engine
+
+    token = client.post(
+        "/api/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/orders", headers=headers).status_code == 200
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert client.get("/api/orders", headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert not [statement for statement in statements if "FROM users" in statement]
+
+    # /me still returns the full user
+    assert client.get("/api/auth/me", headers=headers).json()["name"] == "Test User"
+
+    # Tokens issued before the claims existed are still accepted
+    legacy = create_access_token({"sub": test_user.email, "user_id": test_user.id})
+    assert client.get("/api/orders", headers={"Authorization": f"Bearer {legacy}"}).status_code == 200
+
+    UserService(db_session).revoke_tokens(test_user.id)
+    assert client.get("/api/orders", headers=headers).status_code == 401
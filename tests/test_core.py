@@ -0,0 +1,40 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+def test_invalidate_tags_unlinks_members():
+    """Test that tag invalidation unlinks tagged keys without scanning the keyspace"""
+    from app.core import cache
+
+    tag_pipe = MagicMock()
+    tag_pipe.execute.return_value = [{"product_recommendations:1"}, {"product_recommendations:2"}, 2]
+    unlink_pipe = MagicMock()
+    client = MagicMock()
+    client.pipeline.side_effect = [tag_pipe, unlink_pipe]
+
+    with patch.object(cache, "redis_client", client):
+        assert cache.invalidate_tags("category:1", "category:2") is True
+
+    tag_pipe.unlink.assert_called_once_with("tag:category:1", "tag:category:2")
+    unlinked = set(unlink_pipe.unlink.call_args[0])
+    assert unlinked == {"product_recommendations:1", "product_recommendations:2"}
+    client.keys.assert_not_called()
+
+
+def test_money_integer_cents():
+    """Test that money math stays exact in integer cents"""
+    from decimal import Decimal
+    from app.core.money import Money
+    from app.core.algorithms import calculate_subtotal, calculate_subtotals
+
+    price = Money.from_decimal(Decimal("19.99"))
+    assert price.cents == 1999
+    assert str(price * 3) == "59.97"
+    assert calculate_subtotal(3, Decimal("19.99")) == Decimal("59.97")
+    assert Money.sum(calculate_subtotals([1, 2], [price, Money(5)])) == Money(2009)
+
+    # 0.1 * 3 in floats is 0.30000000000000004; in cents it is exact
+    assert Money.sum([Money.from_decimal("0.10")] * 3).to_decimal() == Decimal("0.30")
+
+    # Stripe amounts no longer truncate through a float (int(4.35 * 100) == 434)
+    assert Money.from_decimal(Decimal("4.35")).cents == 435
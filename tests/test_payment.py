@@ -0,0 +1,525 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+def test_payment_service_shares_providers(db_session):
+    """Test that payment providers are built once and shared by every request"""
+    from app.services.payment_service import PaymentService
+
+    first = PaymentService(db_session)._get_provider("bkash")
+    second = PaymentService(db_session)._get_provider("BKASH")
+    assert first is second
+    with pytest.raises(ValueError):
+        PaymentService(db_session)._get_provider("paypal")
+
+
+def test_bkash_token_shared_across_workers():
+    """Test that one worker's grant token is reused by the others through Redis"""
+    from app.payment import bkash_provider
+
+    store = {}
+    client = MagicMock()
+    client.get.side_effect = store.get
+
+    def set_value(key, value, nx=False, ex=None):
+        if nx and key in store:
+            return None
+        store[key] = value
+        return True
+
+    client.set.side_effect = set_value
+
+    def release(script, numkeys, key, token):
+        if store.get(key) != token:
+            return 0
+        del store[key]
+        return 1
+
+    client.eval.side_effect = release
+
+    grant = MagicMock()
+    grant.status_code = 200
+    grant.json.return_value = {"id_token": "token-1", "expires_in": 3600}
+
+    with patch.object(bkash_provider, "redis_client", client), \
+            patch.object(bkash_provider.requests.Session, "request", return_value=grant) as post:
+        worker_a = bkash_provider.BkashPaymentStrategy()
+        worker_b = bkash_provider.BkashPaymentStrategy()
+        assert worker_a._get_token() == "token-1"
+        assert worker_a._get_token() == "token-1"
+        assert worker_b._get_token() == "token-1"
+
+    assert post.call_count == 1
+    assert bkash_provider.TOKEN_LOCK_KEY not in store
+
+
+def test_bkash_token_lock_and_corrupt_shared_token():
+    """Test that a worker only releases its own grant lock, and a corrupt shared token is a cache miss"""
+    from app.payment import bkash_provider
+
+    store = {bkash_provider.TOKEN_CACHE_KEY: "{not json"}
+    client = MagicMock()
+    client.get.side_effect = store.get
+
+    def set_value(key, value, nx=False, ex=None):
+        store[key] = value
+        return True
+
+    client.set.side_effect = set_value
+
+    grant = MagicMock()
+    grant.status_code = 200
+    grant.json.return_value = {"id_token": "token-1", "expires_in": 3600}
+
+    def grant_after_lock_expired(*args, **kwargs):
+        # Our lock timed out mid-grant and another worker took it
+        store[bkash_provider.TOKEN_LOCK_KEY] = "other-worker"
+        return grant
+
+    with patch.object(bkash_provider, "redis_client", client), \
+            patch.object(bkash_provider.requests.Session, "request", side_effect=grant_after_lock_expired):
+        provider = bkash_provider.BkashPaymentStrategy()
+        assert provider._read_shared_token() is None
+        assert provider._get_token() == "token-1"
+
+    script, numkeys, key, token = client.eval.call_args.args
+    assert key == bkash_provider.TOKEN_LOCK_KEY and token != "other-worker"
+    assert "redis.call('GET', KEYS[1]) == ARGV[1]" in script
+    assert not client.delete.called
+
+
+@pytest.fixture
+def stub_server():
+    """Local HTTP stub that answers with a queue of (delay, status) responses"""
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    responses = []
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            requests_seen.append(self.client_address)
+            delay, status = responses.pop(0) if responses else (0, 200)
+            time.sleep(delay)
+            body = json.dumps({"statusCode": "0000"}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", responses, requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_provider_http_client_retries_and_timeouts(stub_server, monkeypatch):
+    """Test keep-alive pooling, retries on idempotent calls only, and read timeouts"""
+    import requests
+    from app.config import settings
+    from app.payment.http import ProviderHTTPClient, latency_stats
+
+    url, responses, requests_seen = stub_server
+    monkeypatch.setattr(settings, "PAYMENT_HTTP_READ_TIMEOUT", 0.5)
+    monkeypatch.setattr(settings, "PAYMENT_HTTP_RETRY_BACKOFF", 0.01)
+    client = ProviderHTTPClient("stub")
+
+    # Idempotent calls retry through a transient 503
+    responses.extend([(0, 503), (0, 200)])
+    assert client.post(url, json={}, idempotent=True).status_code == 200
+    # Non-idempotent calls never repeat
+    responses.append((0, 503))
+    assert client.post(url, json={}).status_code == 503
+    # Every request reused one keep-alive connection
+    assert len(requests_seen) == 3
+    assert len(set(requests_seen)) == 1
+
+    # A slow upstream can't hold the caller past the read timeout
+    responses.append((1.0, 200))
+    with pytest.raises(requests.Timeout):
+        client.post(url, json={})
+    client.close()
+
+    stats = latency_stats("stub").snapshot()
+    assert (stats["calls"], stats["errors"], stats["retries"]) == (4, 1, 1)
+    assert stats["p50_ms"] is not None
+
+
+def test_token_bucket_limits_rate():
+    """Test that the token bucket allows a burst and then paces callers"""
+    import time
+    from app.core.rate_limit import TokenBucket
+
+    bucket = TokenBucket(rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(10):
+        bucket.acquire()
+    # 5 from the burst, the other 5 at 50/s
+    assert time.monotonic() - started >= 0.08
+
+
+def test_reconciliation_settles_stale_pending_payments(db_session, test_user, test_product):
+    """Test that stale pending payments are queried concurrently and settled in batches"""
+    from datetime import datetime, timedelta, timezone
+    from app.models.payment import Payment
+    from app.services.order_service import OrderService
+    from app.payment.resilience import ProviderRequestError
+    from app.services.reconciliation_service import ReconciliationService
+    from app.schemas.order import OrderCreate, OrderItemCreate
+
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+    order_service = OrderService(db_session)
+    outcomes = {"trx_paid": "success", "trx_failed": "failed", "trx_unreachable": None, "trx_fresh": "success"}
+    for transaction_id in outcomes:
+        order = order_service.create_order(
+            test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)])
+        )
+        db_session.add(Payment(
+            order_id=order.id, provider="bkash", transaction_id=transaction_id, status="pending",
+            created_at=datetime.now(timezone.utc) if transaction_id == "trx_fresh" else old
+        ))
+    db_session.commit()
+
+    def query(transaction_id):
+        status = outcomes[transaction_id]
+        if status is None:
+            raise ProviderRequestError("bKash payment query failed: Connection refused")
+        return {"status": status, "raw_response": {"paymentID": transaction_id}}
+
+    provider = MagicMock()
+    provider.query_payment.side_effect = query
+    with patch("app.services.reconciliation_service.get_provider", return_value=provider):
+        counts = ReconciliationService(db_session).reconcile(page_size=2, max_workers=4)
+
+    assert counts == {"checked": 3, "changed": 2, "settled": 0}
+    statuses = dict(db_session.query(Payment.transaction_id, Payment.status).all())
+    assert statuses == {"trx_paid": "success", "trx_failed": "failed", "trx_unreachable": "pending", "trx_fresh": "pending"}
+    paid_order = db_session.query(Payment).filter(Payment.transaction_id == "trx_paid").one().order
+    assert paid_order.status == "paid"
+
+
+def test_failed_order_settlement_is_retried(db_session, test_user, test_product):
+    """Test that a successful payment whose order settlement failed is settled again later"""
+    from app.models.payment import Payment
+    from app.services.order_service import OrderService
+    from app.services.payment_service import PaymentService
+    from app.services.reconciliation_service import ReconciliationService
+    from app.schemas.order import OrderCreate, OrderItemCreate
+
+    order_service = OrderService(db_session)
+    orders = [
+        order_service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)]))
+        for _ in range(2)
+    ]
+    payments = [
+        Payment(order_id=order.id, provider="bkash", transaction_id=f"trx_settle_{order.id}", status="pending")
+        for order in orders
+    ]
+    db_session.add_all(payments)
+    db_session.commit()
+    results = [(payment.id, payment.order_id, {"status": "success", "raw_response": {}}) for payment in payments]
+
+    payment_service = PaymentService(db_session)
+    with patch.object(payment_service.order_service, "mark_order_as_paid", side_effect=RuntimeError("crashed")):
+        assert payment_service.apply_results(results + [(payments[0].id, orders[0].id, {"status": "refunded"})]) == 2
+    db_session.expire_all()
+    assert [payment.status for payment in payments] == ["success", "success"]
+    assert [order.status for order in orders] == ["pending", "pending"]
+
+    # A redelivered success settles the order even though the payment doesn't change
+    assert payment_service.apply_results(results[:1]) == 0
+    # Reconciliation picks up the rest
+    with patch("app.services.reconciliation_service.get_provider"):
+        assert ReconciliationService(db_session).reconcile()["settled"] == 1
+    db_session.expire_all()
+    assert [order.status for order in orders] == ["paid", "paid"]
+
+
+def test_circuit_breaker_fails_fast_and_recovers(monkeypatch):
+    """Test closed -> open -> half-open -> closed through the provider base class"""
+    from app.config import settings
+    from app.payment.base import PaymentProvider
+    from app.payment.resilience import ProviderUnavailableError, resilience_snapshot
+
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_OPEN_SECONDS", 0)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_HALF_OPEN_CALLS", 2)
+
+    class FlakyProvider(PaymentProvider):
+        name = "flaky-test"
+        create_payment_intent = confirm_payment = query_payment = None
+
+    provider = FlakyProvider()
+    upstream = MagicMock(side_effect=[ConnectionError(), ConnectionError(), "ok", ConnectionError()])
+    for _ in range(4):
+        try:
+            provider._call_upstream(upstream)
+        except ConnectionError:
+            pass
+    assert resilience_snapshot()["flaky-test"]["state"] == "open"
+
+    # While open, calls are refused without reaching the provider
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_OPEN_SECONDS", 60)
+    with pytest.raises(ProviderUnavailableError):
+        provider._call_upstream(upstream)
+    assert upstream.call_count == 4
+
+    # After the open period, a few healthy trial calls close it again
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_OPEN_SECONDS", 0)
+    healthy = MagicMock(return_value="ok")
+    assert provider._call_upstream(healthy) == "ok"
+    assert resilience_snapshot()["flaky-test"]["state"] == "half_open"
+    assert provider._call_upstream(healthy) == "ok"
+    assert resilience_snapshot()["flaky-test"] == {
+        "state": "closed", "window_calls": 0, "window_failures": 0, "window_slow_calls": 0, "in_flight": 0
+    }
+
+
+def test_bulkhead_caps_concurrent_calls(monkeypatch):
+    """Test that calls beyond the per-provider concurrency cap are refused"""
+    import threading
+    from app.config import settings
+    from app.payment.base import PaymentProvider
+    from app.payment.resilience import ProviderUnavailableError
+
+    monkeypatch.setattr(settings, "PAYMENT_PROVIDER_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "PAYMENT_BULKHEAD_WAIT_SECONDS", 0.05)
+
+    class SlowProvider(PaymentProvider):
+        name = "slow-test"
+        create_payment_intent = confirm_payment = query_payment = None
+
+    provider = SlowProvider()
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_call():
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=provider._call_upstream, args=(slow_call,))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(ProviderUnavailableError):
+        provider._call_upstream(lambda: "ok")
+    release.set()
+    worker.join()
+    assert provider._call_upstream(lambda: "ok") == "ok"
+
+
+@pytest.fixture
+def instant_simulator(monkeypatch):
+    """Simulator settings with no latency, outages, declines or settle time"""
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "PAYMENT_SIMULATOR_LATENCY_MS", 0)
+    monkeypatch.setattr(settings, "PAYMENT_SIMULATOR_ERROR_RATE", 0)
+    monkeypatch.setattr(settings, "PAYMENT_SIMULATOR_DECLINE_RATE", 0)
+    monkeypatch.setattr(settings, "PAYMENT_SIMULATOR_SETTLE_SECONDS", 0)
+    monkeypatch.setattr(settings, "PAYMENT_SIMULATOR_WEBHOOK_DELAY_SECONDS", 0)
+    return settings
+
+
+def test_simulated_providers_follow_provider_semantics(instant_simulator, monkeypatch):
+    """Test simulated Stripe/bKash create, execute and query, declines and outages"""
+    from app.core.money import Money
+    from app.payment.resilience import ProviderRequestError
+    from app.payment.simulator import PaymentSimulator, SimulatedPaymentProvider
+
+    simulator = PaymentSimulator(seed=1)
+    stripe_sim = SimulatedPaymentProvider("stripe", simulator)
+    bkash_sim = SimulatedPaymentProvider("bkash", simulator)
+
+    intent = stripe_sim.create_payment_intent(1, Money(1999))
+    assert intent["client_secret"] and intent["raw_response"]["amount"] == 1999
+    assert stripe_sim.query_payment(intent["transaction_id"])["status"] == "success"
+
+    checkout = bkash_sim.create_payment_intent(2, Money(1999))
+    assert checkout["raw_response"]["amount"] == "19.99"
+    # bKash payments stay pending until executed
+    assert bkash_sim.query_payment(checkout["transaction_id"])["status"] == "pending"
+    assert bkash_sim.confirm_payment(checkout["transaction_id"])["status"] == "success"
+    assert bkash_sim.query_payment(checkout["transaction_id"])["status"] == "success"
+
+    monkeypatch.setattr(instant_simulator, "PAYMENT_SIMULATOR_DECLINE_RATE", 1)
+    declined = bkash_sim.create_payment_intent(3, Money(500))
+    assert bkash_sim.confirm_payment(declined["transaction_id"])["status"] == "failed"
+
+    monkeypatch.setattr(instant_simulator, "PAYMENT_SIMULATOR_ERROR_RATE", 1)
+    with pytest.raises(ValueError):
+        stripe_sim.create_payment_intent(4, Money(500))
+    with pytest.raises(ProviderRequestError):
+        stripe_sim.query_payment(intent["transaction_id"])
+
+
+def test_simulated_stripe_webhooks_are_verified(instant_simulator, client, db_session, test_user, test_product, monkeypatch):
+    """Test that simulator-signed Stripe webhooks take the verified path and skip the provider query"""
+    from app.core.money import Money
+    from app.models.payment import Payment
+    from app.payment import registry
+    from app.payment.simulator import PaymentSimulator, SimulatedPaymentProvider
+    from app.services.order_service import OrderService
+    from app.services.webhook_service import WebhookService
+    from app.schemas.order import OrderCreate, OrderItemCreate
+
+    monkeypatch.setattr(instant_simulator, "STRIPE_WEBHOOK_SECRET", "whsec_sim")
+    order = OrderService(db_session).create_order(
+        test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)])
+    )
+    simulator = PaymentSimulator(seed=1)
+    stripe_sim = SimulatedPaymentProvider("stripe", simulator)
+    intent = stripe_sim.create_payment_intent(order.id, Money(1999))
+    db_session.add(Payment(order_id=order.id, provider="stripe", transaction_id=intent["transaction_id"], status="pending"))
+    db_session.commit()
+
+    simulator._session = MagicMock()
+    simulator._deliver("stripe", intent["transaction_id"])
+    post = simulator._session.post
+    body, headers = post.call_args.kwargs["data"], post.call_args.kwargs["headers"]
+
+    with patch.dict(registry._providers, {"stripe": stripe_sim}):
+        forged = {**headers, "Stripe-Signature": headers["Stripe-Signature"].replace("v1=", "v1=0")}
+        assert client.post("/api/webhooks/stripe", content=body, headers=forged).status_code == 400
+        assert client.post("/api/webhooks/stripe", content=body, headers=headers).status_code == 202
+        with patch.object(stripe_sim, "query_payment") as query:
+            assert WebhookService(db_session).process_due_events() == 1
+    query.assert_not_called()
+    db_session.expire_all()
+    assert db_session.query(Payment).filter(Payment.order_id == order.id).one().status == "success"
+
+
+def test_simulator_delivers_webhooks(instant_simulator, stub_server):
+    """Test that settled payments are announced to the webhook URL"""
+    import time
+    from app.core.money import Money
+    from app.payment.simulator import PaymentSimulator
+
+    url, _, requests_seen = stub_server
+    simulator = PaymentSimulator(webhook_url=url, seed=1)
+    simulator.start()
+    try:
+        created = simulator.create("stripe", 1, Money(1000))
+        deadline = time.monotonic() + 5
+        while not requests_seen and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        simulator.stop()
+
+    assert len(requests_seen) == 1
+    event = simulator.webhook_payload(created["id"])
+    assert event["type"] == "payment_intent.succeeded"
+    assert event["data"]["object"]["id"] == created["id"]
+
+
+def test_real_providers_against_stub_server(instant_simulator):
+    """Test the real Stripe and bKash clients end to end against the local HTTP stub"""
+    import stripe
+    from app.core.money import Money
+    from app.payment.bkash_provider import BkashPaymentStrategy
+    from app.payment.simulator import PaymentSimulator
+    from app.payment.stripe_provider import StripePaymentStrategy
+    from app.payment.stub_server import ProviderStubServer
+
+    server = ProviderStubServer(PaymentSimulator(seed=1))
+    server.start()
+    api_key, api_base = stripe.api_key, stripe.api_base
+    try:
+        bkash = BkashPaymentStrategy(base_url=server.url)
+        checkout = bkash.create_payment_intent(7, Money(2500))
+        assert checkout["payment_url"].startswith(server.url)
+        assert bkash.query_payment(checkout["transaction_id"])["status"] == "pending"
+        assert bkash.confirm_payment(checkout["transaction_id"])["status"] == "success"
+        assert bkash.query_payment("unknown")["status"] == "failed"
+
+        stripe_client = StripePaymentStrategy(api_key="sk_test_stub", api_base=server.url)
+        intent = stripe_client.create_payment_intent(8, Money(2500))
+        assert intent["raw_response"]["metadata"] == {"order_id": "8"}
+        assert stripe_client.confirm_payment(intent["transaction_id"])["status"] == "success"
+    finally:
+        stripe.api_key, stripe.api_base = api_key, api_base
+        server.stop()
+
+
+def test_payment_events_keep_compressed_history(client, db_session, test_user, test_admin, test_product):
+    """Test that provider payloads are appended to payment_events and shown to admins only"""
+    from app.models.payment import PaymentEvent
+    from app.services.order_service import OrderService
+    from app.services.payment_service import PaymentService
+    from app.schemas.order import OrderCreate, OrderItemCreate
+
+    order = OrderService(db_session).create_order(
+        test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)])
+    )
+    provider = MagicMock()
+    provider.create_payment_intent.return_value = {"transaction_id": "pi_history", "raw_response": {"id": "pi_history"}}
+    provider.query_payment.side_effect = [
+        {"status": "pending", "raw_response": {"id": "pi_history", "status": "processing"}},
+        {"status": "success", "raw_response": {"id": "pi_history", "status": "succeeded"}},
+    ]
+    payment_service = PaymentService(db_session)
+    with patch("app.services.payment_service.get_provider", return_value=provider):
+        payment_id = payment_service.initiate_payment(order.id, "stripe")["payment_id"]
+        payment_service.query_payment("pi_history", "stripe")
+        payment_service.query_payment("pi_history", "stripe")
+
+    stored = db_session.query(PaymentEvent).filter(PaymentEvent.payment_id == payment_id).first()
+    assert stored.payload_zlib != b'{"id":"pi_history"}'
+
+    def token(email, password):
+        return client.post("/api/auth/login", json={"email": email, "password": password}).json()["access_token"]
+
+    user_headers = {"Authorization": f"Bearer {token('test@example.com', 'testpassword')}"}
+    admin_headers = {"Authorization": f"Bearer {token('admin@test.com', 'adminpassword')}"}
+
+    payment = client.get(f"/api/payments/{payment_id}", headers=user_headers).json()
+    assert payment["status"] == "success" and "raw_response" not in payment
+    assert client.get(f"/api/payments/{payment_id}/events", headers=user_headers).status_code == 403
+
+    events = client.get(f"/api/payments/{payment_id}/events", headers=admin_headers).json()
+    assert [(event["source"], event["status"]) for event in events] == [
+        ("create", "pending"), ("query", "pending"), ("query", "success")
+    ]
+    assert events[-1]["payload"] == {"id": "pi_history", "status": "succeeded"}
+
+
+def test_bkash_token_refresher_survives_open_breaker(monkeypatch):
+    """Test that the background token refresher keeps running while the breaker refuses calls"""
+    import time
+    from app.config import settings
+    from app.payment import bkash_provider
+    from app.payment.resilience import breaker_for
+
+    monkeypatch.setattr(bkash_provider, "TOKEN_REFRESH_CHECK_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_OPEN_SECONDS", 60)
+    provider = bkash_provider.BkashPaymentStrategy()
+    provider.name = "bkash-refresh-test"
+    provider.app_key = "app-key"
+    breaker = breaker_for(provider.name)
+    breaker._open(time.monotonic())
+
+    with patch.object(provider, "_read_shared_token", return_value=None), \
+            patch.object(bkash_provider, "redis_client") as client, \
+            patch.object(provider, "_refresh_token", wraps=provider._refresh_token) as refresh:
+        client.set.return_value = True
+        provider.start()
+        try:
+            deadline = time.monotonic() + 5
+            while refresh.call_count < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert refresh.call_count >= 3
+            assert provider._refresher.is_alive()
+        finally:
+            provider.stop()
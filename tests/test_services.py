@@ -29,6 +29,46 @@ def test_user_service_authenticate(db_session, test_user):
     assert user.email == "test@example.com"
 
 
+def test_user_service_rehashes_outdated_cost_on_login(db_session, test_user, monkeypatch):
+    """Test that a login upgrades a hash made at another bcrypt cost, and unknown emails still verify"""
+    from unittest.mock import patch
+    from app.config import settings
+    from app.core import password_hashing
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    user_service = UserService(db_session)
+    old_hash = test_user.password_hash
+    assert user_service.authenticate_user("test@example.com", "testpassword") is not None
+    db_session.refresh(test_user)
+    assert test_user.password_hash != old_hash and test_user.password_hash.startswith("$2b$04$")
+
+    # Already at the configured cost: nothing is rewritten
+    current_hash = test_user.password_hash
+    assert user_service.authenticate_user("test@example.com", "testpassword") is not None
+    db_session.refresh(test_user)
+    assert test_user.password_hash == current_hash
+
+    with patch.object(password_hashing, "_run", wraps=password_hashing._run) as run:
+        assert user_service.authenticate_user("nobody@example.com", "testpassword") is None
+    assert run.call_args.args[0] is password_hashing._verify_and_update
+
+
+def test_password_hashing_recovers_from_dead_worker(monkeypatch):
+    """Test that a killed hashing process is replaced instead of failing every later sign-in"""
+    from app.config import settings
+    from app.core import password_hashing
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    assert password_hashing.hash_password("before").startswith("$2b$04$")
+    pool, _ = password_hashing._get_pool()
+    for process in list(pool._processes.values()):
+        process.kill()
+        process.join()
+
+    assert password_hashing.hash_password("after").startswith("$2b$04$")
+    assert password_hashing._get_pool()[0] is not pool
+
+
 def test_product_service_create_product(db_session, test_category):
     """Test ProductService create_product"""
     service = ProductService(db_session)
@@ -75,3 +115,460 @@ def test_order_service_calculate_total_deterministic(db_session, test_user, test
     # Totals should be the same (deterministic)
     assert total1 == total2
     assert float(total1) == float(total2)
+
+
+def test_category_service_subtree_uses_closure(db_session):
+    """Test that category subtrees include every depth and follow moves"""
+    from app.models.category import Category
+    from app.services.category_service import CategoryService
+
+    root = Category(name="Root")
+    db_session.add(root)
+    db_session.flush()
+    child = Category(name="Child", parent_id=root.id)
+    other = Category(name="Other")
+    db_session.add_all([child, other])
+    db_session.flush()
+    grandchild = Category(name="Grandchild", parent_id=child.id)
+    db_session.add(grandchild)
+    db_session.commit()
+
+    service = CategoryService(db_session)
+    assert [c.id for c in service.get_category_tree(root.id)] == [root.id, child.id, grandchild.id]
+
+    # Moving a category re-hangs its whole subtree
+    child.parent_id = other.id
+    db_session.commit()
+    assert [c.id for c in service.get_category_tree(root.id)] == [root.id]
+    assert [c.id for c in service.get_category_tree(other.id)] == [other.id, child.id, grandchild.id]
+
+
+def test_category_service_related_products_in_subtree(db_session, test_category, test_product):
+    """Test that related products are found in descendant categories"""
+    from app.models.category import Category
+    from app.models.product import Product
+    from app.services.category_service import CategoryService
+
+    sub = Category(name="Phones", parent_id=test_category.id)
+    db_session.add(sub)
+    db_session.flush()
+    deep = Category(name="Android", parent_id=sub.id)
+    db_session.add(deep)
+    db_session.flush()
+    related = Product(name="Phone", sku="PHONE001", price=10, stock=5, status="active", category_id=deep.id)
+    db_session.add(related)
+    db_session.commit()
+
+    service = CategoryService(db_session)
+    products = service.get_related_products(test_product.id)
+    assert [p.id for p in products] == [related.id]
+
+
+def test_category_snapshot_subtree_ids(db_session, test_category):
+    """Test that the category snapshot follows committed hierarchy changes"""
+    from app.models.category import Category
+    from app.services.category_service import CategoryService
+
+    service = CategoryService(db_session)
+    assert service.get_subtree_ids(test_category.id) == [test_category.id]
+
+    child = Category(name="Laptops", parent_id=test_category.id)
+    db_session.add(child)
+    db_session.commit()
+    grandchild = Category(name="Gaming", parent_id=child.id)
+    db_session.add(grandchild)
+    db_session.commit()
+
+    assert service.get_subtree_ids(test_category.id) == [test_category.id, child.id, grandchild.id]
+    assert service.get_subtree_ids(child.id) == [child.id, grandchild.id]
+    assert service.get_subtree_ids(9999) == []
+
+
+def test_recommendation_service_copurchase_index(db_session, test_user, test_product):
+    """Test that the co-purchase index is built incrementally and ranks by count"""
+    from app.models.product import Product
+    from app.services.recommendation_service import RecommendationService
+
+    cable = Product(name="Cable", sku="CABLE001", price=5, stock=100, status="active")
+    case = Product(name="Case", sku="CASE001", price=15, stock=100, status="active")
+    db_session.add_all([cable, case])
+    db_session.commit()
+
+    order_service = OrderService(db_session)
+    service = RecommendationService(db_session)
+
+    def order(*products):
+        order_service.create_order(test_user.id, OrderCreate(
+            items=[OrderItemCreate(product_id=p.id, quantity=1) for p in products]
+        ))
+
+    order(test_product, cable, test_product)
+    assert service.update_copurchase_index(batch_size=2) == 2
+    order(test_product, case)
+    order(test_product, cable)
+    while service.update_copurchase_index(batch_size=2):
+        pass
+
+    recommended = service.get_recommendations(test_product.id)
+    assert [p.id for p in recommended] == [cable.id, case.id]
+    assert [p.id for p in service.get_recommendations(case.id)] == [test_product.id]
+
+
+def test_recommendation_service_copurchase_late_commit(db_session, test_user, test_product):
+    """Test that items committed below the high-water mark are counted once they appear, and only once"""
+    from sqlalchemy import delete, insert
+    from app.models.order import OrderItem
+    from app.models.product import Product
+    from app.models.recommendation import ProductCopurchase
+    from app.services.recommendation_service import RecommendationService
+
+    cable = Product(name="Cable", sku="CABLE001", price=5, stock=100, status="active")
+    case = Product(name="Case", sku="CASE001", price=15, stock=100, status="active")
+    db_session.add_all([cable, case])
+    db_session.commit()
+
+    order_service = OrderService(db_session)
+    service = RecommendationService(db_session)
+    orders = [
+        order_service.create_order(test_user.id, OrderCreate(
+            items=[OrderItemCreate(product_id=p.id, quantity=1) for p in products]
+        ))
+        for products in ((test_product, cable), (test_product, case), (cable, case))
+    ]
+
+    # The middle order's transaction hasn't committed when the job runs
+    late_items = [
+        {"id": item.id, "order_id": item.order_id, "product_id": item.product_id,
+         "quantity": item.quantity, "price": item.price, "subtotal": item.subtotal}
+        for item in orders[1].order_items
+    ]
+    db_session.execute(delete(OrderItem).where(OrderItem.order_id == orders[1].id))
+    db_session.commit()
+    while service.update_copurchase_index():
+        pass
+
+    db_session.execute(insert(OrderItem), late_items)
+    db_session.commit()
+    for _ in range(3):
+        service.update_copurchase_index()
+
+    scores = {(row.product_id, row.related_product_id): row.score for row in db_session.query(ProductCopurchase)}
+    assert scores == {
+        (test_product.id, cable.id): 1, (cable.id, test_product.id): 1,
+        (test_product.id, case.id): 1, (case.id, test_product.id): 1,
+        (cable.id, case.id): 1, (case.id, cable.id): 1,
+    }
+
+
+def test_order_service_create_order_constant_statements(db_session, test_user, test_category):
+    """Test that order creation issues the same number of statements for any cart size"""
+    from sqlalchemy import event
+    from app.models.product import Product
+
+    products = [
+        Product(name=f"Bulk {i}", sku=f"BULK{i:03d}", price=Decimal("1.25"), stock=10, status="active")
+        for i in range(50)
+    ]
+    db_session.add_all(products)
+    db_session.commit()
+    product_ids = [p.id for p in products]
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    service = OrderService(db_session)
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=product_ids[0], quantity=1)]))
+        small_cart = len(statements)
+        statements.clear()
+        order = service.create_order(test_user.id, OrderCreate(
+            items=[OrderItemCreate(product_id=pid, quantity=2) for pid in product_ids]
+        ))
+        large_cart = len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert large_cart == small_cart
+    assert order.total_amount == Decimal("125.00")
+    assert len(order.order_items) == 50
+
+
+def test_order_service_rejects_cart_exceeding_stock(db_session, test_user, test_product):
+    """Test that repeated lines for one product are checked against stock together"""
+    service = OrderService(db_session)
+    order_data = OrderCreate(items=[
+        OrderItemCreate(product_id=test_product.id, quantity=60),
+        OrderItemCreate(product_id=test_product.id, quantity=60)
+    ])
+    with pytest.raises(ValueError):
+        service.create_order(test_user.id, order_data)
+
+
+def test_order_service_mark_paid_rolls_back_all_stock(db_session, test_user, test_product):
+    """Test that a shortfall on one item leaves every product's stock untouched"""
+    from app.models.product import Product
+
+    scarce = Product(name="Scarce", sku="SCARCE001", price=Decimal("5.00"), stock=3, status="active")
+    db_session.add(scarce)
+    db_session.commit()
+
+    service = OrderService(db_session)
+    order = service.create_order(test_user.id, OrderCreate(items=[
+        OrderItemCreate(product_id=test_product.id, quantity=2),
+        OrderItemCreate(product_id=scarce.id, quantity=3)
+    ]))
+    scarce.stock = 1
+    db_session.commit()
+
+    with pytest.raises(ValueError):
+        service.mark_order_as_paid(order.id)
+
+    db_session.expire_all()
+    assert test_product.stock == 100
+    assert scarce.stock == 1
+    assert service.get_order_by_id(order.id).status == "pending"
+
+    scarce.stock = 3
+    db_session.commit()
+    service.mark_order_as_paid(order.id)
+    db_session.expire_all()
+    assert test_product.stock == 98
+    assert scarce.stock == 0
+
+
+def test_inventory_reservations_lifecycle(db_session, test_user, test_product):
+    """Test that pending orders hold stock until paid, canceled or expired"""
+    from datetime import datetime, timedelta, timezone
+    from app.models.reservation import StockReservation
+    from app.services.inventory_service import InventoryService
+
+    service = OrderService(db_session)
+    test_product.stock = 5
+    db_session.commit()
+
+    paid = service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=2)]))
+    canceled = service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=2)]))
+    expired = service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)]))
+    db_session.expire_all()
+    assert test_product.available_stock == 0
+
+    # Every unit is held, so another pending order can't take them
+    with pytest.raises(ValueError):
+        service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)]))
+
+    service.mark_order_as_paid(paid.id)
+    service.cancel_order(canceled.id, test_user.id)
+    db_session.expire_all()
+    assert (test_product.stock, test_product.reserved_stock) == (3, 1)
+
+    db_session.query(StockReservation).filter(StockReservation.order_id == expired.id).update(
+        {"expires_at": datetime.now(timezone.utc) - timedelta(minutes=1)}
+    )
+    db_session.commit()
+    assert InventoryService(db_session).release_expired_reservations() == 1
+    db_session.expire_all()
+    assert (test_product.stock, test_product.available_stock) == (3, 3)
+
+    # Paying after expiry takes the stock from the available pool instead
+    service.mark_order_as_paid(expired.id)
+    db_session.expire_all()
+    assert (test_product.stock, test_product.reserved_stock) == (2, 0)
+
+
+class FakeHotStockCounters:
+    """In-memory stand-in for HotStockCounters (no Redis in the test environment)"""
+
+    def __init__(self):
+        self.available = {}
+
+    def seed(self, product_id, quantity, overwrite=False):
+        if overwrite or product_id not in self.available:
+            self.available[product_id] = quantity
+
+    def take(self, product_id, quantity):
+        if product_id not in self.available:
+            raise LookupError(product_id)
+        if self.available[product_id] < quantity:
+            return False
+        self.available[product_id] -= quantity
+        return True
+
+    def give_back(self, product_id, quantity):
+        if product_id not in self.available:
+            return False
+        self.available[product_id] += quantity
+        return True
+
+    def total(self, product_id):
+        return self.available.get(product_id)
+
+    def clear(self, product_id):
+        self.available.pop(product_id, None)
+
+
+def test_inventory_hot_product_uses_counters(db_session, test_user, test_product):
+    """Test that hot products reserve from the counters and flush back to the row"""
+    from app.services.inventory_service import InventoryService
+
+    counters = FakeHotStockCounters()
+    service = OrderService(db_session)
+    service.inventory_service = InventoryService(db_session, counters=counters)
+    test_product.stock = 5
+    test_product.is_hot = True
+    db_session.commit()
+
+    paid = service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=3)]))
+    canceled = service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=2)]))
+    assert counters.total(test_product.id) == 0
+    db_session.expire_all()
+    assert (test_product.stock, test_product.reserved_stock) == (5, 0)
+
+    with pytest.raises(ValueError):
+        service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)]))
+    assert counters.total(test_product.id) == 0
+
+    service.mark_order_as_paid(paid.id)
+    service.cancel_order(canceled.id, test_user.id)
+    assert counters.total(test_product.id) == 2
+
+    assert service.inventory_service.flush_hot_stock() == 1
+    db_session.expire_all()
+    assert (test_product.stock, test_product.available_stock) == (2, 2)
+
+
+def test_inventory_hot_counters_follow_transactions(db_session, test_user, test_product):
+    """Test that DB-held units return to the counters once hot, and rolled back takes are given back"""
+    from app.services.inventory_service import COUNTER_CHANGES_KEY, InventoryService
+
+    counters = FakeHotStockCounters()
+    service = OrderService(db_session)
+    service.inventory_service = InventoryService(db_session, counters=counters)
+    test_product.stock = 10
+    db_session.commit()
+
+    # Reserved in the database, then the product goes hot
+    order = service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=4)]))
+    test_product.is_hot = True
+    db_session.commit()
+    counters.seed(test_product.id, test_product.available_stock)
+    assert counters.total(test_product.id) == 6
+
+    service.cancel_order(order.id, test_user.id)
+    assert counters.total(test_product.id) == 10
+    service.inventory_service.flush_hot_stock()
+    db_session.expire_all()
+    assert (test_product.stock, test_product.reserved_stock) == (10, 0)
+
+    # Units taken from the counters come back if the transaction doesn't commit
+    service.inventory_service.reserve_stock(999, {test_product.id: 3}, hot_product_ids=[test_product.id])
+    assert counters.total(test_product.id) == 7
+    db_session.rollback()
+    assert counters.total(test_product.id) == 10
+
+    # Pending changes live on the session and are dropped when its transaction ends
+    InventoryService(db_session, counters=counters).reserve_stock(998, {test_product.id: 2}, hot_product_ids=[test_product.id])
+    assert len(db_session.info[COUNTER_CHANGES_KEY]) == 1
+    db_session.commit()
+    assert COUNTER_CHANGES_KEY not in db_session.info
+    assert counters.total(test_product.id) == 8
+
+
+def test_hot_stock_counters_against_redis():
+    """Test the Lua take script and shard bookkeeping on a real Redis"""
+    from redis import Redis, RedisError
+    from app.config import settings
+    from app.core.inventory_counters import HotStockCounters
+
+    client = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5)
+    try:
+        client.ping()
+    except RedisError:
+        pytest.skip("Redis is not available")
+
+    counters = HotStockCounters(client=client, shards=4)
+    product_id = 987654321
+    counters.clear(product_id)
+    try:
+        with pytest.raises(LookupError):
+            counters.take(product_id, 1)
+        counters.seed(product_id, 10)
+        assert [int(v) for v in client.mget(counters.shard_keys(product_id))] == [3, 3, 2, 2]
+        # Gathers across shards, and refunds a take the shards can't cover
+        assert counters.take(product_id, 7) is True
+        assert counters.take(product_id, 4) is False
+        assert counters.total(product_id) == 3
+        assert counters.give_back(product_id, 2) is True
+        assert counters.total(product_id) == 5
+    finally:
+        counters.clear(product_id)
+        client.close()
+
+
+def test_order_service_user_orders_fixed_queries(db_session, test_user, test_product):
+    """Test that listing orders loads every order's items in one extra query"""
+    from sqlalchemy import event
+
+    service = OrderService(db_session)
+    for _ in range(5):
+        service.create_order(test_user.id, OrderCreate(items=[OrderItemCreate(product_id=test_product.id, quantity=1)]))
+    user_id = test_user.id
+    db_session.expire_all()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        orders = service.get_user_orders(user_id)
+        assert sum(len(order.order_items) for order in orders) == 5
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(statements) == 2
+
+
+def test_idempotency_service_in_flight_duplicate(db_session, test_user, monkeypatch):
+    """Test that a duplicate waits on the in-flight request instead of running again"""
+    from app.config import settings
+    from app.services.idempotency_service import IdempotencyService, IdempotencyKeyInProgressError
+
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 0)
+    service = IdempotencyService(db_session)
+    assert service.claim(test_user.id, "orders:create", "key-1", "abc") is None
+    with pytest.raises(IdempotencyKeyInProgressError):
+        service.claim(test_user.id, "orders:create", "key-1", "abc")
+
+    service.complete(test_user.id, "orders:create", "key-1", 201, b'{"id":1}')
+    saved = service.claim(test_user.id, "orders:create", "key-1", "abc")
+    assert (saved.status_code, saved.response_body) == (201, '{"id":1}')
+
+    # A released key can be claimed again
+    service.release(test_user.id, "orders:create", "key-1")
+    assert service.claim(test_user.id, "orders:create", "key-1", "abc") is None
+
+
+def test_idempotency_lock_outlasts_payment_timeouts(db_session, test_user, monkeypatch):
+    """Test that an in-flight claim isn't released before a slow payment initiation could finish"""
+    from datetime import datetime, timedelta, timezone
+    from app.config import settings
+    from app.models.idempotency import IdempotencyKey
+    from app.services.idempotency_service import IdempotencyService
+
+    monkeypatch.setattr(settings, "IDEMPOTENCY_LOCK_SECONDS", 60)
+    monkeypatch.setattr(settings, "PAYMENT_HTTP_CONNECT_TIMEOUT", 5)
+    monkeypatch.setattr(settings, "PAYMENT_HTTP_READ_TIMEOUT", 30)
+    monkeypatch.setattr(settings, "PAYMENT_HTTP_MAX_RETRIES", 2)
+    service = IdempotencyService(db_session)
+    assert service.claim(test_user.id, "payments:initiate", "key-1", "abc") is None
+
+    record = db_session.query(IdempotencyKey).filter(IdempotencyKey.key == "key-1").one()
+    expires_at = record.expires_at.replace(tzinfo=record.expires_at.tzinfo or timezone.utc)
+    # Two calls, each three attempts of 35s
+    assert expires_at > datetime.now(timezone.utc) + timedelta(seconds=2 * 3 * 35)